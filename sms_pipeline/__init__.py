@@ -0,0 +1,7 @@
+"""Reusable building blocks for the SMS transaction preprocessing pipeline.
+
+The notebook export in ``Data Preprocessing_1.py`` imports from here so the
+same rules are shared by every report it writes.
+"""
+
+from .classify import analyze_transaction, classify_batch, verify_parity
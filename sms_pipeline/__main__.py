@@ -0,0 +1,175 @@
+"""Command line entry point: ``python -m sms_pipeline [options]``."""
+
+import argparse
+import os
+
+from .columnar import parquet_path_for
+from .incremental import run_incremental
+from .metrics import RunMetrics, metrics_paths, profile_run
+from .parallel import run_parallel_reports
+from .stages import REPORTS
+from .streaming import DEFAULT_CHUNKSIZE, INPUT_PATH, output_path_for, run_reports
+from .templates import CACHE as TEMPLATE_CACHE
+
+# Default profile file suffix per profiler
+PROFILE_SUFFIXES = {'cprofile': '.pstats', 'sample': '.stacks'}
+
+# Metrics and profile files of runs writing several reports are named after this
+MULTI_REPORT_ROOT = 'sms_pipeline'
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m sms_pipeline',
+        description='Classify SMS transactions and write report CSVs.',
+    )
+    parser.add_argument('input', nargs='?', default=INPUT_PATH, help='SMS export to read (default: %(default)s)')
+    parser.add_argument('-o', '--output', help='report file to write (default depends on --report; '
+                                               'only with a single report)')
+    parser.add_argument('-r', '--report', action='append', choices=sorted(REPORTS) + ['all'],
+                        help='report variant to produce; repeat it, or give "all", to write several '
+                             'from one read of the input (default: reports)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help=f'stream the input this many rows at a time (e.g. {DEFAULT_CHUNKSIZE}) '
+                             'instead of loading the whole file')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='process shards on this many worker processes (0 = one per available core)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only process rows not seen by the previous incremental run and '
+                             'append or merge them into the existing report')
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help='with --incremental: ignore the saved state and reprocess everything')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'both'], default='csv',
+                        help='write the CSV report, a year/month partitioned Parquet dataset '
+                             'next to it, or both (default: %(default)s)')
+    parser.add_argument('--rollup', action='store_true',
+                        help='also write <output>_rollup.csv with sums, counts, min and max per '
+                             'year/month/day/platform/payment method/type/flags')
+    parser.add_argument('--account-index', action='store_true',
+                        help='also write <output>_accounts.npz, the CSV offsets of every row grouped by '
+                             'account number (reports with account numbers, e.g. --report accounts)')
+    parser.add_argument('--store', action='store_true',
+                        help='also load the report into <output>.sqlite, indexed by time, sender, platform, '
+                             'account and transaction type (query it with python -m sms_pipeline.store)')
+    parser.add_argument('--compact', action='store_true',
+                        help='hold every processed report frame in the compact schema (see sms_pipeline.compact) '
+                             'while it is written, and print its memory before and after')
+    parser.add_argument('--templates', action='store_true',
+                        help='classify each SMS template (text with digits masked) once and reuse the '
+                             'result for every message of that template')
+    parser.add_argument('--template-cache', metavar='PATH',
+                        help='load the template cache from PATH and save it back after the run '
+                             '(implies --templates)')
+    parser.add_argument('--spam-model', metavar='PATH',
+                        help='decide final_credit from the spam model saved at PATH (see sms_pipeline.spam) '
+                             'instead of the spam keywords, and write its spam_score')
+    parser.add_argument('--amount-details', action='store_true',
+                        help='read every currency format (Rs. 1,23,456.78, INR, lakh/crore) and skip quoted '
+                             'balances when taking the amount (see sms_pipeline.amounts), and write the '
+                             'quoted available_balance; the ledger then reuses it')
+    parser.add_argument('--prometheus', metavar='PATH',
+                        help='where to write the Prometheus textfile metrics (default: <output>.prom; '
+                             'stage metrics always go to <output>.metrics.json as well)')
+    parser.add_argument('--profile', choices=sorted(PROFILE_SUFFIXES),
+                        help='profile the run with cProfile or a sampling profiler; the hottest '
+                             'functions are added to the metrics')
+    parser.add_argument('--profile-output', metavar='PATH',
+                        help='profile file (default: <output>.pstats or <output>.stacks)')
+    return parser
+
+
+def selected_reports(parser, args):
+    """The report names picked with ``-r``, checked against the other options."""
+    reports = list(dict.fromkeys(args.report or ['reports']))
+    if 'all' in reports:
+        reports = list(REPORTS)
+    if len(reports) > 1:
+        if args.output:
+            parser.error('--output needs a single --report; several reports go to their default files')
+        if args.incremental or args.full_rebuild:
+            parser.error('--incremental runs one report at a time')
+    if args.account_index:
+        if not any(REPORTS[report]['accounts'] for report in reports):
+            parser.error('--account-index needs a report with account numbers (--report accounts)')
+        if args.format == 'parquet':
+            parser.error('--account-index indexes the CSV report; use --format csv or both')
+    return reports
+
+
+def run_selected(args, outputs, formats, templates, metrics):
+    """Run the mode picked by the options; returns ``{report: summary}``."""
+    if args.incremental or args.full_rebuild:
+        [(report, output_path)] = outputs.items()
+        summary = run_incremental(args.input, output_path, report,
+                                  chunksize=args.chunksize or DEFAULT_CHUNKSIZE, full_rebuild=args.full_rebuild,
+                                  formats=formats, rollup=args.rollup, templates=templates, metrics=metrics,
+                                  account_index=args.account_index, spam_model=args.spam_model, store=args.store,
+                                  compact=args.compact, amount_details=args.amount_details)
+        print(f"{summary['mode']}: {summary['new_rows']} new or changed input rows, "
+              f"{summary['reclassified_rows']} reclassified after keyword or bank list changes")
+        return {report: summary}
+    if args.workers is not None:
+        return run_parallel_reports(args.input, outputs, workers=args.workers or None,
+                                    chunksize=args.chunksize or DEFAULT_CHUNKSIZE, formats=formats,
+                                    rollup=args.rollup, templates=templates, template_cache=args.template_cache,
+                                    metrics=metrics, account_index=args.account_index, spam_model=args.spam_model,
+                                    store=args.store, compact=args.compact, amount_details=args.amount_details)
+    return run_reports(args.input, outputs, args.chunksize, formats=formats, rollup=args.rollup, templates=templates,
+                       metrics=metrics, account_index=args.account_index, spam_model=args.spam_model,
+                       store=args.store, compact=args.compact, amount_details=args.amount_details)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    reports = selected_reports(parser, args)
+    outputs = {report: args.output or output_path_for(report) for report in reports}
+    # Metrics and profiles sit next to the report, or use a shared name for several
+    output_path = outputs[reports[0]] if len(reports) == 1 else MULTI_REPORT_ROOT
+    formats = ('csv', 'parquet') if args.format == 'both' else (args.format,)
+    if args.incremental or args.full_rebuild:
+        # Incremental runs always keep the CSV report, merges work on it
+        formats = ('csv',) + tuple(fmt for fmt in formats if fmt != 'csv')
+    templates = args.templates or bool(args.template_cache)
+    if args.template_cache:
+        TEMPLATE_CACHE.update_from(args.template_cache)
+
+    metrics = RunMetrics(','.join(reports))
+    if args.profile:
+        profile_path = args.profile_output or os.path.splitext(output_path)[0] + PROFILE_SUFFIXES[args.profile]
+        with profile_run(args.profile, profile_path, metrics):
+            summaries = run_selected(args, outputs, formats, templates, metrics)
+    else:
+        summaries = run_selected(args, outputs, formats, templates, metrics)
+
+    for report, summary in summaries.items():
+        report_path = outputs[report]
+        saved = [path for fmt, path in (('csv', report_path), ('parquet', parquet_path_for(report_path)))
+                 if fmt in formats]
+        print(f"Updated transaction reports saved to {' and '.join(saved)} ({summary['rows']} rows)")
+        if summary['invalid_update_at']:
+            print(f"{summary['invalid_update_at']} rows had an unparseable updateAt and were kept with empty dates")
+        if args.compact:
+            print(f"Memory of the {report} frames: {summary['memory_bytes'] / 2**20:.1f} MB as processed, "
+                  f"{summary['compact_memory_bytes'] / 2**20:.1f} MB compact "
+                  f"({summary['memory_bytes'] / max(summary['compact_memory_bytes'], 1):.2f}x)")
+    summary = summaries[reports[0]] if len(reports) == 1 else {
+        f'{report}_{key}': value for report, summary in summaries.items() for key, value in summary.items()
+    }
+    # Worker processes keep their own caches, so only serial runs report and save it
+    if templates and args.workers is None:
+        print(f"Template cache: {TEMPLATE_CACHE.hits} hits, {TEMPLATE_CACHE.misses} misses")
+        summary.update(template_hits=TEMPLATE_CACHE.hits, template_misses=TEMPLATE_CACHE.misses)
+        if args.template_cache:
+            TEMPLATE_CACHE.save(args.template_cache)
+
+    metrics.summary.update(summary)
+    json_path, prometheus_path = metrics_paths(output_path)
+    metrics.write_json(json_path)
+    metrics.write_prometheus(args.prometheus or prometheus_path)
+    if args.profile:
+        print(f"Profile saved to {profile_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Account numbers and the account-level index of a report.
+
+``extract_account_numbers`` is the account-number extraction of
+``Data Preprocessing_2.ipynb`` run on a whole column.  Masked numbers are
+written in many ways (``X6618``, ``XX6618``, ``xxxx6618``); ``account_key``
+reduces them to one key per account.
+
+The account index (``<report>_accounts.npz``) lists, per key, the report
+rows of that account with the byte offset and length of each row in the
+CSV.  ``read_account`` uses it to read one account's rows with a few
+seeks instead of a full scan.  The index is built while the report is
+written (``ReportWriter``), extended on appends and rebuilt from the CSV
+after an incremental merge.
+"""
+
+import io
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Account number after "a/c", "account" or "AC" (the notebook's rule, as is)
+ACCOUNT_NUMBER_PATTERN = r'\b(?:a/c|account|AC|a/c no.)\s*(\w+)'
+
+_MASK_PREFIX = r'^[X*]+'
+
+_QUOTE = ord('"')
+_NEWLINE = ord('\n')
+
+
+def extract_account_numbers(texts):
+    """The account number in every text (missing where there is none)."""
+    return texts.astype(str).str.extract(ACCOUNT_NUMBER_PATTERN, flags=re.IGNORECASE, expand=False)
+
+
+def account_key(account_numbers):
+    """Index keys of ``account_numbers``: upper case, masking collapsed to one ``X``."""
+    keys = account_numbers.astype(object).where(account_numbers.notna(), None)
+    keys = keys.str.strip().str.upper().str.replace(_MASK_PREFIX, 'X', regex=True)
+    return keys.where(keys.notna() & (keys != ''), None)
+
+
+def account_index_path_for(output_path):
+    # Reports.csv -> Reports_accounts.npz
+    return f'{os.path.splitext(output_path)[0]}_accounts.npz'
+
+
+def _record_ends(data, quoted=False):
+    # A newline ends a record unless it is inside quotes; quotes inside a
+    # field are doubled, so the number of quotes before a newline tells
+    # which.  ``quoted`` is whether ``data`` starts inside a quoted field
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    inside = (np.cumsum(buffer == _QUOTE) + quoted) % 2 == 1
+    ends = np.flatnonzero((buffer == _NEWLINE) & ~inside) + 1
+    return ends.astype(np.int64), bool(inside[-1]) if len(buffer) else quoted
+
+
+def _spans(ends, start=0):
+    starts = np.concatenate([np.full(1, start, dtype=np.int64), ends[:-1]])[:len(ends)]
+    return starts, ends - starts
+
+
+def csv_row_spans(data, header=True):
+    """Start offset and length of every record in the CSV bytes ``data``.
+
+    With ``header``, the first record is left out.
+    """
+    starts, lengths = _spans(_record_ends(data)[0])
+    if header:
+        starts, lengths = starts[1:], lengths[1:]
+    return starts, lengths
+
+
+class AccountIndexBuilder:
+    """Accumulate the account index of a report as it is written."""
+
+    def __init__(self, rows=0, header_length=0):
+        self.rows = rows
+        self.header_length = header_length
+        self.parts = []
+
+    def add(self, keys, offsets, lengths):
+        """Add the next ``len(keys)`` report rows, found at ``offsets`` in the CSV."""
+        keys = np.asarray(keys, dtype=object)
+        has_key = pd.notna(keys)
+        rows = np.arange(self.rows, self.rows + len(keys), dtype=np.int64)
+        self.parts.append((keys[has_key].astype(str), rows[has_key], offsets[has_key], lengths[has_key]))
+        self.rows += len(keys)
+
+    def merge(self, index):
+        """Start from an existing ``index`` (as read by ``read_account_index``)."""
+        if index is not None:
+            keys = np.repeat(index['accounts'], np.diff(index['starts']))
+            self.parts.insert(0, (keys.astype(str), index['rows'], index['offsets'], index['lengths']))
+            self.rows = max(self.rows, int(index['report_rows']))
+            self.header_length = int(index['header_length'])
+
+    def result(self):
+        """The index arrays: one entry per account, rows grouped by account."""
+        if self.parts:
+            keys, rows, offsets, lengths = (np.concatenate(column) for column in zip(*self.parts))
+        else:
+            keys, rows, offsets, lengths = np.empty(0, dtype=str), *(np.empty(0, dtype=np.int64),) * 3
+        order = np.lexsort((rows, keys))
+        keys = keys[order]
+        accounts, first = np.unique(keys, return_index=True)
+        return {
+            'accounts': accounts,
+            'starts': np.append(first, len(keys)).astype(np.int64),
+            'rows': rows[order],
+            'offsets': offsets[order],
+            'lengths': lengths[order],
+            'report_rows': np.int64(self.rows),
+            'header_length': np.int64(self.header_length),
+        }
+
+
+def write_account_index(index, path):
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **index)
+    os.replace(tmp_path, path)
+
+
+def read_account_index(path):
+    """The saved index at ``path`` as a dict of arrays, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+
+def csv_file_spans(csv_path, block_size=1 << 24, start=0):
+    """Start offset and length of every record of the CSV file at ``csv_path``, the header first.
+
+    The file is read block by block, so only the offsets are kept in memory.
+    With ``start`` (the offset of a record), only the records from there on
+    are listed.  A last record without its newline is left out.
+    """
+    ends, position, quoted = [], start, False
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        for block in iter(lambda: f.read(block_size), b''):
+            block_ends, quoted = _record_ends(block, quoted)
+            ends.append(block_ends + position)
+            position += len(block)
+    return _spans(np.concatenate(ends) if ends else np.empty(0, dtype=np.int64), start)
+
+
+def account_index_from_csv(csv_path, chunksize=100_000, block_size=1 << 24):
+    """Rebuild the account index of an existing report CSV, block by block."""
+    offsets, lengths = csv_file_spans(csv_path, block_size)
+    builder = AccountIndexBuilder(header_length=int(lengths[0]) if len(lengths) else 0)
+    offsets, lengths = offsets[1:], lengths[1:]
+    with pd.read_csv(csv_path, dtype=str, usecols=['account_number'], chunksize=chunksize) as chunks:
+        for chunk in chunks:
+            done = builder.rows
+            builder.add(account_key(chunk['account_number']), offsets[done:done + len(chunk)],
+                        lengths[done:done + len(chunk)])
+    return builder.result()
+
+
+def read_account(csv_path, account, index=None):
+    """The report rows of ``account`` (any masking), read through the account index.
+
+    Columns are read as text, like ``read_sms``.  ``index`` defaults to the
+    one saved next to ``csv_path``.
+    """
+    if index is None:
+        index = read_account_index(account_index_path_for(csv_path))
+        if index is None:
+            raise FileNotFoundError(f'no account index for {csv_path}; write the report with --account-index')
+    key = account_key(pd.Series([account])).iloc[0]
+    position = np.searchsorted(index['accounts'], key)
+    found = position < len(index['accounts']) and index['accounts'][position] == key
+    span = slice(*index['starts'][position:position + 2]) if found else slice(0, 0)
+    with open(csv_path, 'rb') as f:
+        parts = [f.read(int(index['header_length']))]
+        for offset, length in zip(index['offsets'][span], index['lengths'][span]):
+            f.seek(int(offset))
+            parts.append(f.read(int(length)))
+    account_data = pd.read_csv(io.BytesIO(b''.join(parts)), dtype=str)
+    account_data.index = index['rows'][span]
+    return account_data
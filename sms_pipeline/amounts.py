@@ -0,0 +1,183 @@
+"""Every amount in an SMS, with what it is.
+
+``extract_amount`` (the notebook rule the reports keep) takes the first
+``₹``/``Rs`` figure and reads ``\\d+[.,]?\\d*`` of it, so ``Rs. 1,23,456.78``
+becomes 1.0 and an "Avl Bal" figure in front of the transaction is taken
+for it.  ``find_amounts`` finds all amounts of a whole column in one
+regex pass (RE2 through pyarrow when it is installed):
+
+* ``₹``, ``Rs``, ``Rs.`` and ``INR`` in front of the number, or ``INR``
+  and ``/-`` after it;
+* Indian (``1,23,456``) and western (``123,456``) digit grouping,
+  decimals, and lakh/crore written out (``Rs.2 lacs``, ``Rs.1 crore``,
+  ``Rs 5 Cr``);  a ``Cr``/``Dr`` attached to the number is not a crore
+  but marks a credit or debit balance (``Total Bal:Rs.3353.33CR``), as
+  does a spaced one after a labelled balance (``Avl Bal Rs 500.00 Cr``)
+  or a spaced ``Dr``; a debit balance is read as negative;
+* the words just before the currency label the amount: ``balance``
+  (Bal, Avl Bal, Avlbl Amt, Available Balance), ``limit`` (Lmt, Limit) or
+  ``due`` (Amt Due, Min Due); a ``Cr``/``Dr`` marker also makes it a
+  balance.  Anything else is a ``transaction`` amount.
+
+``amount_details`` turns the matches into one row per message: the
+transaction amount (the first transaction figure above 1, the same
+"not a stray digit" rule as ``extract_amount``), the quoted balance, limit
+and amount due, and how many amounts the message has.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+TRANSACTION = 'transaction'
+BALANCE = 'balance'
+LIMIT = 'limit'
+DUE = 'due'
+AMOUNT_KINDS = [TRANSACTION, BALANCE, LIMIT, DUE]
+
+# Grouped digits (1,23,456 or 123,456) or plain ones, with optional
+# decimals; a number starting with 0 (a reference such as INR00798072) is
+# read as 0
+_NUMBER = r'(?:[1-9][\d,]*|0)(?:\.\d+)?|\.\d+'
+# One pattern for both regex engines (RE2 has no lookarounds).  Groups:
+# 1 a label word (bal..., avl..., lmt, limit, due) with at most 12 other
+# characters up to the currency, 2 the number after ₹/Rs/INR (a dot right
+# after the currency is its abbreviation, so "₹ .50" is 0.50), 3 lakh or
+# crore written out after it, or a Cr/Dr balance marker, with the space
+# before it if any, 4 a number followed by INR or /-
+AMOUNTS_PATTERN = (
+    r'(?:\b(?i:(bal|avl|avbl|avlbl|lmt|limit|due))[a-zA-Z]*\W[^\d\n]{0,12}?)?'
+    rf'(?:(?:₹|R[sS]\.?|INR)(?:\s?:|\.)?\s?({_NUMBER})(\s?(?i:lacs?|lakhs?|crores?|cr|dr)\b)?'
+    rf'|\b({_NUMBER})\s?(?:INR\b|/-))'
+)
+
+_AMOUNTS_RE = re.compile(AMOUNTS_PATTERN, re.ASCII)  # \d, \b and \W as RE2 reads them
+# Kinds by the label's first letter, and scales and balance signs by the
+# first three letters of the word after the number
+_KINDS = {'a': BALANCE, 'b': BALANCE, 'l': LIMIT, 'd': DUE}
+_SCALES = {'lac': 100_000, 'lak': 100_000, 'cro': 10_000_000}
+_MARKERS = {'cr': 1, 'dr': -1}
+# Separators of the rewritten matches in the Arrow path
+_MATCH, _GROUP = '\x00', '\x01'
+
+DETAIL_COLUMNS = {
+    TRANSACTION: 'transaction_amount',
+    BALANCE: 'available_balance',
+    LIMIT: 'credit_limit',
+    DUE: 'amount_due',
+}
+
+
+def _split_matches(texts, pa, pc):
+    # Every match rewritten to its groups between separators by RE2, then
+    # split out: the text between matches lands at even list positions.
+    # None if a text already holds a separator and the split came out wrong
+    marked = pc.replace_substring_regex(texts, AMOUNTS_PATTERN, _MATCH + _GROUP.join(
+        rf'\{group}' for group in range(1, 5)) + _MATCH)
+    parts = pc.split_pattern(marked, _MATCH)
+    rows = pc.list_parent_indices(parts).to_numpy()
+    lengths = pc.list_value_length(parts).to_numpy()
+    starts = np.concatenate([[0], np.cumsum(lengths)])
+    is_match = (np.arange(len(rows)) - starts[rows]) % 2 == 1
+    groups = pc.split_pattern(pc.list_flatten(parts).filter(pa.array(is_match)), _GROUP)
+    if (lengths % 2 == 0).any() or (pc.list_value_length(groups).to_numpy() != 4).any():
+        return None
+    return rows[is_match], pc.list_flatten(groups)
+
+
+def _matches_arrow(texts, pa, pc):
+    texts = pa.array(texts, type=pa.large_string())
+    split = _split_matches(texts, pa, pc)
+    if split is None:
+        for separator in (_MATCH, _GROUP):
+            texts = pc.replace_substring(texts, separator, ' ')
+        split = _split_matches(texts, pa, pc)
+    rows, groups = split
+    label, prefixed, scale, suffixed = (groups.take(np.arange(group, len(groups), 4)) for group in range(4))
+    figures = pc.replace_substring(pc.if_else(pc.equal(prefixed, ''), suffixed, prefixed), ',', '')
+
+    def initials(values, length):
+        return pc.utf8_lower(pc.utf8_slice_codeunits(values, 0, length)).to_numpy(zero_copy_only=False)
+
+    return rows, pc.cast(figures, pa.float64()).to_numpy(), initials(label, 1), initials(scale, 4)
+
+
+def _matches_re(texts):
+    rows, figures, labels, scales = [], [], [], []
+    for row, text in enumerate(texts):
+        for label, prefixed, scale, suffixed in _AMOUNTS_RE.findall(text):
+            rows.append(row)
+            figures.append(float((prefixed or suffixed).replace(',', '')))
+            labels.append(label[:1].lower())
+            scales.append(scale[:4].lower())
+    return (np.asarray(rows, dtype=np.int64), np.asarray(figures, dtype=float), np.asarray(labels, dtype=object),
+            np.asarray(scales, dtype=object))
+
+
+def _matches(texts):
+    # Per match, in text order: its row position, the number, and the
+    # lower-cased first letter of its label and first four characters of
+    # the word after the number, with the space before it ('' if none); RE2
+    # through pyarrow when installed, else Python's re
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return _matches_re(texts)
+    return _matches_arrow(texts, pa, pc)
+
+
+def _find(texts):
+    # Row positions, amounts and kinds of every amount in texts
+    rows, amount, label, scale = _matches(texts.fillna('').astype(str))
+    scale = scale.astype(str)
+    word = np.char.lstrip(scale)
+    spaced = np.char.str_len(word) < np.char.str_len(scale)
+    word = word.astype('<U3')
+    kind = np.select([label == initial for initial in _KINDS], list(_KINDS.values()), TRANSACTION)
+    # "Rs 5 Cr" is five crore, "3353.33CR" and "Avl Bal Rs 500.00 Cr" a
+    # credit balance
+    crore = (word == 'cr') & spaced & (kind != BALANCE)
+    for initial, factor in _SCALES.items():
+        amount = np.where((word == initial) | (crore & (initial == 'cro')), amount * factor, amount)
+    # A Cr/Dr marker makes an amount without a limit or due label a balance
+    marked = np.isin(word, list(_MARKERS)) & ~crore & ~np.isin(kind, [LIMIT, DUE])
+    kind = np.where(marked, BALANCE, kind)
+    amount = np.where(marked & (word == 'dr'), -amount, amount)
+    return rows, amount, kind
+
+
+def find_amounts(texts):
+    """All amounts in ``texts``: one row per amount, indexed by (text label, match).
+
+    Columns are ``amount`` (float) and ``kind`` (one of ``AMOUNT_KINDS``),
+    in the order the amounts appear.
+    """
+    rows, amount, kind = _find(texts)
+    match = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    index = pd.MultiIndex.from_arrays([texts.index[rows], match], names=[texts.index.name, 'match'])
+    return pd.DataFrame({'amount': amount, 'kind': pd.Categorical(kind, categories=AMOUNT_KINDS)}, index=index)
+
+
+def amount_details(texts):
+    """Per message: the transaction amount, balance, limit and amount due, and the number of amounts.
+
+    Each amount column holds the first figure of its kind, missing where
+    the message has none.
+    """
+    rows, amount, kind = _find(texts)
+    details = pd.DataFrame(index=texts.index)
+    for name, column in DETAIL_COLUMNS.items():
+        selected = kind == name
+        if name == TRANSACTION:
+            selected &= amount > 1
+        values = np.full(len(texts), np.nan)
+        # Rows are in order, so the first entry of each row is its first amount
+        found = rows[selected]
+        first = np.diff(found, prepend=-1) != 0
+        values[found[first]] = amount[selected][first]
+        details[column] = values
+    details['amount_count'] = np.bincount(rows, minlength=len(texts))
+    details['transaction_amount_count'] = np.bincount(rows[kind == TRANSACTION], minlength=len(texts))
+    return details
@@ -0,0 +1,205 @@
+"""Scaling benchmark of the report stages on synthetic data.
+
+For every size the synthetic export is generated once (and kept in the data
+directory), then processed in a fresh process.  Each stage group is timed:
+load, classify, amount, dates, spam, bank, accounts and write.  The result
+holds seconds and rows/sec per stage, the peak RSS, and a hash of the
+report.
+Compared against a stored baseline, it lists slower stages, higher memory
+and changed output::
+
+    python -m sms_pipeline.benchmark --sizes 10k 1M --save-baseline
+    python -m sms_pipeline.benchmark --sizes 10k 1M    # exits 1 on regressions
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from .metrics import RunMetrics, peak_rss_mb, stage_name
+from .pipeline import build_pipeline, process_reports
+from .stages import REPORTS, report_columns, report_stages
+from .streaming import read_sms
+from .synthetic import parse_size, write_synthetic
+
+STAGES = ['load', 'classify', 'amount', 'dates', 'spam', 'bank', 'accounts', 'write']
+
+BASELINE_PATH = 'benchmark_baseline.json'
+DATA_DIR = 'benchmark_data'
+
+# Allowed slowdown / memory growth against the baseline before it counts as a regression
+DEFAULT_TOLERANCE = 0.25
+# Stages that took less than this in the baseline are timer noise, not compared
+MIN_STAGE_SECONDS = 0.05
+
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def benchmark_file(file_path, report='updated_platform', output_path=None, templates=False):
+    """Run ``report`` on ``file_path`` once, timing every stage group.
+
+    The report is written to ``output_path`` (next to the input by default)
+    and removed again after hashing.
+    """
+    output_path = output_path or file_path + '.report.csv'
+    seconds = dict.fromkeys(STAGES, 0.0)
+
+    start = time.perf_counter()
+    sms_data = read_sms(file_path)
+    seconds['load'] = time.perf_counter() - start
+    rows = len(sms_data)
+
+    # Pipeline steps and report stages both carry the group they count towards
+    groups = {name: step[3] for name, step in build_pipeline((report,), templates).steps.items()}
+    groups.update((f'{report}.{stage_name(stage)}', group) for group, stage in report_stages(report))
+    metrics = RunMetrics(report)
+    sms_data = process_reports(sms_data, [report], templates, metrics)[report]
+    for name, totals in metrics.stages.items():
+        seconds[groups[name]] += totals['wall_seconds']
+
+    start = time.perf_counter()
+    report_columns(sms_data).to_csv(output_path, index=False)
+    seconds['write'] = time.perf_counter() - start
+    output_sha1 = _file_sha1(output_path)
+    os.remove(output_path)
+
+    total = sum(seconds.values())
+    return {
+        'rows': rows,
+        'report_rows': len(sms_data),
+        'report': report,
+        'stages': {
+            stage: {'seconds': round(elapsed, 4), 'rows_per_sec': round(rows / elapsed) if elapsed else None}
+            for stage, elapsed in seconds.items()
+        },
+        'seconds': round(total, 4),
+        'rows_per_sec': round(rows / total) if total else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'output_sha1': output_sha1,
+    }
+
+
+def synthetic_path(size, seed=0, data_dir=DATA_DIR):
+    """Path of the synthetic export for ``size``, generated on first use."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'synthetic_{size}_seed{seed}.csv')
+    if not os.path.exists(path):
+        write_synthetic(path + '.tmp', parse_size(size), seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def run_benchmark(sizes=('10k',), report='updated_platform', seed=0, data_dir=DATA_DIR, templates=False):
+    """Benchmark every size in its own process; returns ``{size: result}``.
+
+    A fresh process per size keeps the peak RSS of one size from hiding
+    that of the next.
+    """
+    results = {}
+    for size in sizes:
+        path = synthetic_path(size, seed, data_dir)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            results[size] = executor.submit(benchmark_file, path, report, templates=templates).result()
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """List the regressions of ``results`` against ``baseline`` as strings.
+
+    A stage is a regression when its rows/sec dropped by more than
+    ``tolerance``; stages under ``MIN_STAGE_SECONDS`` are skipped.  Memory
+    is a regression when the peak RSS grew by more than ``tolerance``.  A
+    changed report hash is always reported.  Sizes, reports or stages
+    missing from the baseline are skipped.
+    """
+    problems = []
+    for size, result in results.items():
+        expected = baseline.get(size)
+        if expected is None or expected['report'] != result['report']:
+            continue
+        timings = [('total', result, expected)]
+        timings += [(stage, result['stages'][stage], expected['stages'][stage]) for stage in STAGES
+                    if stage in expected['stages']]
+        for stage, timing, expected_timing in timings:
+            if expected_timing['seconds'] < MIN_STAGE_SECONDS:
+                continue
+            got, want = timing['rows_per_sec'], expected_timing['rows_per_sec']
+            if got and want and got < want * (1 - tolerance):
+                problems.append(f"{size} {stage}: {got} rows/sec, baseline {want} ({got / want - 1:+.0%})")
+        if result['peak_rss_mb'] > expected['peak_rss_mb'] * (1 + tolerance):
+            problems.append(f"{size} peak RSS: {result['peak_rss_mb']} MB, baseline {expected['peak_rss_mb']} MB")
+        if result['output_sha1'] != expected['output_sha1']:
+            problems.append(f"{size} report output changed (sha1 {result['output_sha1']}, "
+                            f"baseline {expected['output_sha1']})")
+    return problems
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Store ``results`` as the baseline, keeping sizes that were not rerun."""
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def format_results(results):
+    lines = []
+    for size, result in results.items():
+        lines.append(f"{size}: {result['rows']} rows in {result['seconds']:.2f}s "
+                     f"({result['rows_per_sec']} rows/sec), peak RSS {result['peak_rss_mb']} MB")
+        for stage in STAGES:
+            timing = result['stages'][stage]
+            if timing['seconds']:
+                lines.append(f"  {stage:<9}{timing['seconds']:>9.3f}s {timing['rows_per_sec']:>12} rows/sec")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sms_pipeline.benchmark',
+                                     description='Time the report stages on synthetic SMS data.')
+    parser.add_argument('--sizes', nargs='+', default=['10k'], help='row counts to run, e.g. 10k 1M 10M')
+    parser.add_argument('-r', '--report', choices=sorted(REPORTS), default='updated_platform',
+                        help='report variant to run (default: %(default)s, every stage)')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic data seed (default: %(default)s)')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='where synthetic inputs are kept (default: %(default)s)')
+    parser.add_argument('--templates', action='store_true', help='classify through the template cache')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown or memory growth, as a fraction (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.sizes, args.report, args.seed, args.data_dir, args.templates)
+    print(format_results(results))
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    problems = compare(results, load_baseline(args.baseline), args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
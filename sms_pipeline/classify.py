@@ -0,0 +1,245 @@
+"""Transaction classification for SMS text.
+
+``analyze_transaction`` is the original per-message function from the
+notebook and is kept as the reference implementation.  ``classify_batch``
+computes the same three columns for a whole Series at once: one
+``KeywordAutomaton`` pass finds the debit, credit and spam words of every
+message, and pandas string operations extract the platform and payment
+method.
+
+The financial credit reports (notebook cells In[4] and In[5]) classify with
+their own credit and spam word lists and a platform pattern that also
+accepts "transfer"; In[4] also drops spam credits and messages that do not
+mention a bank or UPI account.  Both functions take those rules as
+arguments, and the shared automaton scans for every list at once.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from .keywords import KeywordAutomaton
+
+# Extended keywords for debit and credit transactions
+DEBIT_WORDS = ['paid', 'charged', 'debited', 'processed', 'withdrawn', 'deducted', 'spent', 'transferred', 'EMI', 'settled', 'fee', 'disbursed', 'purchase']
+CREDIT_WORDS = ['credited', 'received', 'refunded', 'reversed', 'deposited', 'added', 'reimbursed', 'awarded', 'bonus', 'loan approved', 'cashback', 'interest earned', 'payment received', 'gift']
+SPAM_CREDIT_WORDS = ['offer', 'avail', 'bonus', 'gift', 'win', 'reward', 'prize', 'lucky', 'exclusive', 'limited time', 'contest', 'promotion', 'claim', 'free', 'discount', 'unsecured loan', 'reward points', 'cashback', 'cash reward', 'surprise gift', 'redeem', 'voucher', 'free gift', 'congratulations', 'instant credit', 'loan sanctioned', 'apply now', 'eligibility']
+
+# Credit and spam keywords of the financial credit reports
+FINANCIAL_CREDIT_WORDS = ['credited', 'received', 'deposited', 'payment received', 'added', 'reimbursed', 'loan approved', 'refund', 'payment']
+FINANCIAL_SPAM_WORDS = ['gift', 'bonus', 'lottery', 'win', 'reward', 'promotional', 'offer']
+
+# Mentions (case-sensitive) of a UPI or bank account that the financial
+# credit report requires of every message
+ACCOUNT_MENTIONS = ['UPI', 'bank', 'A/c no', 'XXXX']
+
+
+def keyword_pattern(words):
+    """Whole-word alternation regex for ``words`` (match case-insensitively)."""
+    return r'\b(?:' + '|'.join(re.escape(word) for word in words) + r')\b'
+
+
+DEBIT_KEYWORDS = keyword_pattern(DEBIT_WORDS)
+CREDIT_KEYWORDS = keyword_pattern(CREDIT_WORDS)
+SPAM_CREDIT_KEYWORDS = keyword_pattern(SPAM_CREDIT_WORDS)
+FINANCIAL_CREDIT_KEYWORDS = keyword_pattern(FINANCIAL_CREDIT_WORDS)
+FINANCIAL_SPAM_KEYWORDS = keyword_pattern(FINANCIAL_SPAM_WORDS)
+
+# Platform or service (e.g., Zomato), captured in group 1
+PLATFORM_PATTERN = r'on\s([\w\s]+?)\s(?:charged|paid|via)'
+# Variant used by the platform-check reports (e.g., Zomato, HDFC, etc.)
+PLATFORM_FROM_PATTERN = r'(?:from|on)\s([\w\s]+?)\s(?:credited|charged|paid|via)'
+# Variant used by the financial credit reports
+PLATFORM_TRANSFER_PATTERN = r'on\s([\w\s]+?)\s(?:charged|paid|via|transfer)'
+# Payment method (e.g., Simpl Pay)
+PAYMENT_METHOD_PATTERN = r'via\s([\w\s]+)'
+
+DEBIT = "Paid/Debited"
+CREDIT = "Credited"
+
+# One automaton finds the words of every list in a single pass
+KEYWORDS = KeywordAutomaton({
+    'debit': DEBIT_WORDS,
+    'credit': CREDIT_WORDS,
+    'spam': SPAM_CREDIT_WORDS,
+    'financial_credit': FINANCIAL_CREDIT_WORDS,
+    'financial_spam': FINANCIAL_SPAM_WORDS,
+})
+
+# The regex each KEYWORDS list stands for in the reference implementation
+KEYWORD_PATTERNS = {
+    'debit': DEBIT_KEYWORDS,
+    'credit': CREDIT_KEYWORDS,
+    'spam': SPAM_CREDIT_KEYWORDS,
+    'financial_credit': FINANCIAL_CREDIT_KEYWORDS,
+    'financial_spam': FINANCIAL_SPAM_KEYWORDS,
+}
+
+
+def analyze_transaction(text, platform_pattern=PLATFORM_PATTERN, credit='credit', spam=None, mentions=None):
+    """Classify one message and extract its platform and payment method.
+
+    ``credit`` names the credit word list (a ``KEYWORDS`` label).  With
+    ``spam``, a credit with a word of that list is filtered out (all three
+    details None); with ``mentions``, so is a message containing none of them.
+    """
+    # Initialize details
+    transaction_type = None
+    platform = None
+    payment_method = None
+
+    # Classify transaction type
+    if re.search(DEBIT_KEYWORDS, text, re.IGNORECASE):
+        transaction_type = DEBIT
+    elif re.search(KEYWORD_PATTERNS[credit], text, re.IGNORECASE):
+        # If spam-related keywords are found, consider this a potential spam message
+        if spam is not None and re.search(KEYWORD_PATTERNS[spam], text, re.IGNORECASE):
+            return None, None, None  # Filter out the message
+        transaction_type = CREDIT
+
+    # Extract platform or service
+    platform_match = re.search(platform_pattern, text, re.IGNORECASE)
+    if platform_match:
+        platform = platform_match.group(1).strip()
+
+    # Extract payment method
+    payment_method_match = re.search(PAYMENT_METHOD_PATTERN, text, re.IGNORECASE)
+    if payment_method_match:
+        payment_method = payment_method_match.group(1).strip()
+
+    # Further validation for UPI or bank account mentions
+    if mentions is not None and not any(mention in text for mention in mentions):
+        return None, None, None
+
+    return transaction_type, platform, payment_method
+
+
+def _as_text(texts):
+    # Work on object dtype so every backend uses Python ``re`` semantics
+    # (Arrow-backed strings would otherwise switch to RE2 for some calls).
+    return pd.Series(texts, copy=False).fillna('').astype(str).astype(object)
+
+
+def _extract(texts, pattern):
+    return texts.str.extract(pattern, flags=re.IGNORECASE, expand=False).str.strip()
+
+
+def keyword_hits(texts, automaton=KEYWORDS):
+    """Scan every message once; return one boolean column per vocabulary."""
+    texts = _as_text(texts)
+    found = np.fromiter((automaton.scan(text) for text in texts), dtype=np.int64, count=len(texts))
+    return hits_frame(found, texts.index, automaton)
+
+
+def hits_frame(found, index, automaton=KEYWORDS):
+    """Split ``automaton.scan`` bitmasks into one boolean column per vocabulary."""
+    found = np.asarray(found)
+    return pd.DataFrame({label: (found & bit).astype(bool) for label, bit in automaton.bits.items()}, index=index)
+
+
+def mentions_any(texts, mentions=ACCOUNT_MENTIONS):
+    """Whether each text contains any of ``mentions`` (case-sensitive substrings)."""
+    pattern = '|'.join(re.escape(mention) for mention in mentions)
+    return _as_text(texts).str.contains(pattern, regex=True)
+
+
+def extract_platform(texts, platform_pattern=PLATFORM_PATTERN):
+    return _extract(_as_text(texts), platform_pattern)
+
+
+def extract_payment_method(texts):
+    return _extract(_as_text(texts), PAYMENT_METHOD_PATTERN)
+
+
+def classify_hits(hits, platform, payment_method, credit='credit', spam=None, mentioned=None):
+    """``classify_batch`` from already computed parts.
+
+    ``hits`` are the ``keyword_hits`` of the texts, ``platform`` and
+    ``payment_method`` their extracted values, and ``mentioned`` the
+    ``mentions_any`` result when the rules require a mention.
+    """
+    is_debit = hits['debit'].to_numpy()
+    is_credit = hits[credit].to_numpy()
+    transaction_type = np.select([is_debit, is_credit], [DEBIT, CREDIT], default=None)
+
+    result = pd.DataFrame({
+        'transaction_type': pd.Series(transaction_type, index=hits.index, dtype=object),
+        'platform': platform,
+        'payment_method': payment_method,
+    })
+    rejected = np.zeros(len(result), dtype=bool)
+    if spam is not None:
+        rejected |= ~is_debit & is_credit & hits[spam].to_numpy()
+    if mentioned is not None:
+        rejected |= ~mentioned.to_numpy(dtype=bool)
+    if rejected.any():
+        result[rejected] = None
+    return result.where(result.notna(), np.nan)
+
+
+def classify_batch(texts, platform_pattern=PLATFORM_PATTERN, parity=False, hits=None, credit='credit', spam=None,
+                   mentions=None):
+    """Vectorized ``analyze_transaction`` over a Series of message texts.
+
+    Returns a DataFrame with ``transaction_type``, ``platform`` and
+    ``payment_method`` aligned to the input index; missing values are NaN,
+    exactly as the per-row ``apply`` produced them.  With ``parity=True``
+    every row is also run through ``analyze_transaction`` and a
+    ``ValueError`` is raised if any of them disagree.
+
+    ``hits`` may pass in the ``keyword_hits`` of the same texts when the
+    caller also needs them (e.g. for the spam flag), so they are scanned once.
+    ``credit``, ``spam`` and ``mentions`` are the rules of ``analyze_transaction``.
+    """
+    texts = _as_text(texts)
+    if hits is None:
+        hits = keyword_hits(texts)
+
+    result = classify_hits(
+        hits, extract_platform(texts, platform_pattern), extract_payment_method(texts), credit=credit, spam=spam,
+        mentioned=None if mentions is None else mentions_any(texts, mentions),
+    )
+
+    if parity:
+        mismatches = verify_parity(texts, platform_pattern, result=result, credit=credit, spam=spam,
+                                   mentions=mentions)
+        if len(mismatches):
+            raise ValueError(
+                f"classify_batch disagrees with analyze_transaction on "
+                f"{mismatches.index.nunique()} rows, e.g.\n{mismatches.head()}"
+            )
+    return result
+
+
+def verify_parity(texts, platform_pattern=PLATFORM_PATTERN, result=None, credit='credit', spam=None, mentions=None):
+    """Compare ``classify_batch`` row by row against ``analyze_transaction``.
+
+    Returns one row per differing cell with the ``column``, the ``expected``
+    per-row value and the ``actual`` batch value; an empty frame means the
+    two implementations agree on every input.
+    """
+    texts = _as_text(texts)
+    if result is None:
+        result = classify_batch(texts, platform_pattern, credit=credit, spam=spam, mentions=mentions)
+
+    expected = pd.DataFrame(
+        [analyze_transaction(text, platform_pattern, credit, spam, mentions) for text in texts],
+        index=texts.index,
+        columns=result.columns,
+    )
+
+    frames = []
+    for column in result.columns:
+        want = expected[column]
+        got = result[column]
+        same = (want == got) | (want.isna() & got.isna())
+        if not same.all():
+            frames.append(pd.DataFrame({
+                'column': column,
+                'expected': want[~same],
+                'actual': got[~same],
+            }))
+    if not frames:
+        return pd.DataFrame(columns=['column', 'expected', 'actual'])
+    return pd.concat(frames)
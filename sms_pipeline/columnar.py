@@ -0,0 +1,129 @@
+"""Typed, partitioned Parquet copies of the reports.
+
+The CSV reports store everything as text, so Power BI and downstream jobs
+re-parse amounts, flags and ``time`` on every read.  ``ParquetReportWriter``
+writes the same columns with proper types to a Hive-partitioned dataset
+(``year=2022/month=5/part-....parquet``), compressed and with column
+statistics, so readers can prune by date and load only the columns they
+need.  Needs ``pyarrow``.
+"""
+
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+PARTITION_COLS = ['year', 'month']
+DEFAULT_COMPRESSION = 'zstd'
+
+FLOAT_COLUMNS = ['amount', 'debited_amount', 'credited_amount', 'total_amount', 'spam_score', 'available_balance']
+BOOL_COLUMNS = ['final_credit', 'platform_is_bank']
+INT_COLUMNS = {'day': 'int8', 'month': 'int8', 'year': 'int16'}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from exc
+    return pa, pq
+
+
+def parquet_path_for(output_path):
+    # Reports.csv -> Reports.parquet (a directory of partitions)
+    return os.path.splitext(output_path)[0] + '.parquet'
+
+
+def _to_bool(values):
+    if values.dtype == bool:
+        return values
+    return values.map({True: True, False: False, 'True': True, 'False': False})
+
+
+def to_arrow_table(sms_data):
+    """Convert a report frame (processed, or read back from CSV) to a typed table."""
+    pa, _ = _pyarrow()
+    arrays = {}
+    for column in sms_data.columns:
+        values = sms_data[column]
+        if column in FLOAT_COLUMNS:
+            arrays[column] = pa.array(pd.to_numeric(values, errors='coerce'), type=pa.float64(), from_pandas=True)
+        elif column in INT_COLUMNS:
+            numbers = pd.to_numeric(values, errors='coerce').astype('Int64')
+            arrays[column] = pa.array(numbers, type=getattr(pa, INT_COLUMNS[column])(), from_pandas=True)
+        elif column in BOOL_COLUMNS:
+            arrays[column] = pa.array(_to_bool(values), type=pa.bool_(), from_pandas=True)
+        elif column == 'time':
+            # datetime.time objects and "HH:MM:SS" strings both go through str
+            since_midnight = pd.to_timedelta(values.astype(object).map(str), errors='coerce')
+            micros = since_midnight // pd.Timedelta(microseconds=1)
+            arrays[column] = pa.array(micros.astype('Int64'), type=pa.int64(), from_pandas=True).cast(pa.time64('us'))
+        else:
+            text = values.astype(object).where(values.notna(), None)
+            arrays[column] = pa.array(text.map(lambda v: v if v is None else str(v)), type=pa.string())
+    return pa.table(arrays)
+
+
+class ParquetReportWriter:
+    """Write report frames to a partitioned Parquet dataset at ``root``.
+
+    Unless ``append`` is set, partitions left by a previous run are removed
+    on the first write.  Every ``write`` adds new files, so chunks of a
+    streaming run never overwrite each other.
+    """
+
+    def __init__(self, root, append=False, compression=DEFAULT_COMPRESSION, partition_cols=PARTITION_COLS):
+        self.root = root
+        self.compression = compression
+        self.partition_cols = list(partition_cols)
+        self._cleared = append
+
+    def clear(self):
+        # Only partition directories are removed, never anything else in root
+        if os.path.isdir(self.root):
+            prefix = self.partition_cols[0] + '='
+            for name in os.listdir(self.root):
+                if name.startswith(prefix):
+                    shutil.rmtree(os.path.join(self.root, name))
+        self._cleared = True
+
+    def write(self, sms_data):
+        _, pq = _pyarrow()
+        if not self._cleared:
+            self.clear()
+        if not len(sms_data):
+            return
+        pq.write_to_dataset(
+            to_arrow_table(sms_data),
+            self.root,
+            partition_cols=self.partition_cols,
+            basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+            compression=self.compression,
+            write_statistics=True,
+        )
+
+
+def rewrite_parquet_from_csv(csv_path, root, chunksize=100_000):
+    """Regenerate the dataset at ``root`` from an existing report CSV."""
+    writer = ParquetReportWriter(root)
+    writer.clear()
+    with pd.read_csv(csv_path, dtype=str, chunksize=chunksize) as chunks:
+        for sms_data in chunks:
+            writer.write(sms_data)
+
+
+def read_parquet_report(root, columns=None, filters=None):
+    """Load a Parquet report, e.g. ``filters=[('year', '=', 2022), ('month', '=', 5)]``.
+
+    Only the partitions matching ``filters`` and only ``columns`` are read.
+    """
+    pa, _ = _pyarrow()
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(
+        pa.schema([(column, getattr(pa, INT_COLUMNS[column])()) for column in PARTITION_COLS]), flavor='hive'
+    )
+    return pd.read_parquet(root, columns=columns, filters=filters, partitioning=partitioning)
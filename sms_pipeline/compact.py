@@ -0,0 +1,198 @@
+"""Compact in-memory schema for report frames.
+
+A processed report keeps most columns as Python objects: the
+classification columns are object strings, ``time`` holds
+``datetime.time`` objects and the calendar fields are ``Int64``.
+``compact_frame`` stores the same values in far less memory:
+
+* text columns become categoricals when that is smaller (low-cardinality
+  columns, and repeated message texts), otherwise Arrow-backed strings;
+* flags stay one-byte bools, or become nullable ``boolean`` when values
+  are missing;
+* ``day``/``month``/``year`` become ``UInt8``/``UInt8``/``UInt16``, and
+  amounts ``float32`` only when every value survives the round trip;
+* ``time`` becomes integer seconds since midnight (``UInt32``).
+
+``expand_frame`` undoes the conversions that change how a value is
+written, so a compacted frame writes the same CSV.  ``compact_report``
+compacts a processed frame, as the pipeline does with ``--compact``;
+``load_report`` reads a report CSV back, compacting it chunk by chunk.
+``report_memory`` gives the bytes of a frame's report columns, and
+``memory_report`` compares two frames column by column.
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from .columnar import BOOL_COLUMNS, FLOAT_COLUMNS
+from .stages import report_columns
+
+INT_COLUMNS = {'day': 'UInt8', 'month': 'UInt8', 'year': 'UInt16'}
+TIME_COLUMN = 'time'
+TIME_DTYPE = 'UInt32'
+
+
+def _string_dtype():
+    # Arrow-backed strings where pyarrow is installed, Python strings otherwise
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return pd.StringDtype('python')
+    return pd.StringDtype('pyarrow')
+
+
+def frame_memory(frame):
+    """Bytes used by every column of ``frame`` (and its index), strings included."""
+    return frame.memory_usage(index=True, deep=True)
+
+
+def _compact_text(values):
+    strings = values.astype(_string_dtype())
+    categories = strings.astype('category')
+    if categories.memory_usage(deep=True) < strings.memory_usage(deep=True):
+        return categories
+    return strings
+
+
+def _compact_float(values):
+    narrow = values.astype(np.float32)
+    if np.array_equal(narrow.to_numpy(dtype=np.float64), values.to_numpy(dtype=np.float64), equal_nan=True):
+        return narrow
+    return values
+
+
+def _compact_bool(values):
+    if values.dtype == bool:
+        return values
+    flags = values.map({True: True, False: False, 'True': True, 'False': False}).astype('boolean')
+    return flags.astype(bool) if not flags.isna().any() else flags
+
+
+def _time_seconds(values):
+    # datetime.time objects (or "HH:MM:SS" strings) as seconds since
+    # midnight; None where a time has fractions of a second to lose
+    times = values.astype(object)
+    present = times[times.notna()]
+    if all(type(value) is datetime.time for value in present):
+        # The usual case, straight from the stages; much faster than parsing
+        if any(value.microsecond for value in present):
+            return None
+        seconds = pd.Series(pd.NA, index=times.index, dtype=TIME_DTYPE)
+        seconds[present.index] = [value.hour * 3600 + value.minute * 60 + value.second for value in present]
+        return seconds
+    since_midnight = pd.to_timedelta(times.map(str, na_action='ignore'), errors='coerce')
+    if (since_midnight.dropna() % pd.Timedelta(seconds=1) != pd.Timedelta(0)).any():
+        return None
+    return (since_midnight // pd.Timedelta(seconds=1)).astype(TIME_DTYPE)
+
+
+def compact_frame(frame):
+    """A copy of the report ``frame`` in the compact schema (see the module docstring)."""
+    compact = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column in FLOAT_COLUMNS:
+            compact[column] = _compact_float(pd.to_numeric(values, errors='coerce'))
+        elif column in INT_COLUMNS:
+            compact[column] = pd.to_numeric(values, errors='coerce').astype(INT_COLUMNS[column])
+        elif column in BOOL_COLUMNS:
+            compact[column] = _compact_bool(values)
+        elif column == TIME_COLUMN:
+            seconds = _time_seconds(values)
+            compact[column] = values if seconds is None else seconds
+        elif values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+            compact[column] = _compact_text(values)
+        else:
+            compact[column] = values
+    return pd.DataFrame(compact, index=frame.index)
+
+
+def compact_report(frame):
+    """``compact_frame`` of the report columns of a processed ``frame``; working columns are kept as they are."""
+    compact = compact_frame(report_columns(frame))
+    for column in frame.columns:
+        if column not in compact.columns:
+            compact[column] = frame[column]
+    return compact[list(frame.columns)]
+
+
+def expand_frame(frame):
+    """Undo ``compact_frame`` where it changes how values are written out."""
+    frame = frame.copy(deep=False)
+    for column in FLOAT_COLUMNS:
+        if column in frame and frame[column].dtype == np.float32:
+            frame[column] = frame[column].astype(np.float64)
+    if TIME_COLUMN in frame and str(frame[TIME_COLUMN].dtype) == TIME_DTYPE:
+        seconds = frame[TIME_COLUMN]
+        frame[TIME_COLUMN] = seconds.astype(object).map(
+            lambda value: datetime.time(value // 3600, value // 60 % 60, value % 60), na_action='ignore')
+    return frame
+
+
+def _typed(frame):
+    # A report chunk read as text, with the dtypes the stages produce
+    for column in frame.columns:
+        if column in FLOAT_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+        elif column in INT_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').astype('Int64')
+        elif column in BOOL_COLUMNS:
+            frame[column] = _compact_bool(frame[column])
+        elif column == TIME_COLUMN:
+            frame[column] = pd.to_datetime(frame[column], format='%H:%M:%S', errors='coerce').dt.time
+    return frame
+
+
+def _concat(frames):
+    # Chunks pick their own categories, or categories in one chunk and
+    # strings in another; text columns are joined as strings and their form
+    # picked again, since values repeated across chunks only show up here
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for column in frames[0].columns:
+        parts = [frame[column] for frame in frames]
+        if any(isinstance(part.dtype, pd.CategoricalDtype) or part.dtype == _string_dtype() for part in parts):
+            columns[column] = _compact_text(pd.concat([part.astype(_string_dtype()) for part in parts],
+                                                      ignore_index=True))
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def load_report(path, compact=True, chunksize=100_000):
+    """Read the report CSV at ``path`` with the dtypes the stages produce.
+
+    With ``compact``, every chunk is compacted as it is read, so the plain
+    frame never has to fit in memory.
+    """
+    frames = []
+    with pd.read_csv(path, dtype=str, chunksize=chunksize) as chunks:
+        for chunk in chunks:
+            chunk = _typed(chunk)
+            frames.append(compact_frame(chunk) if compact else chunk)
+    if not frames:
+        return pd.read_csv(path, dtype=str)
+    if compact:
+        return _concat(frames)
+    return pd.concat(frames)
+
+
+def memory_report(before, after):
+    """Per-column bytes and dtypes of ``before`` and ``after``, with a total row."""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': frame_memory(before).drop('Index'),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_after': frame_memory(after).drop('Index'),
+    })
+    report.loc['total'] = ['', int(frame_memory(before).sum()), '', int(frame_memory(after).sum())]
+    report['ratio'] = (report['bytes_before'] / report['bytes_after']).round(2)
+    return report
+
+
+def report_memory(frame):
+    """Bytes used by the report columns of ``frame``."""
+    return int(frame_memory(report_columns(frame)).drop('Index').sum())
@@ -0,0 +1,280 @@
+"""Duplicate messages of one transaction, across senders.
+
+One payment often sends several SMS: the bank's, the UPI app's and the
+merchant's, or the same alert twice.  Every one of them lands in the
+report and adds to the amounts.  ``find_duplicates`` groups them without
+comparing every pair of messages:
+
+* blocking: only messages of the same user and amount that are at most
+  ``window`` apart are candidates (rows are sorted once, so this is a
+  neighbour check).  The transaction type is left out: the merchant's
+  "payment received" is classified ``Credited`` while the bank's and the
+  app's messages of the same payment are debits;
+* references: candidates quoting the same reference number are joined on
+  that alone; the bank's, the UPI app's and the merchant's SMS of one
+  payment share little wording but all quote its UPI reference.  A
+  reference number has ``REFERENCE_DIGITS`` or more digits, is not the
+  amount, and is only quoted within one window: a helpline quoted all
+  month long is no reference;
+* MinHash: every candidate text becomes ``NUM_PERM`` minimum hashes of its
+  lower-cased words, an estimate of the Jaccard similarity of two word
+  sets.  Numbers are kept: reference numbers, dates and balances are what
+  tell two payments of the same amount apart;
+* LSH: the signature is cut into ``BANDS`` bands; messages sharing a band
+  in the same block and window are compared, and joined when their
+  estimated similarity is at least ``threshold`` and they quote the same
+  reference numbers and dates (``REFERENCE_PATTERN``), which a shared
+  template alone cannot fake.
+
+Joined messages form a transaction group; its ``transaction_group_id`` is
+the report row of its canonical message, which is a bank's message if
+there is one, then one that is not a credit (the merchant's side of a
+payment), then the earliest.  ``rollup(..., canonical_only=True)``
+then counts every transaction once:
+
+    python -m sms_pipeline.dedup updated_dataset_with_platform.csv --rollup
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from .ledger import ledger_times
+from .rollup import CANONICAL_COLUMN, rollup, rollup_path_for, write_rollup
+from .spam import word_hashes
+
+GROUP_COLUMN = 'transaction_group_id'
+BLOCK_COLUMNS = ['id']
+DEFAULT_WINDOW = pd.Timedelta(minutes=10)
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 60
+BANDS = 20
+# Numbers that identify one payment (long references and account numbers,
+# dates): two messages quoting different ones are different transactions,
+# however similar the rest of the text
+REFERENCE_PATTERN = r'\d{6,}|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b'
+# Digits of the shortest number that can be a payment's reference on its
+# own (see _reference_pairs)
+REFERENCE_DIGITS = 6
+
+_EMPTY = np.iinfo(np.uint64).max
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def dedup_path_for(output_path):
+    # Reports.csv -> Reports_dedup.csv
+    base, ext = os.path.splitext(output_path)
+    return f'{base}_dedup{ext or ".csv"}'
+
+
+def _permutations(num_perm, seed=0):
+    # Odd multipliers and offsets of the hash permutations (mod 2**64)
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, _EMPTY, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+    return multipliers, rng.integers(0, _EMPTY, size=num_perm, dtype=np.uint64, endpoint=True)
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM):
+    """The MinHash signature of the word set of every text: an array of ``len(texts)`` x ``num_perm``.
+
+    A text without words gets a signature no other text shares.
+    """
+    rows, hashes = word_hashes(texts, mask_digits=False)
+    signatures = np.full((len(texts), num_perm), _EMPTY, dtype=np.uint64)
+    if not len(rows):
+        return signatures
+    # Words are in row order, so every row is one segment
+    starts = np.flatnonzero(np.diff(rows, prepend=-1))
+    multipliers, offsets = _permutations(num_perm)
+    with np.errstate(over='ignore'):
+        for permutation in range(num_perm):
+            permuted = hashes * multipliers[permutation] + offsets[permutation]
+            signatures[rows[starts], permutation] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def _block_ids(report):
+    # One id per (user, amount); -1 where there is no amount
+    amount = pd.to_numeric(report['amount'], errors='coerce').round(2)
+    codes = np.zeros(len(report), dtype=np.int64)
+    for key in [report[column] for column in BLOCK_COLUMNS if column in report] + [amount]:
+        key_codes, uniques = pd.factorize(key, use_na_sentinel=False)
+        codes, _ = pd.factorize(codes * (len(uniques) + 1) + key_codes)
+    return np.where(amount.notna().to_numpy(), codes, -1)
+
+
+def _numbers_arrow(texts, pa, pc):
+    texts = pa.array(texts, type=pa.large_string())
+    if isinstance(texts, pa.ChunkedArray):
+        texts = texts.combine_chunks()
+    parts = pc.split_pattern_regex(texts, r'[^0-9]+')
+    numbers, rows = pc.list_flatten(parts), pc.list_parent_indices(parts)
+    long = pc.greater_equal(pc.utf8_length(numbers), REFERENCE_DIGITS)
+    return rows.filter(long).to_numpy(), numbers.filter(long).to_numpy(zero_copy_only=False)
+
+
+def _numbers_pandas(texts):
+    found = texts.astype(object).str.findall(f'[0-9]{{{REFERENCE_DIGITS},}}')
+    rows = np.repeat(np.arange(len(texts)), found.str.len().to_numpy(dtype=np.int64))
+    return rows, np.array([number for numbers in found for number in numbers], dtype=object)
+
+
+def _numbers(texts):
+    # Every run of at least REFERENCE_DIGITS digits in texts, with its row position
+    texts = texts.fillna('').astype(str).reset_index(drop=True)
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return _numbers_pandas(texts)
+    return _numbers_arrow(texts, pa, pc)
+
+
+def _references(texts):
+    # The distinct reference numbers and dates of every text, as one key
+    found = texts.fillna('').astype(str).str.findall(REFERENCE_PATTERN)
+    return found.map(lambda numbers: ' '.join(sorted(set(numbers)))).to_numpy(dtype=object)
+
+
+def _neighbours(keys, times, window):
+    # Pairs of positions with the same key, next to each other in (key,
+    # time) order and at most window apart
+    order = np.lexsort((times, keys))
+    keys, times = keys[order], times[order]
+    close = (keys[1:] == keys[:-1]) & (times[1:] - times[:-1] <= window)
+    return order[:-1][close], order[1:][close]
+
+
+def _reference_pairs(texts, blocks, amounts, times, window):
+    # Pairs of rows quoting the same reference number, next to each other
+    # in their block and window.  A reference number is not the amount,
+    # and all the messages quoting it are within one window: a number
+    # quoted further apart (a helpline, the user's phone) names no payment
+    valid = np.flatnonzero(blocks >= 0)
+    rows, numbers = _numbers(texts.iloc[valid])
+    rows = valid[rows]
+    codes, uniques = pd.factorize(numbers)
+    first = np.full(len(uniques), np.iinfo(np.int64).max)
+    last = np.full(len(uniques), np.iinfo(np.int64).min)
+    np.minimum.at(first, codes, times[rows])
+    np.maximum.at(last, codes, times[rows])
+    reference = (last - first <= window)[codes] & (uniques.astype(float)[codes] != amounts[rows])
+    rows, codes = rows[reference], codes[reference]
+    keys = blocks[rows] * len(uniques) + codes
+    first, second = _neighbours(keys, times[rows], window)
+    return rows[first], rows[second]
+
+
+def _components(n, first, second):
+    # Connected components of the pairs: the smallest member of each
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[first], labels[second])
+        updated = labels.copy()
+        np.minimum.at(updated, first, low)
+        np.minimum.at(updated, second, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _canonical_rank(report, times):
+    # Report rows, most canonical first: bank messages, then the user's
+    # side of the payment (a merchant's "received" is the other side),
+    # then the earliest
+    if 'platform_is_bank' in report:
+        not_bank = ~report['platform_is_bank'].astype(str).eq('True').to_numpy()
+    else:
+        not_bank = np.zeros(len(report), dtype=bool)
+    if 'transaction_type' in report:
+        credited = report['transaction_type'].astype(str).eq('Credited').to_numpy()
+    else:
+        credited = np.zeros(len(report), dtype=bool)
+    return np.lexsort((np.arange(len(report)), times, credited, not_bank))
+
+
+def find_duplicates(report, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+    """The transaction group of every report row, and whether the row is its canonical message.
+
+    Returns ``transaction_group_id`` (the report row, counted from 0, of
+    the group's canonical message) and ``canonical``, indexed like
+    ``report``.  A message without duplicates is its own group.
+    """
+    times = ledger_times(report).to_numpy(dtype='datetime64[ns]', na_value=np.datetime64('NaT')).view(np.int64)
+    blocks = _block_ids(report)
+    blocks[times == np.iinfo(np.int64).min] = -1
+    window = pd.Timedelta(window).value
+
+    # Blocking: rows with a neighbour in their block and window
+    first, second = _neighbours(blocks, times, window)
+    first, second = first[blocks[first] >= 0], second[blocks[first] >= 0]
+    candidates = np.unique(np.concatenate([first, second]))
+
+    pairs = []
+    if len(candidates):
+        amounts = pd.to_numeric(report['amount'], errors='coerce').to_numpy()
+        pairs.append(np.stack(_reference_pairs(report['text'], blocks, amounts, times, window)))
+
+        signatures = minhash_signatures(report['text'].iloc[candidates], num_perm)
+        references = _references(report['text'].iloc[candidates])
+        rows_per_band = num_perm // bands
+        for band in range(bands):
+            values = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+            key = blocks[candidates].astype(np.uint64)
+            with np.errstate(over='ignore'):
+                for column in range(rows_per_band):
+                    key = (key * _MIX) ^ values[:, column]
+            left, right = _neighbours(key, times[candidates], window)
+            similarity = (signatures[left] == signatures[right]).mean(axis=1)
+            similar = ((similarity >= threshold) & (signatures[left, 0] != _EMPTY)
+                       & (references[left] == references[right]))
+            pairs.append(np.stack([candidates[left[similar]], candidates[right[similar]]]))
+    pairs = np.concatenate(pairs, axis=1) if pairs else np.empty((2, 0), dtype=np.int64)
+
+    # Number members by rank so every component's smallest label is its canonical row
+    rank = _canonical_rank(report, times)
+    position = np.empty(len(report), dtype=np.int64)
+    position[rank] = np.arange(len(report))
+    group = rank[_components(len(report), position[pairs[0]], position[pairs[1]])][position]
+    return pd.DataFrame({GROUP_COLUMN: group, CANONICAL_COLUMN: group == np.arange(len(report))}, index=report.index)
+
+
+def mark_duplicates(report, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+    """``report`` with the ``transaction_group_id`` and ``canonical`` columns of ``find_duplicates``."""
+    groups = find_duplicates(report, window, threshold)
+    report = report.copy()
+    report[GROUP_COLUMN] = groups[GROUP_COLUMN]
+    report[CANONICAL_COLUMN] = groups[CANONICAL_COLUMN]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sms_pipeline.dedup',
+                                     description='Group the messages of a report CSV that report the same transaction.')
+    parser.add_argument('report', help='report CSV (e.g. updated_dataset_with_platform.csv)')
+    parser.add_argument('-o', '--output', help='report with the group columns to write (default: <report>_dedup.csv)')
+    parser.add_argument('--window-minutes', type=float, default=DEFAULT_WINDOW / pd.Timedelta(minutes=1),
+                        help='longest time between two messages of one transaction (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='least word-set similarity of two messages of one transaction (default: %(default)s)')
+    parser.add_argument('--rollup', action='store_true',
+                        help='also write <output>_rollup.csv, counting only the canonical messages')
+    args = parser.parse_args(argv)
+
+    output_path = args.output or dedup_path_for(args.report)
+    report = pd.read_csv(args.report, dtype=str)
+    report = mark_duplicates(report, pd.Timedelta(minutes=args.window_minutes), args.threshold)
+    report.to_csv(output_path, index=False)
+    if args.rollup:
+        write_rollup(rollup(report, canonical_only=True), rollup_path_for(output_path))
+    duplicates = int((~report[CANONICAL_COLUMN]).sum())
+    groups = report.loc[~report[CANONICAL_COLUMN], GROUP_COLUMN].nunique()
+    print(f"{duplicates} of {len(report)} messages duplicate another in {groups} transaction groups; "
+          f"saved to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""Incremental runs that only process rows not seen by the previous run.
+
+Next to the report, ``<output>.state.json`` keeps the ``updateAt``
+watermark of the last run and ``<output>.state.npz`` one fingerprint per
+input row (in input order) plus whether that row made it into the report.
+A new run fingerprints the input, processes only rows whose fingerprint
+is new, and then either appends them (the usual case: new SMS at the end
+of the export) or merges them with the existing report rows in input
+order.  A merge copies the records of the old report and of the new rows
+by byte offset, so it holds offsets rather than records in memory.  Either
+way the report is byte-identical to a full rebuild, which stays available
+with ``full_rebuild=True``.
+
+The state also keeps the keyword and bank lists of the last run and, in
+``<output>.tokens.npz``, the ``token_index.TokenIndex`` of the input rows.
+When the lists the report depends on have changed since, only the rows
+with an added or removed term are processed again and merged in place.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .accounts import account_index_from_csv, account_index_path_for, csv_file_spans, write_account_index
+from .columnar import parquet_path_for, rewrite_parquet_from_csv
+from .metrics import measured, measured_reads
+from .pipeline import process_frame
+from .rollup import rollup_from_csv, rollup_path_for, write_rollup
+from .stages import REPORTS
+from .store import rebuild_store_from_csv, store_path_for
+from .streaming import DEFAULT_CHUNKSIZE, INPUT_PATH, output_path_for, read_sms, write_chunks
+from .timestamps import parse_update_at
+from .token_index import IndexBuilder, TokenIndex, report_rules, rule_sets
+
+STATE_VERSION = 2
+
+# Mixed into the fingerprint of the 2nd, 3rd, ... copy of an identical row
+_OCCURRENCE_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def state_paths(output_path):
+    return output_path + '.state.json', output_path + '.state.npz'
+
+
+def token_index_path(output_path):
+    return output_path + '.tokens.npz'
+
+
+def load_state(output_path, report):
+    """Return the saved state for ``output_path``, or None if it is unusable."""
+    json_path, npz_path = state_paths(output_path)
+    paths = [output_path, json_path, npz_path, token_index_path(output_path)]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    with open(json_path) as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION or state.get('report') != report:
+        return None
+    with np.load(npz_path) as arrays:
+        state['keys'] = arrays['keys']
+        state['emitted'] = arrays['emitted']
+    return state
+
+
+def save_state(output_path, report, columns, keys, emitted, watermark, rules, token_index):
+    json_path, npz_path = state_paths(output_path)
+    np.savez(npz_path, keys=keys, emitted=emitted)
+    token_index.save(token_index_path(output_path))
+    with open(json_path, 'w') as f:
+        json.dump({
+            'version': STATE_VERSION,
+            'report': report,
+            'columns': columns,
+            'rows': int(len(keys)),
+            'watermark': None if pd.isna(watermark) else watermark.isoformat(),
+            'rules': rules,
+        }, f, indent=2)
+
+
+def fingerprint_input(file_path=INPUT_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    """Fingerprint every input row; return ``(keys, update_at, columns)``.
+
+    Identical rows get distinct keys (by occurrence), so duplicate SMS in
+    the export are tracked one by one.
+    """
+    hashes = []
+    stamps = []
+    columns = None
+    with read_sms(file_path, chunksize=chunksize) as chunks:
+        for chunk in chunks:
+            columns = list(chunk.columns)
+            hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+            stamps.append(parse_update_at(chunk['updateAt']).dt.tz_localize(None).to_numpy())
+    hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+    stamps = np.concatenate(stamps) if stamps else np.empty(0, dtype='datetime64[ns]')
+
+    # Number each row among the earlier rows with the same hash
+    order = np.argsort(hashes, kind='stable')
+    ordered = hashes[order]
+    positions = np.arange(len(hashes))
+    run_starts = np.maximum.accumulate(np.where(np.r_[True, ordered[1:] != ordered[:-1]], positions, 0))
+    occurrence = np.empty(len(hashes), dtype=np.uint64)
+    occurrence[order] = (positions - run_starts).astype(np.uint64)
+
+    update_at = pd.Series(stamps).dt.tz_localize('UTC') if len(stamps) else pd.Series(dtype='datetime64[ns, UTC]')
+    return hashes ^ (occurrence * _OCCURRENCE_MIX), update_at, columns
+
+
+def process_rows(file_path, report, chunksize, selected, templates=False, metrics=None, spam_model=None,
+                 index=None, amount_details=False):
+    """Yield processed frames for the input rows where ``selected`` is True.
+
+    Frames keep the input row number as their index.  ``index`` (an
+    ``IndexBuilder``) is given every input chunk on the way.
+    """
+    with read_sms(file_path, chunksize=chunksize) as chunks:
+        for sms_data in measured_reads(chunks, metrics):
+            if index is not None:
+                with measured(metrics, 'token_index', len(sms_data)):
+                    index.add(sms_data)
+            yield process_frame(sms_data[selected[sms_data.index]], report, templates, metrics, spam_model,
+                                amount_details)
+
+
+def _record_emitted(frames, emitted):
+    for sms_data in frames:
+        emitted[sms_data.index.to_numpy()] = True
+        yield sms_data
+
+
+def run_incremental(file_path=INPUT_PATH, output_path=None, report='reports',
+                    chunksize=DEFAULT_CHUNKSIZE, full_rebuild=False, formats=('csv',), rollup=False,
+                    templates=False, metrics=None, account_index=False, spam_model=None,
+                    store=False, compact=False, amount_details=False):
+    """Bring the report up to date with the input, processing only new rows.
+
+    Returns the ``write_chunks`` summary of the rows processed in this run
+    plus ``mode`` (``'rebuild'``, ``'append'`` or ``'merge'``) and the
+    number of ``new_rows`` in the input.  The CSV report is always written,
+    since merges work on it; ``'parquet'`` in ``formats`` keeps the Parquet
+    copy in step, and ``rollup=True`` the aggregate table: new rows are
+    merged into it, and after a merge it is rebuilt from the report.  The
+    account index (``account_index=True``) and the SQLite store
+    (``store=True``) are kept up to date the same way.  ``compact`` holds
+    the processed frames in the compact schema while they are written.
+    New rows go through ``spam_model`` if given; a report written without
+    one needs a full rebuild to gain the ``spam_score`` column, and the
+    same goes for ``amount_details`` and ``available_balance``.  Rows whose
+    classification may have changed with the keyword or bank lists are
+    processed again as well; the summary counts them as ``reclassified_rows``.
+    """
+    formats = set(formats) | {'csv'}
+    output_path = output_path or output_path_for(report)
+    state = None if full_rebuild else load_state(output_path, report)
+    keys, update_at, columns = fingerprint_input(file_path, chunksize)
+    emitted = np.zeros(len(keys), dtype=bool)
+    rules = rule_sets()
+
+    if state is not None and state['columns'] != columns:
+        state = None
+
+    if state is None:
+        mode = 'rebuild'
+        is_new = unseen = np.ones(len(keys), dtype=bool)
+        index = IndexBuilder(unseen)
+        frames = _record_emitted(process_rows(file_path, report, chunksize, is_new, templates, metrics, spam_model,
+                                              index, amount_details), emitted)
+        summary = write_chunks(frames, output_path, formats=formats, rollup=rollup, metrics=metrics,
+                               account_index=account_index, store=store, compact=compact)
+        token_index = index.result()
+    else:
+        old_keys, old_emitted = state['keys'], state['emitted']
+        # Rows after the watermark are new without a lookup; the rest are new
+        # when their fingerprint was not seen (late or edited messages)
+        is_new = np.ones(len(keys), dtype=bool)
+        if state['watermark'] is not None:
+            watermark = pd.Timestamp(state['watermark'])
+            maybe_seen = (update_at <= watermark).to_numpy() | update_at.isna().to_numpy()
+        else:
+            maybe_seen = np.ones(len(keys), dtype=bool)
+        is_new[maybe_seen] = ~np.isin(keys[maybe_seen], old_keys)
+        unseen = is_new.copy()
+
+        # Where every seen row was in the previous input, and back
+        seen = np.flatnonzero(~unseen)
+        old_order = np.argsort(old_keys)
+        previous = old_order[np.searchsorted(old_keys[old_order], keys[seen])]
+        old_rows = np.full(len(old_keys), -1, dtype=np.int64)
+        old_rows[previous] = seen
+
+        # Seen rows that may classify differently under the current lists
+        old_index = TokenIndex.load(token_index_path(output_path))
+        with measured(metrics, 'token_index'):
+            changed = old_index.changed_rows(state['rules'], rules, report_rules(REPORTS[report]), len(old_keys))
+        is_new[seen] |= changed[previous]
+        index = IndexBuilder(unseen)
+
+        n_old = len(old_keys)
+        if len(keys) >= n_old and np.array_equal(keys[:n_old], old_keys) and not changed.any():
+            mode = 'append'
+            emitted[:n_old] = old_emitted
+            frames = _record_emitted(process_rows(file_path, report, chunksize, is_new, templates, metrics,
+                                                  spam_model, index, amount_details), emitted)
+            summary = write_chunks(frames, output_path, append=True, formats=formats, rollup=rollup, metrics=metrics,
+                                   account_index=account_index, store=store, compact=compact)
+        else:
+            mode = 'merge'
+            summary = _merge_csv(file_path, output_path, report, chunksize, keys, is_new, emitted,
+                                 old_keys, old_emitted, templates, metrics, spam_model, index, compact,
+                                 amount_details)
+            if 'parquet' in formats:
+                with measured(metrics, 'parquet'):
+                    rewrite_parquet_from_csv(output_path, parquet_path_for(output_path), chunksize)
+            if rollup:
+                with measured(metrics, 'rollup'):
+                    write_rollup(rollup_from_csv(output_path, chunksize), rollup_path_for(output_path))
+            if account_index:
+                with measured(metrics, 'account_index'):
+                    write_account_index(account_index_from_csv(output_path, chunksize),
+                                        account_index_path_for(output_path))
+            if store:
+                with measured(metrics, 'store'):
+                    rebuild_store_from_csv(output_path, store_path_for(output_path), np.flatnonzero(emitted), chunksize)
+
+        with measured(metrics, 'token_index'):
+            token_index = TokenIndex.concat([old_index, index.result()], [old_rows, None])
+
+    save_state(output_path, report, columns, keys, emitted, update_at.max(), rules, token_index)
+    summary.update(mode=mode, new_rows=int(unseen.sum()), reclassified_rows=int((is_new & ~unseen).sum()))
+    return summary
+
+
+def _merge_csv(file_path, output_path, report, chunksize, keys, is_new, emitted, old_keys, old_emitted,
+               templates=False, metrics=None, spam_model=None, index=None, compact=False, amount_details=False):
+    # Where every existing report record is in the CSV, in the order of
+    # the previous input rows that produced them
+    old_offsets, old_lengths = csv_file_spans(output_path)
+    header_length = int(old_lengths[0]) if len(old_lengths) else 0
+    old_offsets, old_lengths = old_offsets[1:], old_lengths[1:]
+    old_record_index = np.cumsum(old_emitted) - 1
+    old_order = np.argsort(old_keys)
+    previous = old_order[np.searchsorted(old_keys[old_order], keys).clip(max=len(old_keys) - 1)]
+
+    # Write the processed new rows to a side file; their input row numbers
+    # come in order, so it is read back front to back
+    processed_rows = []
+    new_path = output_path + '.new.tmp'
+    frames = _record_emitted(process_rows(file_path, report, chunksize, is_new, templates, metrics, spam_model,
+                                          index, amount_details), emitted)
+    summary = write_chunks((_remember_index(sms_data, processed_rows) for sms_data in frames), new_path,
+                           metrics=metrics, compact=compact)
+    new_rows = np.concatenate(processed_rows) if processed_rows else np.empty(0, dtype=np.int64)
+    if os.path.exists(new_path):
+        new_offsets, new_lengths = csv_file_spans(new_path)
+        new_offsets, new_lengths = new_offsets[1:], new_lengths[1:]
+    else:
+        open(new_path, 'wb').close()
+        new_offsets = new_lengths = np.empty(0, dtype=np.int64)
+
+    # The records of both files in input order; runs of records that are
+    # adjacent in the same file are copied in one go
+    old_rows = np.flatnonzero(~is_new & old_emitted[previous])
+    emitted[old_rows] = True
+    old_records = old_record_index[previous[old_rows]]
+    order = np.argsort(np.concatenate([new_rows, old_rows]), kind='stable')
+    from_new = np.concatenate([np.ones(len(new_rows), dtype=bool), np.zeros(len(old_rows), dtype=bool)])[order]
+    starts = np.concatenate([new_offsets, old_offsets[old_records]])[order]
+    lengths = np.concatenate([new_lengths, old_lengths[old_records]])[order]
+    breaks = np.r_[True, (from_new[1:] != from_new[:-1]) | (starts[1:] != starts[:-1] + lengths[:-1])]
+    run_starts = np.flatnonzero(breaks[:len(order)])
+    run_lengths = np.add.reduceat(lengths, run_starts)
+
+    tmp_path = output_path + '.tmp'
+    with measured(metrics, 'merge_csv', len(keys)) as counts, open(output_path, 'rb') as old, \
+            open(new_path, 'rb') as new, open(tmp_path, 'wb') as f:
+        f.write(old.read(header_length))
+        for source, start, length in zip(from_new[run_starts], starts[run_starts], run_lengths):
+            _copy_bytes(new if source else old, f, int(start), int(length))
+        counts['rows_out'] = len(order)
+    os.replace(tmp_path, output_path)
+    os.remove(new_path)
+    return summary
+
+
+def _copy_bytes(source, target, start, length, block_size=1 << 24):
+    # Copy ``length`` bytes of ``source`` from ``start`` on to ``target``
+    source.seek(start)
+    while length > 0:
+        block = source.read(min(block_size, length))
+        if not block:
+            break
+        target.write(block)
+        length -= len(block)
+
+
+def _remember_index(sms_data, processed_rows):
+    processed_rows.append(sms_data.index.to_numpy())
+    return sms_data
@@ -0,0 +1,90 @@
+"""Word-level Aho-Corasick automaton for keyword vocabularies.
+
+The classifier used one ``\\b(a|b|...)\\b`` regex per vocabulary, so every
+message was scanned once per list.  ``KeywordAutomaton`` holds all of them
+at once: a message is split into words in a single regex pass and the
+words are walked through one trie with failure links, which reports every
+vocabulary hit, overlapping ones included, in time linear in the message
+length no matter how many keywords there are.
+
+Semantics match the regexes exactly: keywords only match whole words
+(``\\b`` on both sides), case-insensitively, and a multi-word keyword only
+matches when its words are separated by a single space.
+"""
+
+import re
+from collections import deque
+
+# Words, and everything that may not sit inside a phrase: any run of
+# non-word characters other than one plain space ends the current phrase.
+_TOKEN = re.compile(r'\w+|[^\w ]+| {2,}')
+
+# Characters that ``re.IGNORECASE`` equates with i and s but ``str.lower``
+# does not (U+0130 would also lower to two characters)
+_FOLD = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+
+
+class KeywordAutomaton:
+    """Scan text for several keyword vocabularies at once.
+
+    ``vocabularies`` maps a label to its keywords.  ``scan`` returns a bit
+    mask with bit ``i`` set when a keyword of ``labels[i]`` occurs.
+    """
+
+    def __init__(self, vocabularies):
+        self.labels = list(vocabularies)
+        self.bits = {label: 1 << i for i, label in enumerate(self.labels)}
+
+        # State 0 is the root; goto[s] maps a word to the next state
+        self.goto = [{}]
+        self.output = [0]
+        for label, keywords in vocabularies.items():
+            for keyword in keywords:
+                state = 0
+                for word in keyword.lower().split(' '):
+                    if word not in self.goto[state]:
+                        self.goto.append({})
+                        self.output.append(0)
+                        self.goto[state][word] = len(self.goto) - 1
+                    state = self.goto[state][word]
+                self.output[state] |= self.bits[label]
+
+        # Breadth-first failure links; each state inherits the output of
+        # the longest keyword suffix it ends in
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0) if state else 0
+                self.output[child] |= self.output[self.fail[child]]
+                queue.append(child)
+
+        self.first_words = frozenset(self.goto[0])
+
+    def scan(self, text):
+        text = text.lower() if text.isascii() else text.translate(_FOLD).lower()
+        tokens = _TOKEN.findall(text)
+        # Most messages share no word with any vocabulary
+        if self.first_words.isdisjoint(tokens):
+            return 0
+
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        found = 0
+        for token in tokens:
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            found |= output[state]
+        return found
+
+    def mask(self, *labels):
+        """Bit mask covering ``labels``, for testing ``scan`` results."""
+        found = 0
+        for label in labels:
+            found |= self.bits[label]
+        return found
@@ -0,0 +1,278 @@
+"""Per-account running ledger of a report, checked against quoted balances.
+
+``build_ledger`` sorts the report rows once by ledger account and time and
+then works on whole columns: cumulative debits and credits and the running
+net flow per account are grouped cumulative sums.  An account is the
+masked account number (``account_key``), or the sender where the message
+names none, within one user (``id``) when the report has that column.
+
+Many bank SMS quote the balance after the transaction ("Avl Bal Rs
+5,000.00", see ``amounts.amount_details``).  A quote anchors the account:
+``balance_estimate`` is the last quoted balance plus the net flow since,
+and ``balance_gap`` is how far a new quote is from what the ledger
+expected just before it (missed or misread messages show up there).
+
+With ``state`` (``LedgerState``), a batch starts from where the previous
+one left each account instead of from zero, so new report rows never
+require recomputing the history; ``state.update`` carries the batch's end
+state forward.  This assumes new rows are later than the ones already
+booked; a late message is booked after them.
+
+The state also keeps a ``ReportWatermark``: how many report rows are
+booked, where they end in the CSV and a hash of everything before that,
+so ``run_ledger --incremental`` reads and books only the rows appended to
+the report since.  A report rewritten in between (rebuilt, merged by an
+incremental pipeline run, or with rows reclassified in place) no longer
+starts with the booked bytes; its ledger is rebuilt instead.
+"""
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from .accounts import account_key, csv_file_spans
+from .amounts import amount_details
+from .stages import BALANCE_COLUMN, TIMESTAMP_COLUMN
+
+USER_COLUMN = 'id'
+LEDGER_COLUMNS = [
+    'ledger_account', 'ledger_time', 'cumulative_debit', 'cumulative_credit', 'running_net', 'quoted_balance',
+    'balance_estimate', 'balance_gap',
+]
+
+
+def ledger_path_for(output_path):
+    # Reports.csv -> Reports_ledger.csv
+    base, ext = os.path.splitext(output_path)
+    return f'{base}_ledger{ext or ".csv"}'
+
+
+def ledger_state_path_for(ledger_path):
+    # Reports_ledger.csv -> Reports_ledger_state.npz
+    return f'{os.path.splitext(ledger_path)[0]}_state.npz'
+
+
+def ledger_accounts(report):
+    """The ledger account of every row: user, then account number or sender."""
+    accounts = account_key(report['account_number']) if 'account_number' in report else None
+    senders = report['senderAddress'].fillna('').astype(str)
+    keys = senders if accounts is None else accounts.fillna(senders).astype(str)
+    if USER_COLUMN in report:
+        keys = report[USER_COLUMN].fillna('').astype(str) + '/' + keys
+    return keys
+
+
+def ledger_times(report):
+    """When every row happened: the parsed updateAt, or the report's date and time columns."""
+    if TIMESTAMP_COLUMN in report:
+        return pd.to_datetime(report[TIMESTAMP_COLUMN], utc=True)
+    # One formatted parse; a missing time is midnight
+    times = report['time'].astype(object).map(str, na_action='ignore').fillna('00:00:00')
+    stamps = (report['year'].astype(str) + '-' + report['month'].astype(str) + '-' + report['day'].astype(str)
+              + ' ' + times.astype(str))
+    return pd.to_datetime(stamps, format='%Y-%m-%d %H:%M:%S', errors='coerce').dt.tz_localize('UTC')
+
+
+def _hash_bytes(f, digest, length, block_size=1 << 24):
+    # Feed the next ``length`` bytes of ``f`` (fewer at the end of the file) to ``digest``
+    while length > 0:
+        block = f.read(min(block_size, length))
+        if not block:
+            break
+        digest.update(block)
+        length -= len(block)
+
+
+class ReportWatermark:
+    """How much of a report CSV is booked: ``rows`` records, ending at byte ``offset``.
+
+    ``digest`` is the SHA-1 of every byte up to ``offset``, so any change
+    to the booked rows (a rebuild, a merge, a reclassified row of the same
+    length) is told apart from rows appended after them.
+    """
+
+    def __init__(self, rows=0, offset=0, digest=''):
+        self.rows = int(rows)
+        self.offset = int(offset)
+        self.digest = str(digest)
+
+    def read_new(self, report_path):
+        """The report rows after the watermark, indexed by report row, and the watermark after them.
+
+        None if the report no longer starts with the booked bytes.
+        """
+        starts, lengths = csv_file_spans(report_path, start=self.offset)
+        offset = self.offset
+        if not offset and len(starts):
+            # The header
+            offset = int(lengths[0])
+            starts, lengths = starts[1:], lengths[1:]
+        end = int(starts[-1] + lengths[-1]) if len(starts) else offset
+        digest = hashlib.sha1()
+        with open(report_path, 'rb') as f:
+            _hash_bytes(f, digest, self.offset)
+            if self.offset and digest.hexdigest() != self.digest:
+                return None
+            _hash_bytes(f, digest, end - self.offset)
+        report = pd.read_csv(report_path, dtype=str, nrows=0)
+        if len(starts):
+            with open(report_path, 'rb') as f:
+                f.seek(offset)
+                report = pd.read_csv(f, dtype=str, header=None, names=list(report.columns), nrows=len(starts))
+        report.index = pd.RangeIndex(self.rows, self.rows + len(report))
+        return report, ReportWatermark(self.rows + len(report), end, digest.hexdigest())
+
+    def to_arrays(self):
+        return {'watermark': np.array([self.rows, self.offset], dtype=np.int64), 'digest': np.array(self.digest)}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """The watermark saved in ``arrays``, or an empty one if there is none."""
+        if 'digest' not in arrays.files:
+            return cls()
+        return cls(*arrays['watermark'], digest=arrays['digest'])
+
+
+class LedgerState:
+    """Where the ledger left every account: running totals and the balance anchor.
+
+    ``watermark`` (``ReportWatermark``) is how much of the report is booked.
+    """
+
+    COLUMNS = ['cumulative_debit', 'cumulative_credit', 'anchor']
+
+    def __init__(self, accounts=None, values=None, watermark=None):
+        self.accounts = np.asarray(accounts if accounts is not None else [], dtype=str)
+        self.values = np.asarray(values if values is not None else np.empty((0, 3)), dtype=float).reshape(-1, 3)
+        self.watermark = watermark or ReportWatermark()
+
+    def lookup(self, accounts):
+        """The state of each of ``accounts`` (zeros, and no anchor, for new ones)."""
+        start = np.zeros((len(accounts), 3))
+        start[:, 2] = np.nan
+        if len(self.accounts):
+            position = np.searchsorted(self.accounts, accounts).clip(max=len(self.accounts) - 1)
+            known = self.accounts[position] == accounts
+            start[known] = self.values[position[known]]
+        return start
+
+    def update(self, ledger):
+        """Carry the end state of every account in ``ledger`` (a ``build_ledger`` result) forward."""
+        last = ledger.drop_duplicates('ledger_account', keep='last')
+        anchor = (last['balance_estimate'] - last['running_net']).to_numpy()
+        values = np.column_stack([last['cumulative_debit'], last['cumulative_credit'], anchor])
+        accounts = np.concatenate([self.accounts, last['ledger_account'].to_numpy(dtype=str)])
+        values = np.concatenate([self.values, values])
+        # The batch's entry wins over the earlier one for the same account
+        accounts, first = np.unique(accounts[::-1], return_index=True)
+        self.accounts, self.values = accounts, values[::-1][first]
+        return self
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, accounts=self.accounts, values=self.values, **self.watermark.to_arrays())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """The state saved at ``path``, or an empty one if there is none.
+
+        A state saved without a watermark cannot tell which rows it has
+        booked, so it is treated as none.
+        """
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as arrays:
+            if 'digest' not in arrays.files:
+                return cls()
+            return cls(arrays['accounts'], arrays['values'], ReportWatermark.from_arrays(arrays))
+
+
+def build_ledger(report, state=None):
+    """The ledger of the ``report`` rows, sorted by account and time.
+
+    Returns the report columns plus ``LEDGER_COLUMNS``, indexed by report
+    row.  Rows of one account at the same time keep their report order.
+    """
+    accounts = ledger_accounts(report)
+    times = ledger_times(report)
+    order = np.lexsort((np.arange(len(report)), times.to_numpy(dtype='datetime64[ns]', na_value=np.datetime64('NaT')),
+                        accounts.to_numpy(dtype=str)))
+    ledger = report.iloc[order].copy()
+    ledger['ledger_account'] = accounts.to_numpy(dtype=str)[order]
+    ledger['ledger_time'] = times.iloc[order].to_numpy()
+
+    start = (state or LedgerState()).lookup(ledger['ledger_account'].to_numpy(dtype=str))
+    debited = pd.to_numeric(ledger['debited_amount'], errors='coerce').fillna(0.0)
+    credited = pd.to_numeric(ledger['credited_amount'], errors='coerce').fillna(0.0)
+    groups = ledger['ledger_account']
+    ledger['cumulative_debit'] = debited.groupby(groups, sort=False).cumsum().to_numpy() + start[:, 0]
+    ledger['cumulative_credit'] = credited.groupby(groups, sort=False).cumsum().to_numpy() + start[:, 1]
+    ledger['running_net'] = ledger['cumulative_credit'] - ledger['cumulative_debit']
+
+    # A quote fixes the offset between the running net and the balance;
+    # it holds until the account's next quote.  A report built with
+    # amount_details already has it
+    if BALANCE_COLUMN in ledger:
+        quoted = pd.to_numeric(ledger[BALANCE_COLUMN], errors='coerce').astype(float)
+    else:
+        quoted = amount_details(ledger['text'])['available_balance']
+    ledger['quoted_balance'] = quoted
+    anchors = (quoted - ledger['running_net']).groupby(groups, sort=False)
+    anchor = anchors.ffill().fillna(pd.Series(start[:, 2], index=ledger.index))
+    previous_anchor = anchors.shift().groupby(groups, sort=False).ffill().fillna(
+        pd.Series(start[:, 2], index=ledger.index))
+    ledger['balance_estimate'] = anchor + ledger['running_net']
+    ledger['balance_gap'] = (quoted - (previous_anchor + ledger['running_net'])).where(quoted.notna())
+    return ledger
+
+
+def run_ledger(report_path, ledger_path=None, incremental=False):
+    """Write the ledger of the report CSV at ``report_path``; returns a summary.
+
+    With ``incremental``, only the report rows after the watermark saved
+    by the previous run (next to the ledger) are booked: the accounts
+    start from the saved state and the new entries are appended to the
+    ledger.  The state is saved again either way.
+    """
+    ledger_path = ledger_path or ledger_path_for(report_path)
+    state_path = ledger_state_path_for(ledger_path)
+    state = LedgerState.load(state_path) if incremental and os.path.exists(ledger_path) else LedgerState()
+    new = state.watermark.read_new(report_path)
+    if new is None:
+        # The booked rows changed: book the whole report again
+        state = LedgerState()
+        new = state.watermark.read_new(report_path)
+    append = state.watermark.offset > 0
+    report, state.watermark = new
+    ledger = build_ledger(report, state)
+    ledger.to_csv(ledger_path, index=False, mode='a' if append else 'w', header=not append)
+    state.update(ledger).save(state_path)
+    quotes = ledger['quoted_balance'].notna()
+    return {
+        'rows': len(ledger),
+        'accounts': int(ledger['ledger_account'].nunique()),
+        'quoted_balances': int(quotes.sum()),
+        'balance_gaps': int((ledger['balance_gap'].abs() > 0.005).sum()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sms_pipeline.ledger',
+                                     description='Write the per-account running ledger of a report CSV.')
+    parser.add_argument('report', help='report CSV with debited/credited amounts (e.g. updated_dataset_with_platform.csv)')
+    parser.add_argument('-o', '--output', help='ledger CSV to write (default: <report>_ledger.csv)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='continue every account from the previous incremental run and append to the ledger')
+    args = parser.parse_args(argv)
+    summary = run_ledger(args.report, args.output, args.incremental)
+    print(f"Ledger of {summary['rows']} rows over {summary['accounts']} accounts saved to "
+          f"{args.output or ledger_path_for(args.report)}; {summary['quoted_balances']} quoted balances, "
+          f"{summary['balance_gaps']} differ from the ledger")
+
+
+if __name__ == '__main__':
+    main()
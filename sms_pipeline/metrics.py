@@ -0,0 +1,306 @@
+"""Per-stage metrics and optional profiling of pipeline runs.
+
+A ``RunMetrics`` passed to ``process_reports`` (and the run functions)
+records for every stage the wall and CPU time, rows in and out and the
+change in resident memory, summed over all chunks of the run.  Shared
+pipeline steps appear under their step name (``hits``, ``amount``,
+``update_at``, ...), report stages as ``<report>.<function>``, and reading
+and writing as ``read_csv`` and ``to_csv`` (plus ``parquet`` and ``rollup``
+when written).  Steps that apply a rule also count how often it matched.
+The result is written as JSON and as a Prometheus textfile next to the
+report.
+
+``profile_run`` wraps a run in cProfile or in a small sampling profiler and
+adds the hottest functions to the metrics.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import resource
+import signal
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+HOT_FUNCTIONS = 15
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def current_rss_bytes():
+    """Resident memory of this process now (the peak where /proc is missing)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, TypeError):
+        return int(peak_rss_mb() * 1024 * 1024)
+
+
+def metrics_paths(output_path):
+    """The JSON and Prometheus textfile paths for the report at ``output_path``."""
+    root = os.path.splitext(output_path)[0]
+    return root + '.metrics.json', root + '.prom'
+
+
+def measured(metrics, name, rows=0):
+    """``metrics.stage(name, rows)``, or a no-op block when ``metrics`` is None."""
+    if metrics is None:
+        return nullcontext({'rows_in': rows, 'rows_out': rows})
+    return metrics.stage(name, rows)
+
+
+def measured_reads(frames, metrics):
+    """``metrics.read(frames)``, or ``frames`` itself when ``metrics`` is None."""
+    return frames if metrics is None else metrics.read(frames)
+
+
+def stage_name(stage):
+    return getattr(stage, 'func', stage).__name__
+
+
+class RunMetrics:
+    """Counters of one run, summed over every frame it processed."""
+
+    def __init__(self, report='reports'):
+        self.report = report
+        self.stages = {}
+        self.matches = {}
+        self.summary = {}
+        self.hot_functions = []
+        self.started = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def add(self, name, wall_seconds=0.0, cpu_seconds=0.0, rows_in=0, rows_out=0, memory_delta_bytes=0, calls=1):
+        totals = self.stages.setdefault(name, dict.fromkeys(
+            ['calls', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out', 'memory_delta_bytes'], 0))
+        totals['calls'] += calls
+        totals['wall_seconds'] += wall_seconds
+        totals['cpu_seconds'] += cpu_seconds
+        totals['rows_in'] += rows_in
+        totals['rows_out'] += rows_out
+        totals['memory_delta_bytes'] += memory_delta_bytes
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """Time the block as stage ``name``; set ``rows_out`` on the yielded dict if it changes."""
+        counts = {'rows_in': rows, 'rows_out': rows}
+        rss, wall, cpu = current_rss_bytes(), time.perf_counter(), time.process_time()
+        try:
+            yield counts
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu, counts['rows_in'],
+                     counts['rows_out'], current_rss_bytes() - rss)
+
+    def run_stage(self, stage, sms_data, prefix=''):
+        """Run one ``report_stages`` function on ``sms_data``, recording it."""
+        with self.stage(prefix + stage_name(stage), len(sms_data)) as counts:
+            sms_data = stage(sms_data)
+            counts['rows_out'] = len(sms_data)
+        return sms_data
+
+    def run_step(self, name, fn, args, rule=None):
+        """Run pipeline step ``name`` as ``fn(*args)``, recording it.
+
+        With a ``rule`` description, the result's match rate is counted:
+        the share of True (boolean) or non-missing values, per column for a
+        DataFrame such as the keyword hits.
+        """
+        rows = len(args[0]) if args else 0
+        with self.stage(name, rows) as counts:
+            result = fn(*args)
+            counts['rows_out'] = len(result)
+        if rule is not None:
+            columns = result.items() if hasattr(result, 'columns') else [(None, result)]
+            for column, values in columns:
+                matched = int(values.sum()) if values.dtype == bool else int(values.notna().sum())
+                totals = self.matches.setdefault(name if column is None else f'{name}.{column}', [rule, 0, 0])
+                totals[1] += matched
+                totals[2] += len(values)
+        return result
+
+    def read(self, frames, name='read_csv'):
+        """Yield from ``frames`` (e.g. CSV chunks), timing every read as ``name``."""
+        frames = iter(frames)
+        while True:
+            with self.stage(name) as counts:
+                sms_data = next(frames, None)
+                if sms_data is not None:
+                    counts['rows_in'] = counts['rows_out'] = len(sms_data)
+            if sms_data is None:
+                self.stages[name]['calls'] -= 1  # The final, empty read
+                return
+            # Not held here while the caller works on it, so it can be freed early
+            chunk, sms_data = [sms_data], None
+            yield chunk.pop()
+
+    def merge(self, other):
+        """Add the counters of ``other`` (e.g. from a worker process)."""
+        for name, totals in other.stages.items():
+            self.add(name, **totals)
+        for name, (rule, matched, rows) in other.matches.items():
+            totals = self.matches.setdefault(name, [rule, 0, 0])
+            totals[1] += matched
+            totals[2] += rows
+
+    def as_dict(self):
+        stages = {}
+        for name, totals in self.stages.items():
+            stages[name] = dict(totals, rows_dropped=totals['rows_in'] - totals['rows_out'],
+                                wall_seconds=round(totals['wall_seconds'], 6),
+                                cpu_seconds=round(totals['cpu_seconds'], 6))
+        return {
+            'report': self.report,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started)),
+            'wall_seconds': round(time.perf_counter() - self._wall, 6),
+            'cpu_seconds': round(time.process_time() - self._cpu, 6),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'stages': stages,
+            'match_rates': {
+                name: {'rule': rule, 'matched': matched, 'rows': rows,
+                       'rate': round(matched / rows, 6) if rows else None}
+                for name, (rule, matched, rows) in self.matches.items()
+            },
+            'summary': self.summary,
+            'hot_functions': self.hot_functions,
+        }
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.as_dict(), indent=2) + '\n')
+
+    def write_prometheus(self, path):
+        """Write the metrics in the Prometheus textfile-collector format."""
+        data = self.as_dict()
+        report = data['report']
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f'# HELP sms_pipeline_{name} {help_text}')
+            lines.append(f'# TYPE sms_pipeline_{name} gauge')
+            for labels, value in samples:
+                labels = ','.join(f'{key}="{label}"' for key, label in [('report', report)] + labels)
+                lines.append(f'sms_pipeline_{name}{{{labels}}} {value}')
+
+        metric('run_start_time_seconds', 'Unix time the run started.', [([], round(self.started, 3))])
+        metric('run_wall_seconds', 'Wall time of the run.', [([], data['wall_seconds'])])
+        metric('run_cpu_seconds', 'CPU time of the run (this process).', [([], data['cpu_seconds'])])
+        metric('run_peak_rss_bytes', 'Peak resident memory.', [([], int(data['peak_rss_mb'] * 1024 * 1024))])
+        for key, value in data['summary'].items():
+            if isinstance(value, (int, float)):
+                metric(f'run_{key}', f'Run summary: {key}.', [([], value)])
+        for field, help_text in [
+            ('wall_seconds', 'Wall time per stage.'),
+            ('cpu_seconds', 'CPU time per stage.'),
+            ('rows_in', 'Rows entering each stage.'),
+            ('rows_out', 'Rows leaving each stage.'),
+            ('rows_dropped', 'Rows each stage filtered out.'),
+            ('memory_delta_bytes', 'Change in resident memory across each stage.'),
+        ]:
+            metric(f'stage_{field}', help_text,
+                   [([('stage', name)], totals[field]) for name, totals in data['stages'].items()])
+        metric('match_ratio', 'Share of rows a rule matched.',
+               [([('step', name)], rates['rate']) for name, rates in data['match_rates'].items()
+                if rates['rate'] is not None])
+        _write_atomic(path, '\n'.join(lines) + '\n')
+
+
+def _write_atomic(path, text):
+    # Collectors may read the file at any time; never let them see half of it
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class SamplingProfiler:
+    """Low-overhead profiler: samples the Python stack every ``interval`` CPU seconds.
+
+    Unix only (``SIGPROF``) and main thread only.  ``write`` stores the
+    samples as collapsed stacks, the input format of flame graph tools.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._previous = None
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+
+    def hot_functions(self, limit=HOT_FUNCTIONS):
+        # Innermost function of every sample, as estimated CPU seconds
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(';', 1)[-1]] += count
+        return [{'function': function, 'seconds': round(count * self.interval, 3), 'samples': count}
+                for function, count in own.most_common(limit)]
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def _cprofile_hot_functions(profiler, limit=HOT_FUNCTIONS):
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [{'function': f'{os.path.basename(filename)}:{line}:{name}', 'seconds': round(own, 3),
+             'cumulative_seconds': round(cumulative, 3), 'calls': calls}
+            for (filename, line, name), (_, calls, own, cumulative, _) in rows]
+
+
+@contextmanager
+def profile_run(kind, path, metrics=None):
+    """Profile the block with ``'cprofile'`` or ``'sample'``, saving to ``path``.
+
+    cProfile output is a pstats file; sampling output is collapsed stacks.
+    The hottest functions (by own time) go to ``metrics.hot_functions``.
+    Worker processes of parallel runs are not profiled.
+    """
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            if metrics is not None:
+                metrics.hot_functions = _cprofile_hot_functions(profiler)
+    elif kind == 'sample':
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            profiler.write(path)
+            if metrics is not None:
+                metrics.hot_functions = profiler.hot_functions()
+    else:
+        raise ValueError(f"unknown profiler {kind!r}, expected 'cprofile' or 'sample'")
@@ -0,0 +1,109 @@
+"""Sharded multi-process runs of the reports.
+
+The input is read in shards of ``chunksize`` rows, each shard is processed
+by a worker of a process pool, and the results are written back in input
+order.  The output is identical to a whole-file or streaming run.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from .metrics import RunMetrics, measured_reads
+from .pipeline import process_reports
+from .stages import REPORTS
+from .streaming import DEFAULT_CHUNKSIZE, INPUT_PATH, output_path_for, read_sms, report_writers
+from .templates import CACHE as TEMPLATE_CACHE
+
+
+def default_workers():
+    # Cores this process may run on (respects taskset/cgroup affinity)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _load_template_cache(path):
+    # Pool initializer: start each worker from the saved template cache
+    TEMPLATE_CACHE.update_from(path)
+
+
+def _process_measured(sms_data, reports, templates, spam_model=None, amount_details=False):
+    # Worker side of a measured run: the frames plus the metrics of this shard
+    metrics = RunMetrics()
+    return process_reports(sms_data, reports, templates, metrics, spam_model, amount_details), metrics
+
+
+def _merged(results, metrics):
+    for frames, shard_metrics in results:
+        metrics.merge(shard_metrics)
+        yield frames
+
+
+def ordered_map(executor, fn, items, window):
+    """Like ``executor.map`` but with at most ``window`` shards in flight.
+
+    ``executor.map`` submits the whole input up front, which would pull the
+    entire file into memory; here the reader only stays ``window`` shards
+    ahead of the writer.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run_parallel_reports(file_path=INPUT_PATH, outputs=None, workers=None, chunksize=DEFAULT_CHUNKSIZE,
+                         formats=('csv',), rollup=False, templates=False, template_cache=None, metrics=None,
+                         account_index=False, spam_model=None, store=False, compact=False, amount_details=False):
+    """Process the file in shards on ``workers`` processes, writing every report in ``outputs``.
+
+    ``outputs`` maps report names to output paths (default: every report to
+    its usual file); each shard is read once and produces all of them.
+    With ``templates``, every worker classifies through its own template
+    cache, first loaded from ``template_cache`` if given.  ``spam_model``
+    is the path of a spam model, which every worker loads once.  Stage
+    metrics from the workers are added to ``metrics``.  Returns
+    ``{report: summary}`` like ``run_reports``.
+    """
+    outputs = outputs or {report: output_path_for(report) for report in REPORTS}
+    reports = tuple(outputs)
+    writers = report_writers(outputs, formats, rollup, account_index, metrics, store, compact)
+    workers = workers or default_workers()
+    initializer, initargs = (_load_template_cache, (template_cache,)) if templates and template_cache else (None, ())
+    with read_sms(file_path, chunksize=chunksize) as shards, \
+            ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        shards = measured_reads(shards, metrics)
+        if metrics is None:
+            results = ordered_map(executor, partial(process_reports, reports=reports, templates=bool(templates),
+                                                    spam_model=spam_model, amount_details=amount_details),
+                                   shards, window=2 * workers)
+        else:
+            results = ordered_map(executor, partial(_process_measured, reports=reports, templates=bool(templates),
+                                                    spam_model=spam_model, amount_details=amount_details),
+                                   shards, window=2 * workers)
+            results = _merged(results, metrics)
+        for frames in results:
+            for report in reports:
+                writers[report].write(frames.pop(report))
+    return {report: writer.close() for report, writer in writers.items()}
+
+
+def run_parallel(file_path=INPUT_PATH, output_path=None, report='reports', workers=None, chunksize=DEFAULT_CHUNKSIZE,
+                 formats=('csv',), rollup=False, templates=False, template_cache=None, metrics=None,
+                 account_index=False, spam_model=None, store=False, compact=False, amount_details=False):
+    """Process the file in shards on ``workers`` processes.
+
+    Returns the same summary as ``write_chunks``; see
+    ``run_parallel_reports``.
+    """
+    output_path = output_path or output_path_for(report)
+    return run_parallel_reports(file_path, {report: output_path}, workers, chunksize, formats=formats, rollup=rollup,
+                                templates=templates, template_cache=template_cache, metrics=metrics,
+                                account_index=account_index, spam_model=spam_model, store=store,
+                                compact=compact, amount_details=amount_details)[report]
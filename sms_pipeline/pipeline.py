@@ -0,0 +1,284 @@
+"""Single-read report pipeline.
+
+Every report variant in ``REPORTS`` starts from the same work: one keyword
+scan, the platform, payment-method, amount and account-number extraction,
+parsing ``updateAt`` and checking which senders are banks.  ``Pipeline`` is
+a small DAG of these steps.  ``process_reports`` runs only the steps the
+requested reports need, each once per frame, then branches: every report
+classifies with its own rules from the shared results and runs its own
+``report_stages`` on a shallow copy.  Producing every report therefore
+costs little more than producing one.  With a ``spam_model``, the reports
+with ``final_credit`` take their spam flag from its scores instead of the
+spam keywords.  With ``amount_details``, the amount is the transaction
+amount ``amounts.amount_details`` reads instead of the notebook's first
+figure, and the quoted balance is kept as ``available_balance``.
+"""
+
+from functools import lru_cache, partial
+
+from .accounts import extract_account_numbers
+from .amounts import amount_details
+from .classify import (
+    PLATFORM_FROM_PATTERN, PLATFORM_PATTERN, PLATFORM_TRANSFER_PATTERN, classify_hits, extract_payment_method,
+    extract_platform, hits_frame, keyword_hits, mentions_any,
+)
+from .senders import RESOLVER
+from .spam import as_model
+from .stages import (
+    ACCOUNT_COLUMN, BALANCE_COLUMN, REPORTS, SENDER_BANK_COLUMN, SPAM_COLUMN, SPAM_SCORE_COLUMN, TIMESTAMP_COLUMN,
+    extract_amount, prepare_text, report_stages,
+)
+from .templates import CACHE as TEMPLATE_CACHE
+from .timestamps import parse_update_at
+
+# Step names of the known platform patterns
+PLATFORM_STEPS = {
+    PLATFORM_PATTERN: 'platform',
+    PLATFORM_FROM_PATTERN: 'platform_from',
+    PLATFORM_TRANSFER_PATTERN: 'platform_transfer',
+}
+
+
+class Pipeline:
+    """Named steps and their inputs; ``run`` computes every needed step once."""
+
+    def __init__(self):
+        self.steps = {}
+
+    def add(self, name, fn, inputs=(), keywords=None, group=None, rule=None):
+        """Add step ``name``, computed as ``fn(*inputs, **keywords)``.
+
+        ``inputs`` are step (or source) names; ``keywords`` maps argument
+        names to step names.  ``group`` is the benchmark stage the step
+        counts towards; ``rule`` marks steps whose result is a rule match
+        (its match rate is recorded).
+        """
+        self.steps[name] = (fn, tuple(inputs), dict(keywords or {}), group, rule)
+        return self
+
+    def order(self, targets):
+        """The steps ``targets`` depend on, every step after its inputs."""
+        ordered = []
+        seen = set()
+
+        def visit(name):
+            if name in seen or name not in self.steps:  # Sources are not steps
+                return
+            seen.add(name)
+            _, inputs, keywords, _, _ = self.steps[name]
+            for dependency in inputs + tuple(keywords.values()):
+                visit(dependency)
+            ordered.append(name)
+
+        for target in targets:
+            visit(target)
+        return ordered
+
+    def run(self, targets, sources, metrics=None):
+        """Compute ``targets`` from the ``sources`` dict; returns ``{target: value}``."""
+        values = dict(sources)
+        for name in self.order(targets):
+            fn, inputs, keywords, _, rule = self.steps[name]
+            fn = partial(fn, **{keyword: values[dependency] for keyword, dependency in keywords.items()})
+            args = [values[dependency] for dependency in inputs]
+            if metrics is None:
+                values[name] = fn(*args)
+            else:
+                values[name] = metrics.run_step(name, fn, args, rule)
+        return {target: values[target] for target in targets}
+
+
+def platform_step(platform_pattern):
+    return PLATFORM_STEPS.get(platform_pattern, f'platform:{platform_pattern}')
+
+
+def _hits(sms_data):
+    return keyword_hits(sms_data['text'])
+
+
+def _platform(sms_data, platform_pattern):
+    return extract_platform(sms_data['text'], platform_pattern)
+
+
+def _payment_method(sms_data):
+    return extract_payment_method(sms_data['text'])
+
+
+def _amount(sms_data):
+    return sms_data['text'].apply(extract_amount)
+
+
+def _amount_details(sms_data):
+    return amount_details(sms_data['text'])
+
+
+def _mentions(sms_data, mentions):
+    return mentions_any(sms_data['text'], mentions)
+
+
+def _update_at(sms_data):
+    return parse_update_at(sms_data['updateAt'])
+
+
+def _account_number(sms_data):
+    return extract_account_numbers(sms_data['text'])
+
+
+def _senders(sms_data):
+    return sms_data['senderAddress'].fillna('').astype(str)
+
+
+def _sender_is_bank(senders, resolver=RESOLVER):
+    return resolver.is_bank(senders)
+
+
+def _spam_score(sms_data, model):
+    return model.score(sms_data['text'])
+
+
+def _spam_flags(spam_score, threshold):
+    return spam_score >= threshold
+
+
+def _templates(sms_data, platform_patterns, cache):
+    return cache.analyze(sms_data['text'], platform_patterns)
+
+
+def _template_hits(result):
+    return hits_frame(result['hits'].to_numpy(), result.index)
+
+
+def _column(result, column):
+    return result[column]
+
+
+def _classified(spec, sms_data, hits, platform, payment_method, amount, update_at, mentioned=None, senders=None,
+                sender_is_bank=None, account_number=None, spam_score=None, spam=None, amounts=None):
+    # The input columns plus this report's classification and the shared
+    # results its stages use, before any row is dropped
+    sms_data = sms_data.copy(deep=False)
+    sms_data[['transaction_type', 'platform', 'payment_method']] = classify_hits(
+        hits, platform, payment_method, credit=spec['credit'], spam=spec['drop_spam'], mentioned=mentioned,
+    )
+    sms_data['amount'] = amount
+    if amounts is not None:
+        sms_data[BALANCE_COLUMN] = amounts['available_balance']
+    if spam_score is None:
+        sms_data[SPAM_COLUMN] = hits['spam']
+    else:
+        sms_data[SPAM_COLUMN] = spam
+        sms_data[SPAM_SCORE_COLUMN] = spam_score
+    sms_data[TIMESTAMP_COLUMN] = update_at
+    if senders is not None:
+        sms_data['senderAddress'] = senders
+        sms_data[SENDER_BANK_COLUMN] = sender_is_bank
+    if account_number is not None:
+        sms_data[ACCOUNT_COLUMN] = account_number
+    return sms_data
+
+
+def build_pipeline(reports, templates=False, spam_model=None, amount_details=False):
+    """The ``Pipeline`` producing ``classified:<report>`` for each of ``reports``.
+
+    ``templates`` runs the keyword scan and the extractions through a
+    ``TemplateCache`` (True for the shared one).  ``spam_model`` (a
+    ``SpamModel`` or the path of one) scores the texts for spam.
+    ``amount_details`` takes the amount and the quoted balance from
+    ``amounts.amount_details`` (never from the templates).
+    """
+    # Built once per model, not per path: a model retrained to the same
+    # path loads again and gets a pipeline of its own
+    return _build_pipeline(tuple(reports), templates, as_model(spam_model), amount_details)
+
+
+@lru_cache(maxsize=None)
+def _build_pipeline(reports, templates, spam_model, amount_details):
+    specs = [REPORTS[report] for report in reports]
+    patterns = list(dict.fromkeys(spec['platform_pattern'] for spec in specs))
+
+    pipeline = Pipeline()
+    pipeline.add('text', partial(prepare_text, sender=False), ['sms'], group='classify')
+    if templates:
+        cache = TEMPLATE_CACHE if templates is True else templates
+        pipeline.add('templates', partial(_templates, platform_patterns=tuple(patterns), cache=cache), ['text'],
+                     group='classify')
+        pipeline.add('hits', _template_hits, ['templates'], group='classify', rule='keywords')
+        for pattern in patterns:
+            pipeline.add(platform_step(pattern), partial(_column, column=pattern), ['templates'],
+                         group='classify', rule='platform pattern')
+        pipeline.add('payment_method', partial(_column, column='payment_method'), ['templates'],
+                     group='classify', rule='payment method pattern')
+        pipeline.add('amount', partial(_column, column='amount'), ['templates'], group='amount',
+                     rule='amount pattern')
+    else:
+        pipeline.add('hits', _hits, ['text'], group='classify', rule='keywords')
+        for pattern in patterns:
+            pipeline.add(platform_step(pattern), partial(_platform, platform_pattern=pattern), ['text'],
+                         group='classify', rule='platform pattern')
+        pipeline.add('payment_method', _payment_method, ['text'], group='classify', rule='payment method pattern')
+        pipeline.add('amount', _amount, ['text'], group='amount', rule='amount pattern')
+    if amount_details:
+        pipeline.add('amounts', _amount_details, ['text'], group='amount', rule='amount pattern')
+        pipeline.add('amount', partial(_column, column='transaction_amount'), ['amounts'], group='amount')
+    pipeline.add('update_at', _update_at, ['text'], group='dates')
+    pipeline.add('senders', _senders, ['text'], group='bank')
+    pipeline.add('sender_is_bank', _sender_is_bank, ['senders'], group='bank', rule='bank list')
+    pipeline.add('account_number', _account_number, ['text'], group='accounts', rule='account number pattern')
+    if spam_model is not None:
+        pipeline.add('spam_score', partial(_spam_score, model=spam_model), ['text'], group='spam')
+        pipeline.add('spam_model', partial(_spam_flags, threshold=spam_model.threshold), ['spam_score'],
+                     group='spam', rule='spam model')
+
+    for report, spec in zip(reports, specs):
+        keywords = {}
+        if spec['mentions']:
+            pipeline.add(f'mentions:{report}', partial(_mentions, mentions=spec['mentions']), ['text'],
+                         group='classify', rule='account mentions')
+            keywords['mentioned'] = f'mentions:{report}'
+        if spec['bank']:
+            keywords.update(senders='senders', sender_is_bank='sender_is_bank')
+        if spec['accounts']:
+            keywords['account_number'] = 'account_number'
+        if spec['spam'] and spam_model is not None:
+            keywords.update(spam_score='spam_score', spam='spam_model')
+        if amount_details:
+            keywords['amounts'] = 'amounts'
+        pipeline.add(f'classified:{report}', partial(_classified, spec),
+                     ['text', 'hits', platform_step(spec['platform_pattern']), 'payment_method', 'amount', 'update_at'],
+                     keywords, group='classify')
+    return pipeline
+
+
+def process_reports(sms_data, reports, templates=False, metrics=None, spam_model=None, amount_details=False):
+    """Run every report in ``reports`` on ``sms_data``; returns ``{report: frame}``.
+
+    Shared steps run once; ``metrics`` (a ``RunMetrics``) records each of
+    them and each report's stages (as ``<report>.<stage>``).  See
+    ``build_pipeline`` for ``templates``, ``spam_model`` and ``amount_details``.
+    """
+    reports = tuple(reports)
+    classified = build_pipeline(reports, templates, spam_model, amount_details).run(
+        [f'classified:{report}' for report in reports], {'sms': sms_data}, metrics,
+    )
+    results = {}
+    for report in reports:
+        report_data = classified[f'classified:{report}']
+        for _, stage in report_stages(report):
+            if metrics is None:
+                report_data = stage(report_data)
+            else:
+                report_data = metrics.run_stage(stage, report_data, prefix=f'{report}.')
+        results[report] = report_data
+    return results
+
+
+def process_frame(sms_data, report='reports', templates=False, metrics=None, spam_model=None, amount_details=False):
+    """Run every stage of ``report`` on ``sms_data`` and return the result.
+
+    ``templates`` classifies through a ``TemplateCache`` (True for the
+    shared one); the result is the same, only faster on repetitive data.
+    ``metrics`` (a ``RunMetrics``) records every step and stage.
+    ``spam_model`` decides ``final_credit`` from spam scores, and
+    ``amount_details`` reads the amounts with ``amounts.amount_details``.
+    """
+    return process_reports(sms_data, [report], templates, metrics, spam_model, amount_details)[report]
@@ -0,0 +1,137 @@
+"""Pre-aggregated rollup of a report for the Power BI dashboard.
+
+Instead of aggregating millions of report rows on every refresh, the
+dashboard can read ``<report>_rollup.csv``: one row per combination of
+``ROLLUP_KEYS`` with the row count and the sum, min and max of every
+amount column.  Partial rollups merge exactly (sums and counts add, min of
+mins, max of maxes), so the rollup is built chunk by chunk and updated
+from just the new rows of an incremental run.  Sums are added in whole
+paise, so the order the rows come in never changes them.  With ``canonical_only``,
+only the canonical message of every transaction group (see ``dedup``) is
+counted, so a payment reported by several SMS counts once.
+"""
+
+import os
+
+import pandas as pd
+
+ROLLUP_KEYS = ['year', 'month', 'day', 'platform', 'payment_method', 'transaction_type', 'final_credit', 'platform_is_bank']
+TEXT_KEYS = ['platform', 'payment_method', 'transaction_type']
+MEASURES = ['debited_amount', 'credited_amount', 'total_amount']
+STATS = ['sum', 'min', 'max']
+# Whether a row is the canonical message of its transaction (dedup)
+CANONICAL_COLUMN = 'canonical'
+
+
+def rollup_path_for(output_path):
+    # Reports.csv -> Reports_rollup.csv
+    base, ext = os.path.splitext(output_path)
+    return f'{base}_rollup{ext or ".csv"}'
+
+
+def _normalize(sms_data):
+    # Same key and measure types whether the rows come from the stages or
+    # from a CSV read back as text
+    sms_data = sms_data.copy()
+    for column in ['year', 'month', 'day']:
+        if column in sms_data:
+            sms_data[column] = pd.to_numeric(sms_data[column], errors='coerce').astype('Int64')
+    for column in ['final_credit', 'platform_is_bank']:
+        if column in sms_data:
+            sms_data[column] = sms_data[column].map(
+                {True: True, False: False, 'True': True, 'False': False}).astype('boolean')
+    for column in TEXT_KEYS:
+        if column in sms_data:
+            # A CSV cannot tell an empty string from a missing value
+            text = sms_data[column].astype(object)
+            sms_data[column] = text.where(text.notna() & (text != ''), None)
+    return sms_data
+
+
+def _paise(values):
+    # Rupee amounts as whole paise, which add up exactly
+    return (pd.to_numeric(values, errors='coerce') * 100).round().astype('Int64')
+
+
+def _rupees(result):
+    # Sums back from paise to rupees
+    for measure in MEASURES:
+        result[f'{measure}_sum'] = result[f'{measure}_sum'].to_numpy(dtype='float64') / 100
+    return result
+
+
+def _keys(sms_data):
+    return [key for key in ROLLUP_KEYS if key in sms_data.columns]
+
+
+def rollup(sms_data, canonical_only=False):
+    """Aggregate report rows into one row per key combination.
+
+    ``canonical_only`` skips the rows that duplicate another message of
+    the same transaction.
+    """
+    if canonical_only:
+        sms_data = sms_data[sms_data[CANONICAL_COLUMN].map({True: True, False: False, 'True': True, 'False': False})
+                            .fillna(True).astype(bool)]
+    keys = _keys(sms_data)
+    sms_data = _normalize(sms_data[keys + MEASURES])
+    for measure in MEASURES:
+        sms_data[measure] = pd.to_numeric(sms_data[measure], errors='coerce')
+        sms_data[f'_{measure}_paise'] = _paise(sms_data[measure])
+    aggregations = {'rows': (MEASURES[0], 'size')}
+    for measure in MEASURES:
+        for stat in STATS:
+            aggregations[f'{measure}_{stat}'] = (f'_{measure}_paise' if stat == 'sum' else measure, stat)
+    return _rupees(sms_data.groupby(keys, dropna=False, sort=True).agg(**aggregations).reset_index())
+
+
+def merge_rollups(*rollups):
+    """Combine partial rollups into one, as if built from all their rows."""
+    rollups = [partial for partial in rollups if partial is not None and len(partial)]
+    if not rollups:
+        return None
+    if len(rollups) == 1:
+        return rollups[0]
+    combined = pd.concat([_normalize(partial) for partial in rollups], ignore_index=True)
+    aggregations = {'rows': 'sum'}
+    for measure in MEASURES:
+        combined[f'{measure}_sum'] = _paise(combined[f'{measure}_sum'])
+        for stat in STATS:
+            aggregations[f'{measure}_{stat}'] = stat
+    return _rupees(combined.groupby(_keys(combined), dropna=False, sort=True).agg(aggregations).reset_index())
+
+
+class RollupBuilder:
+    """Accumulate the rollup of a stream of report frames."""
+
+    def __init__(self, canonical_only=False):
+        self.canonical_only = canonical_only
+        self.result = None
+
+    def add(self, sms_data):
+        if len(sms_data):
+            self.result = merge_rollups(self.result, rollup(sms_data, self.canonical_only))
+
+    def merge(self, other):
+        self.result = merge_rollups(self.result, other)
+
+
+def read_rollup(path):
+    try:
+        return _normalize(pd.read_csv(path, dtype={column: str for column in TEXT_KEYS}))
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        return None
+
+
+def write_rollup(result, path):
+    # An empty report leaves an empty rollup file
+    (pd.DataFrame() if result is None else result).to_csv(path, index=False)
+
+
+def rollup_from_csv(csv_path, chunksize=100_000, canonical_only=False):
+    """Rebuild the rollup of an existing report CSV, chunk by chunk."""
+    builder = RollupBuilder(canonical_only)
+    with pd.read_csv(csv_path, dtype=str, chunksize=chunksize) as chunks:
+        for sms_data in chunks:
+            builder.add(sms_data)
+    return builder.result
@@ -0,0 +1,165 @@
+"""Binary cache of the source datasets (Excel workbooks and CSV exports).
+
+Parsing ``Final SMS Dataset_2.xlsx`` goes through openpyxl, cell by cell,
+and takes seconds even for this small file.  ``load_source`` converts a
+source once into an uncompressed Arrow IPC (Feather v2) file under
+``.sms_cache/`` and afterwards memory-maps that file: loading is then
+zero-copy, and only the ``columns`` asked for are touched.  Every column
+is kept as text, as ``read_sms`` reads it.
+
+A cache file belongs to one source path.  Next to it, a small JSON file
+records the source's size, modification time and SHA-256.  If size and
+mtime are unchanged the cache is used as is.  If they differ, the content
+is hashed: an unchanged hash (the file was only touched) keeps the cache,
+anything else converts the source again.  Needs ``pyarrow``.
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+CACHE_DIR = '.sms_cache'
+EXCEL_SUFFIXES = ('.xlsx', '.xlsm', '.xls')
+CACHE_VERSION = 1
+
+_HASH_BLOCK = 1 << 20
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as exc:
+        raise ImportError("The source cache needs pyarrow: pip install pyarrow") from exc
+    return pa
+
+
+def is_excel(path):
+    return os.path.splitext(path)[1].lower() in EXCEL_SUFFIXES
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_paths(path, cache_dir=CACHE_DIR):
+    """The Arrow file and its JSON stamp caching the source at ``path``."""
+    source = os.path.abspath(path)
+    name = os.path.splitext(os.path.basename(source))[0]
+    key = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    root = os.path.join(cache_dir, f'{name}-{key}')
+    return root + '.arrow', root + '.json'
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return {'version': CACHE_VERSION, 'source': os.path.abspath(path), 'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns}
+
+
+def _write_stamp(stamp, stamp_path):
+    tmp_path = stamp_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(stamp, f, indent=2)
+    os.replace(tmp_path, stamp_path)
+
+
+def cache_is_fresh(path, cache_dir=CACHE_DIR):
+    """Whether the cache of ``path`` matches the source (re-stamping it if only the mtime moved)."""
+    arrow_path, stamp_path = cache_paths(path, cache_dir)
+    if not (os.path.exists(arrow_path) and os.path.exists(stamp_path)):
+        return False
+    with open(stamp_path) as f:
+        saved = json.load(f)
+    current = _stamp(path)
+    if saved.get('version') != CACHE_VERSION:
+        return False
+    if saved['size'] == current['size'] and saved['mtime_ns'] == current['mtime_ns']:
+        return True
+    if saved['size'] != current['size'] or saved.get('sha256') != content_hash(path):
+        return False
+    _write_stamp(dict(saved, mtime_ns=current['mtime_ns']), stamp_path)
+    return True
+
+
+def _frames(path, sheet_name=0, chunksize=100_000):
+    # The source as text frames, a chunk at a time for CSV
+    if is_excel(path):
+        yield pd.read_excel(path, sheet_name=sheet_name, dtype=str)
+    else:
+        with pd.read_csv(path, dtype=str, chunksize=chunksize) as chunks:
+            yield from chunks
+
+
+def _text_table(frame, schema=None):
+    pa = _pyarrow()
+    arrays = [pa.array(frame[column].astype(object).where(frame[column].notna(), None), type=pa.string())
+              for column in frame.columns]
+    return pa.Table.from_arrays(arrays, schema=schema) if schema else pa.table(dict(zip(frame.columns, arrays)))
+
+
+def convert_source(path, cache_dir=CACHE_DIR, sheet_name=0, chunksize=100_000):
+    """Write the Arrow cache of the source at ``path``; returns the cache file path.
+
+    CSV sources are converted chunk by chunk, so they never have to fit in
+    memory.  The file is uncompressed, so it can be memory-mapped.
+    """
+    pa = _pyarrow()
+    os.makedirs(cache_dir, exist_ok=True)
+    arrow_path, stamp_path = cache_paths(path, cache_dir)
+    stamp = dict(_stamp(path), sha256=content_hash(path))
+    tmp_path = arrow_path + '.tmp'
+    writer = None
+    try:
+        for frame in _frames(path, sheet_name, chunksize):
+            if writer is None:
+                table = _text_table(frame)
+                writer = pa.ipc.new_file(tmp_path, table.schema)
+            else:
+                table = _text_table(frame, writer.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, arrow_path)
+    _write_stamp(stamp, stamp_path)
+    return arrow_path
+
+
+def open_source(path, columns=None, cache_dir=CACHE_DIR, sheet_name=0):
+    """The source at ``path`` as a memory-mapped Arrow table, converting it first if needed.
+
+    Only ``columns`` (default: all) are in the table; nothing is copied
+    until a column is used.
+    """
+    pa = _pyarrow()
+    if not cache_is_fresh(path, cache_dir):
+        convert_source(path, cache_dir, sheet_name)
+    arrow_path, _ = cache_paths(path, cache_dir)
+    with pa.memory_map(arrow_path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table if columns is None else table.select(list(columns))
+
+
+def load_source(path, columns=None, cache_dir=CACHE_DIR, sheet_name=0):
+    """Load the source at ``path`` (xlsx or csv) through the cache, as a text frame.
+
+    The same frame ``pd.read_csv(path, dtype=str)`` (or ``pd.read_excel``)
+    gives, restricted to ``columns``.
+    """
+    return open_source(path, columns, cache_dir, sheet_name).to_pandas()
+
+
+def iter_source(path, chunksize, columns=None, cache_dir=CACHE_DIR, sheet_name=0):
+    """Yield the cached source ``chunksize`` rows at a time, like ``read_sms`` chunks."""
+    table = open_source(path, columns, cache_dir, sheet_name)
+    for start in range(0, table.num_rows, chunksize):
+        frame = table.slice(start, chunksize).to_pandas()
+        frame.index = pd.RangeIndex(start, start + len(frame))
+        yield frame
@@ -0,0 +1,247 @@
+"""Spam scoring of credit SMS with a linear model over hashed n-grams.
+
+``final_credit`` comes from one keyword regex (``is_spam_credit``): any
+credit whose text has a spam keyword is spam.  ``SpamModel`` scores
+messages instead.  Its features are the words of the text (lower-cased,
+digit runs read as ``0``) and pairs of adjacent words, hashed into
+``N_FEATURES`` buckets.  Each message is a row of a sparse CSR matrix,
+scaled to unit length, so a whole chunk is scored with one sparse
+matrix-vector product and a logistic function.  Words are split and
+hashed once per distinct word, not once per occurrence (Arrow kernels
+when pyarrow is installed).
+
+The weights are learned offline from labelled reports (``final_credit``
+False is spam, among ``Credited`` rows):
+
+    python -m sms_pipeline.spam Reports.csv -o spam_model.npz
+
+and ``python -m sms_pipeline --spam-model spam_model.npz`` then decides
+``final_credit`` from ``spam_score >= threshold`` and writes the score.
+Needs scipy.
+"""
+
+import argparse
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+N_FEATURES = 1 << 18
+DEFAULT_THRESHOLD = 0.5
+MODEL_VERSION = 1
+SCORE_COLUMN = 'spam_score'
+
+# Combines the hashes of two adjacent words into the hash of the pair
+_PAIR_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _scipy():
+    try:
+        import scipy.optimize  # noqa: F401
+        import scipy.sparse
+    except ImportError as exc:
+        raise ImportError("The spam model needs scipy: pip install scipy") from exc
+    return scipy
+
+
+def _words_arrow(texts, mask_digits, pa, pc):
+    texts = pa.array(texts, type=pa.large_string())
+    # Arrow-backed string columns convert to one array per chunk
+    if isinstance(texts, pa.ChunkedArray):
+        texts = texts.combine_chunks()
+    parts = pc.utf8_split_whitespace(texts)
+    words, rows = pc.list_flatten(parts), pc.list_parent_indices(parts)
+    # An empty text splits into one empty word
+    present = pc.not_equal(words, '')
+    words = pc.dictionary_encode(words.filter(present))
+    vocabulary = pc.utf8_lower(words.dictionary)
+    if mask_digits:
+        vocabulary = pc.replace_substring_regex(vocabulary, r'\d+', '0')
+    return rows.filter(present).to_numpy(), words.indices.to_numpy(), vocabulary.to_numpy(zero_copy_only=False)
+
+
+def _words_pandas(texts, mask_digits):
+    split = texts.astype(object).str.split()
+    words = split.explode()
+    rows = np.repeat(np.arange(len(texts)), split.str.len().to_numpy(dtype=np.int64))
+    codes, vocabulary = pd.factorize(words[words.notna()].to_numpy(dtype=object))
+    vocabulary = pd.Series(vocabulary, dtype=object).str.lower()
+    if mask_digits:
+        vocabulary = vocabulary.str.replace(r'\d+', '0', regex=True)
+    return rows, codes, vocabulary.to_numpy(dtype=object)
+
+
+def _words(texts, mask_digits=True):
+    # Per word, in text order: its row position, a code into the distinct
+    # words, and those words lower-cased (with digit runs read as 0)
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return _words_pandas(texts, mask_digits)
+    return _words_arrow(texts, mask_digits, pa, pc)
+
+
+def word_hashes(texts, mask_digits=True):
+    """Row positions and 64-bit hashes of every word in ``texts``, in order.
+
+    Words are lower-cased and, with ``mask_digits``, every run of digits
+    reads as ``0``.
+    """
+    rows, codes, vocabulary = _words(texts.fillna('').astype(str).reset_index(drop=True), mask_digits)
+    return rows, pd.util.hash_array(vocabulary)[codes]
+
+
+def hashed_features(texts, n_features=N_FEATURES):
+    """The sparse (CSR) feature matrix of ``texts``: one unit-length row per text."""
+    sparse = _scipy().sparse
+    rows, hashes = word_hashes(texts)
+    # Slot 0 of every word is the word, slot 1 the pair it ends (if any)
+    features = np.empty((len(hashes), 2), dtype=np.uint64)
+    features[:, 0] = hashes
+    features[1:, 1] = (hashes[:-1] * _PAIR_MIX) ^ hashes[1:]
+    present = np.ones((len(hashes), 2), dtype=bool)
+    present[:1, 1] = False
+    present[1:, 1] = rows[1:] == rows[:-1]
+    present = present.ravel()
+    columns = (features.ravel()[present] % np.uint64(n_features)).astype(np.int32)
+    feature_rows = np.repeat(rows, 2)[present]
+    counts = np.bincount(feature_rows, minlength=len(texts))
+    values = (1 / np.sqrt(np.maximum(counts, 1)))[feature_rows].astype(np.float32)
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    return sparse.csr_matrix((values, columns, indptr), shape=(len(texts), n_features))
+
+
+def _sigmoid(z):
+    return 0.5 * (1 + np.tanh(0.5 * z))
+
+
+class SpamModel:
+    """Weights over hashed n-gram features; ``score`` is the probability a text is spam."""
+
+    def __init__(self, weights, bias=0.0, threshold=DEFAULT_THRESHOLD):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.threshold = float(threshold)
+
+    def score(self, texts):
+        """Spam probability of every text in ``texts``, as a Series like it."""
+        features = hashed_features(texts, len(self.weights))
+        return pd.Series(_sigmoid(features @ self.weights + self.bias), index=texts.index, dtype=float)
+
+    def is_spam(self, texts, scores=None):
+        """Whether every text scores at least ``threshold``."""
+        scores = self.score(texts) if scores is None else scores
+        return scores >= self.threshold
+
+    def score_frame(self, texts):
+        """``spam_score`` and the thresholded ``spam`` flag of every text."""
+        scores = self.score(texts)
+        return pd.DataFrame({SCORE_COLUMN: scores, 'spam': self.is_spam(texts, scores)})
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, version=MODEL_VERSION, weights=self.weights, bias=self.bias, threshold=self.threshold)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            if int(saved['version']) != MODEL_VERSION:
+                raise ValueError(f'{path} is a spam model of version {int(saved["version"])}, '
+                                 f'expected {MODEL_VERSION}; train it again')
+            return cls(saved['weights'], float(saved['bias']), float(saved['threshold']))
+
+
+@lru_cache(maxsize=None)
+def _load_model(path, inode, mtime_ns, size):
+    return SpamModel.load(path)
+
+
+def load_model(path):
+    """The model saved at ``path``, read once per process and again when the file changes."""
+    stat = os.stat(path)
+    return _load_model(path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def as_model(spam_model):
+    """``spam_model`` as a ``SpamModel``: a model, a path to one, or None."""
+    if spam_model is None or isinstance(spam_model, SpamModel):
+        return spam_model
+    return load_model(os.fspath(spam_model))
+
+
+def spam_labels(report):
+    """The texts and spam labels (``final_credit`` False) of the labelled ``report``.
+
+    Only ``Credited`` rows carry a label when the report has
+    ``transaction_type``: every other row is a final credit by definition.
+    """
+    if 'transaction_type' in report:
+        report = report[report['transaction_type'] == 'Credited']
+    final_credit = report['final_credit'].astype(str).str.strip().str.lower().map({'true': True, 'false': False})
+    report = report[final_credit.notna()]
+    return report['text'], ~final_credit[final_credit.notna()].astype(bool)
+
+
+def train(texts, labels, alpha=1e-5, threshold=DEFAULT_THRESHOLD, max_iter=300, n_features=N_FEATURES):
+    """Fit an L2-regularised logistic regression of ``labels`` on the features of ``texts``."""
+    scipy = _scipy()
+    features = hashed_features(texts, n_features)
+    target = np.asarray(labels, dtype=float)
+
+    def loss(params):
+        weights, bias = params[:-1], params[-1]
+        z = features @ weights + bias
+        error = (_sigmoid(z) - target) / len(target)
+        value = np.mean(np.logaddexp(0, z) - target * z) + alpha / 2 * weights @ weights
+        gradient = np.append(features.T @ error + alpha * weights, error.sum())
+        return value, gradient
+
+    fitted = scipy.optimize.minimize(loss, np.zeros(n_features + 1), jac=True, method='L-BFGS-B',
+                                     options={'maxiter': max_iter})
+    return SpamModel(fitted.x[:-1], fitted.x[-1], threshold)
+
+
+def evaluate(model, texts, labels):
+    """Precision and recall of the model's flags against ``labels``."""
+    flags = model.is_spam(texts).to_numpy()
+    labels = np.asarray(labels, dtype=bool)
+    true_positives = int((flags & labels).sum())
+    return {
+        'rows': len(labels),
+        'spam': int(labels.sum()),
+        'precision': true_positives / max(int(flags.sum()), 1),
+        'recall': true_positives / max(int(labels.sum()), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sms_pipeline.spam',
+                                     description='Train the spam model from labelled report CSVs.')
+    parser.add_argument('reports', nargs='+', help='report CSVs with text, transaction_type and final_credit')
+    parser.add_argument('-o', '--output', default='spam_model.npz', help='model file to write (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='score from which a message is spam (default: %(default)s)')
+    parser.add_argument('--alpha', type=float, default=1e-5, help='L2 regularisation (default: %(default)s)')
+    parser.add_argument('--holdout', type=float, default=0.2,
+                        help='fraction of the rows kept out of training to measure precision and recall '
+                             '(default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the holdout split')
+    args = parser.parse_args(argv)
+
+    report = pd.concat([pd.read_csv(path, dtype=str) for path in args.reports], ignore_index=True)
+    texts, labels = spam_labels(report)
+    held_out = np.random.default_rng(args.seed).random(len(texts)) < args.holdout
+    model = train(texts[~held_out], labels[~held_out], args.alpha, args.threshold)
+    if held_out.any():
+        quality = evaluate(model, texts[held_out], labels[held_out])
+        print(f"Held-out rows: {quality['rows']} ({quality['spam']} spam), precision {quality['precision']:.3f}, "
+              f"recall {quality['recall']:.3f}")
+    model.save(args.output)
+    print(f"Spam model trained on {int((~held_out).sum())} rows saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""Frame-level stages of the preprocessing pipeline.
+
+Each stage takes the SMS DataFrame and returns it with the columns the
+corresponding notebook cell adds.  ``REPORTS`` describes the report variant
+each cell wrote, and ``report_stages`` lists the stages that turn a
+classified frame into that report; ``pipeline.process_frame`` runs them.
+Stages only look at one row at a time, so they can be run on the whole file
+or on any slice of it.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from .classify import (
+    ACCOUNT_MENTIONS, PLATFORM_FROM_PATTERN, PLATFORM_PATTERN, PLATFORM_TRANSFER_PATTERN, SPAM_CREDIT_KEYWORDS,
+    classify_batch, keyword_hits,
+)
+from .accounts import extract_account_numbers
+from .amounts import amount_details
+from .senders import BANK_LIST, RESOLVER, sender_platform
+from .spam import SCORE_COLUMN
+from .timestamps import parse_update_at
+
+# Parsed updateAt, kept for later stages; columns starting with '_' are
+# working columns and never written to a report
+TIMESTAMP_COLUMN = '_update_at'
+# Spam-keyword hits from the classification scan, reused for final_credit
+# (or the spam model's flags, with its scores next to them)
+SPAM_COLUMN = '_spam_keyword'
+SPAM_SCORE_COLUMN = '_spam_score'
+# Whether the sender is a bank, when already resolved for the whole input
+SENDER_BANK_COLUMN = '_sender_is_bank'
+# Account numbers, when already extracted for the whole input
+ACCOUNT_COLUMN = '_account_number'
+# The balance quoted with the transaction, in reports whose amounts come
+# from amounts.amount_details
+BALANCE_COLUMN = 'available_balance'
+
+# Bank/UPI mentions that make a credit legitimate (Filtered_Financial_Credit_Report2)
+LEGITIMATE_PLATFORM_PATTERN = r'(?:bank|UPI|A/c no|XXXX)'
+LEGITIMATE_PAYMENT_PATTERN = r'(?:UPI|GPay|PhonePe|Paytm)'
+
+
+def prepare_text(sms_data, sender=False):
+    # Ensure the 'text' column (and optionally 'senderAddress') contains strings
+    sms_data['text'] = sms_data['text'].fillna('').astype(str)
+    if sender:
+        sms_data['senderAddress'] = sms_data['senderAddress'].fillna('').astype(str)
+    return sms_data
+
+
+def add_transaction_details(sms_data, platform_pattern=PLATFORM_PATTERN):
+    # One keyword scan serves both the classification and the spam flag
+    hits = keyword_hits(sms_data['text'])
+    sms_data[['transaction_type', 'platform', 'payment_method']] = classify_batch(
+        sms_data['text'], platform_pattern=platform_pattern, hits=hits
+    )
+    sms_data[SPAM_COLUMN] = hits['spam']
+    return sms_data
+
+
+def extract_amount(text):
+    # Regex to extract Rs. or ₹ amounts
+    amounts = re.findall(r'(₹|Rs\.?)\s?(\d+[.,]?\d*)', text)
+    if amounts:
+        # Check if the extracted number is realistic (e.g., not a phone number)
+        amount = float(amounts[0][1].replace(',', ''))
+        if amount > 1:  # Ensure the amount is a reasonable value (not a phone number or random digits)
+            return amount
+    return None
+
+
+def add_amount(sms_data, details=False):
+    # With details, every currency format and the quoted balance (amounts.amount_details)
+    if details:
+        amounts = amount_details(sms_data['text'])
+        sms_data['amount'] = amounts['transaction_amount']
+        sms_data[BALANCE_COLUMN] = amounts['available_balance']
+    else:
+        sms_data['amount'] = sms_data['text'].apply(extract_amount)
+    return sms_data
+
+
+def drop_incomplete(sms_data):
+    # Remove rows without a transaction type or valid amount
+    return sms_data[sms_data['transaction_type'].notnull() & sms_data['amount'].notnull()].copy()
+
+
+def keep_credits(sms_data):
+    # Filter only credits (the financial credit report)
+    return sms_data[sms_data['transaction_type'] == 'Credited']
+
+
+def is_legitimate_credit(row):
+    # Check if the transaction is a valid credit
+    if row['transaction_type'] == 'Credited':
+        # Look for mentions of bank/UPI in the platform or payment method
+        if re.search(LEGITIMATE_PLATFORM_PATTERN, str(row['platform']), re.IGNORECASE) or re.search(LEGITIMATE_PAYMENT_PATTERN, str(row['payment_method']), re.IGNORECASE):
+            return True
+    return False
+
+
+def keep_legitimate_credits(sms_data):
+    # Additional level of filtering for legitimate credit transactions
+    # (bank/UPI only): is_legitimate_credit on whole columns.  A missing
+    # platform or payment method is "nan" to str(), which matches neither
+    # pattern, so it is left empty here
+    credited = (sms_data['transaction_type'] == 'Credited').to_numpy()
+    legitimate = np.zeros(len(sms_data), dtype=bool)
+    candidates = sms_data[credited]
+    legitimate[credited] = (
+        candidates['platform'].fillna('').astype(str).str.contains(LEGITIMATE_PLATFORM_PATTERN, flags=re.IGNORECASE)
+        | candidates['payment_method'].fillna('').astype(str).str.contains(LEGITIMATE_PAYMENT_PATTERN,
+                                                                           flags=re.IGNORECASE)
+    ).to_numpy(dtype=bool)
+    return sms_data[legitimate]
+
+
+def split_amounts(sms_data):
+    # Create Debited and Credited columns
+    amount = sms_data['amount'].to_numpy(dtype=float)
+    transaction_type = sms_data['transaction_type']
+    sms_data['debited_amount'] = np.where((transaction_type == 'Paid/Debited').to_numpy(), amount, 0.0)
+    sms_data['credited_amount'] = np.where((transaction_type == 'Credited').to_numpy(), amount, 0.0)
+
+    # Calculate total amount (Debited + Credited)
+    sms_data['total_amount'] = sms_data['debited_amount'] + sms_data['credited_amount']
+    return sms_data
+
+
+def add_date_parts(sms_data, parser=None):
+    # Parse the 'updateAt' column once (unless already parsed into
+    # TIMESTAMP_COLUMN) and derive day, month, year, and time from it;
+    # unparseable values become NaT with empty calendar fields
+    if TIMESTAMP_COLUMN in sms_data:
+        update_at = sms_data[TIMESTAMP_COLUMN]
+    else:
+        update_at = parse_update_at(sms_data['updateAt'], parser)
+    sms_data['day'] = update_at.dt.day.astype('Int64')
+    sms_data['month'] = update_at.dt.month.astype('Int64')
+    sms_data['year'] = update_at.dt.year.astype('Int64')
+    sms_data['time'] = update_at.dt.time
+    sms_data[TIMESTAMP_COLUMN] = update_at
+
+    # Drop the updateAt column as it's no longer needed
+    return sms_data.drop(columns=['updateAt'])
+
+
+def is_spam_credit(text):
+    # Regex to check for spam credit keywords
+    if re.search(SPAM_CREDIT_KEYWORDS, text, re.IGNORECASE):
+        return True
+    return False
+
+
+def add_final_credit(sms_data):
+    # Determine final credit status based on spam detection: a credit whose
+    # text has a spam keyword (see is_spam_credit), or that the spam model
+    # flagged, is not a final credit
+    if SPAM_SCORE_COLUMN in sms_data:
+        sms_data[SCORE_COLUMN] = sms_data[SPAM_SCORE_COLUMN]
+    if SPAM_COLUMN in sms_data:
+        spam = sms_data[SPAM_COLUMN]
+    else:
+        spam = keyword_hits(sms_data['text'])['spam']
+    sms_data['final_credit'] = ~((sms_data['transaction_type'] == 'Credited') & spam)
+    return sms_data
+
+
+def is_bank(platform):
+    if platform:
+        # Check if the platform contains any bank name
+        for bank in BANK_LIST:
+            if bank.lower() in platform.lower():
+                return True
+    return False
+
+
+def add_platform_check(sms_data, resolver=RESOLVER):
+    # Check whether the sender of each message is a bank (see is_bank), once
+    # per distinct sender
+    if SENDER_BANK_COLUMN in sms_data:
+        sms_data['platform_is_bank'] = sms_data[SENDER_BANK_COLUMN]
+    else:
+        sms_data['platform_is_bank'] = resolver.is_bank(sms_data['senderAddress'])
+    return sms_data
+
+
+def update_platform(row):
+    if row['platform_is_bank']:
+        # If it's a bank, add bank-related information
+        row['platform'] = f"{row['platform']} Bank Account" if row['platform'] else "Bank Account"
+    else:
+        # If it's not a bank, extract the main component of senderAddress
+        sender_address_parts = row['senderAddress'].split(' ')
+        row['platform'] = sender_address_parts[0] if sender_address_parts else row['platform']
+    return row
+
+
+def add_updated_platform(sms_data, resolver=RESOLVER):
+    # Column-wise update_platform: banks get "<platform> Bank Account" (the
+    # f-string renders a missing platform as "nan", as the row-wise version
+    # did), everyone else the main component of their senderAddress
+    platform = sms_data['platform'].fillna('nan').astype(str)
+    bank_platform = np.where(platform == '', 'Bank Account', platform + ' Bank Account')
+    other_platform = resolver.per_sender(sms_data['senderAddress'], sender_platform)
+    sms_data['platform'] = np.where(sms_data['platform_is_bank'].to_numpy(dtype=bool), bank_platform, other_platform)
+    return sms_data
+
+
+def add_account_number(sms_data):
+    # Extract the account number from the text (Data Preprocessing_2, first
+    # cell), unless already extracted into ACCOUNT_COLUMN
+    if ACCOUNT_COLUMN in sms_data:
+        sms_data['account_number'] = sms_data[ACCOUNT_COLUMN]
+    else:
+        sms_data['account_number'] = extract_account_numbers(sms_data['text'])
+    return sms_data
+
+
+def add_platform_fallback(sms_data):
+    # Fill 'platform_2' from the platform, or the sender where there is none
+    # (Data Preprocessing_2, second cell).  That cell read the report back
+    # from CSV, where an empty platform is missing as well
+    platform = sms_data['platform']
+    sms_data['platform_2'] = platform.where(platform.notna() & (platform != ''), sms_data['senderAddress'])
+    return sms_data
+
+
+# Report variants written by the notebook cells, in notebook order.  Besides
+# the output file, each names the platform pattern, the KEYWORDS lists for
+# credits (and for spam credits to drop), whether messages must mention an
+# account, the filters, and which flag and account columns are added.
+REPORTS = {
+    'reports': {
+        'output': 'Reports.csv',
+        'platform_pattern': PLATFORM_PATTERN,
+        'credit': 'credit', 'drop_spam': None, 'mentions': None,
+        'credits_only': False, 'legitimate_only': False,
+        'spam': False, 'bank': False, 'update_platform': False, 'accounts': False,
+    },
+    'financial_credit': {
+        'output': 'Financial_Credit_Report.csv',
+        'platform_pattern': PLATFORM_TRANSFER_PATTERN,
+        'credit': 'financial_credit', 'drop_spam': 'financial_spam', 'mentions': ACCOUNT_MENTIONS,
+        'credits_only': True, 'legitimate_only': False,
+        'spam': False, 'bank': False, 'update_platform': False, 'accounts': False,
+    },
+    'filtered_financial_credit': {
+        'output': 'Filtered_Financial_Credit_Report2.csv',
+        'platform_pattern': PLATFORM_TRANSFER_PATTERN,
+        'credit': 'financial_credit', 'drop_spam': None, 'mentions': None,
+        'credits_only': False, 'legitimate_only': True,
+        'spam': False, 'bank': False, 'update_platform': False, 'accounts': False,
+    },
+    'final_credit': {
+        'output': 'Reports_with_final_credit3.csv',
+        'platform_pattern': PLATFORM_PATTERN,
+        'credit': 'credit', 'drop_spam': None, 'mentions': None,
+        'credits_only': False, 'legitimate_only': False,
+        'spam': True, 'bank': False, 'update_platform': False, 'accounts': False,
+    },
+    'platform_check': {
+        'output': 'Reports_with_platform_check5.csv',
+        'platform_pattern': PLATFORM_FROM_PATTERN,
+        'credit': 'credit', 'drop_spam': None, 'mentions': None,
+        'credits_only': False, 'legitimate_only': False,
+        'spam': True, 'bank': True, 'update_platform': False, 'accounts': False,
+    },
+    'updated_platform': {
+        'output': 'Reports_with_updated_platform6.csv',
+        'platform_pattern': PLATFORM_FROM_PATTERN,
+        'credit': 'credit', 'drop_spam': None, 'mentions': None,
+        'credits_only': False, 'legitimate_only': False,
+        'spam': True, 'bank': True, 'update_platform': True, 'accounts': False,
+    },
+    # Data Preprocessing_2: the platform check report plus account numbers
+    # and the platform/sender fallback, in the same pass
+    'accounts': {
+        'output': 'updated_dataset_with_platform.csv',
+        'platform_pattern': PLATFORM_FROM_PATTERN,
+        'credit': 'credit', 'drop_spam': None, 'mentions': None,
+        'credits_only': False, 'legitimate_only': False,
+        'spam': True, 'bank': True, 'update_platform': False, 'accounts': True,
+    },
+}
+
+
+def report_columns(sms_data):
+    """Return ``sms_data`` without its working (``_``-prefixed) columns."""
+    return sms_data[[column for column in sms_data.columns if not column.startswith('_')]]
+
+
+def report_stages(report='reports'):
+    """The ``(group, stage)`` pairs that turn a classified frame into ``report``.
+
+    The frame must already have ``transaction_type``, ``platform``,
+    ``payment_method`` and ``amount``.  Every stage takes the frame and
+    returns it.  The group names (amount, dates, spam, bank, accounts) are
+    how benchmarks and metrics report them.
+    """
+    spec = REPORTS[report]
+    stages = [('amount', drop_incomplete)]
+    if spec['credits_only']:
+        stages.append(('amount', keep_credits))
+    if spec['legitimate_only']:
+        stages.append(('amount', keep_legitimate_credits))
+    stages += [('amount', split_amounts), ('dates', add_date_parts)]
+    if spec['spam']:
+        stages.append(('spam', add_final_credit))
+    if spec['bank']:
+        stages.append(('bank', add_platform_check))
+    if spec['update_platform']:
+        stages.append(('bank', add_updated_platform))
+    if spec['accounts']:
+        stages += [('accounts', add_account_number), ('accounts', add_platform_fallback)]
+    return stages
@@ -0,0 +1,215 @@
+"""Indexed SQLite copy of a report for fast filtered queries.
+
+Questions like "every debit on Zomato last month" or "every credit from
+VM-SBIUPI" otherwise mean reading the whole report CSV.  ``ReportStore``
+loads the report rows into ``<output>.sqlite`` as they are written, in
+one transaction per chunk, and indexes them by time (``update_at``, UTC
+``YYYY-MM-DD HH:MM:SS``), sender, platform, account (``account_key``,
+for reports with account numbers) and transaction type.  ``query_store``
+answers those filters from the indexes:
+
+    python -m sms_pipeline.store Reports.sqlite --platform Zomato --type Paid/Debited --since 2022-04-01
+
+Every row is keyed by its input row number (``row_id``).  A full run
+replaces the table; incremental runs upsert their new rows into it, and
+after a merge it is rebuilt from the report (``rebuild_store_from_csv``).
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from .accounts import account_key
+from .columnar import BOOL_COLUMNS, FLOAT_COLUMNS, INT_COLUMNS
+from .ledger import ledger_times
+from .stages import report_columns
+
+TABLE = 'report'
+ROW_ID = 'row_id'
+TIME_COLUMN = 'update_at'
+ACCOUNT_COLUMN = 'account_key'
+# Query filters and the indexed columns they use; an equality filter
+# together with a time range is served by one composite index
+INDEXES = {
+    'update_at': [TIME_COLUMN],
+    'transaction_type': ['transaction_type', TIME_COLUMN],
+    'sender': ['senderAddress', TIME_COLUMN],
+    'platform': ['platform', TIME_COLUMN],
+    'account': [ACCOUNT_COLUMN, TIME_COLUMN],
+}
+FILTER_COLUMNS = {
+    'sender': 'senderAddress', 'platform': 'platform', 'account': ACCOUNT_COLUMN, 'transaction_type': 'transaction_type',
+}
+
+
+def store_path_for(output_path):
+    # Reports.csv -> Reports.sqlite
+    return os.path.splitext(output_path)[0] + '.sqlite'
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sql_type(column):
+    if column in FLOAT_COLUMNS:
+        return 'REAL'
+    if column in INT_COLUMNS or column in BOOL_COLUMNS:
+        return 'INTEGER'
+    return 'TEXT'
+
+
+def _sql_values(sms_data):
+    # Report columns (processed, or read back from CSV) as SQLite values,
+    # plus the row key, time and account key
+    values = {ROW_ID: sms_data.index.to_numpy(dtype=np.int64)}
+    for column in report_columns(sms_data).columns:
+        column_values = sms_data[column]
+        if column in FLOAT_COLUMNS:
+            column_values = pd.to_numeric(column_values, errors='coerce')
+        elif column in INT_COLUMNS:
+            column_values = pd.to_numeric(column_values, errors='coerce').astype('Int64')
+        elif column in BOOL_COLUMNS:
+            column_values = column_values.map({True: 1, False: 0, 'True': 1, 'False': 0}).astype('Int64')
+        else:
+            # Empty text is NULL, as it reads back from the CSV
+            column_values = column_values.astype(object).map(str, na_action='ignore').replace('', None)
+        values[column] = column_values.to_numpy()
+    values[TIME_COLUMN] = ledger_times(sms_data).dt.strftime('%Y-%m-%d %H:%M:%S').to_numpy()
+    if 'account_number' in sms_data:
+        values[ACCOUNT_COLUMN] = account_key(sms_data['account_number']).to_numpy()
+    frame = pd.DataFrame(values).astype(object)
+    return frame.where(frame.notna(), None)
+
+
+class ReportStore:
+    """Writes report frames into the SQLite store at ``path``; see the module docstring.
+
+    Frames must keep the input row number as their index, as the
+    pipeline's frames do.  With ``append``, rows are upserted into the
+    existing table instead of replacing it.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.columns = None
+        self.rows = 0
+
+    def _create(self, columns):
+        if not self.append:
+            self.connection.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        definitions = [f'{ROW_ID} INTEGER PRIMARY KEY'] + [
+            f'{_quote(column)} {_sql_type(column)}' for column in columns if column != ROW_ID
+        ]
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS {TABLE} ({", ".join(definitions)})')
+        existing = [row[1] for row in self.connection.execute(f'PRAGMA table_info({TABLE})')]
+        if existing != list(columns):
+            raise ValueError(f'{self.path} holds a report with other columns; rebuild it without appending')
+        self.columns = list(columns)
+
+    def write(self, sms_data):
+        """Insert (or, on the same ``row_id``, replace) every row of ``sms_data`` in one transaction."""
+        values = _sql_values(sms_data)
+        with self.connection:
+            if self.columns is None:
+                self._create(values.columns)
+            if len(values):
+                placeholders = ', '.join('?' * len(self.columns))
+                self.connection.executemany(
+                    f'INSERT OR REPLACE INTO {TABLE} ({", ".join(map(_quote, self.columns))}) VALUES ({placeholders})',
+                    values.itertuples(index=False, name=None),
+                )
+        self.rows += len(values)
+
+    def close(self):
+        """Index the table (after the bulk load, which is faster) and close the store."""
+        if self.columns is not None:
+            with self.connection:
+                for name, columns in INDEXES.items():
+                    if all(column in self.columns for column in columns):
+                        self.connection.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_{name} ON {TABLE} '
+                                                f'({", ".join(map(_quote, columns))})')
+            self.connection.execute('ANALYZE')
+        self.connection.close()
+
+
+def rebuild_store_from_csv(csv_path, path, row_ids, chunksize=100_000):
+    """Regenerate the store at ``path`` from an existing report CSV.
+
+    ``row_ids`` are the input row numbers of the report rows, in order.
+    """
+    store = ReportStore(path)
+    start = 0
+    with pd.read_csv(csv_path, dtype=str, chunksize=chunksize) as chunks:
+        for sms_data in chunks:
+            sms_data.index = row_ids[start:start + len(sms_data)]
+            start += len(sms_data)
+            store.write(sms_data)
+    store.close()
+
+
+def query_store(path, since=None, until=None, sender=None, platform=None, account=None, transaction_type=None,
+                columns=None, limit=None):
+    """Report rows of the store at ``path`` matching every filter given, in time order.
+
+    ``since`` (inclusive) and ``until`` (exclusive) bound ``update_at``
+    and take anything ``pd.Timestamp`` reads; ``account`` is matched as
+    ``account_key`` normalises it.
+    """
+    if account is not None:
+        account = account_key(pd.Series([account])).iloc[0]
+    filters = {'sender': sender, 'platform': platform, 'account': account, 'transaction_type': transaction_type}
+    conditions, params = [], []
+    for name, value in filters.items():
+        if value is not None:
+            conditions.append(f'{_quote(FILTER_COLUMNS[name])} = ?')
+            params.append(value)
+    for bound, operator in ((since, '>='), (until, '<')):
+        if bound is not None:
+            conditions.append(f'{TIME_COLUMN} {operator} ?')
+            params.append(pd.Timestamp(bound).strftime('%Y-%m-%d %H:%M:%S'))
+    selected = '*' if columns is None else ', '.join(map(_quote, columns))
+    sql = f'SELECT {selected} FROM {TABLE}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {TIME_COLUMN}, {ROW_ID}'
+    if limit is not None:
+        sql += f' LIMIT {int(limit)}'
+    with sqlite3.connect(f'file:{path}?mode=ro', uri=True) as connection:
+        return pd.read_sql_query(sql, connection, params=params)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sms_pipeline.store',
+                                     description='Query the SQLite store of a report (written with --store).')
+    parser.add_argument('store', help='store file (e.g. Reports.sqlite)')
+    parser.add_argument('--since', help='first update time to include (e.g. 2022-04-01)')
+    parser.add_argument('--until', help='update time to stop before')
+    parser.add_argument('--sender', help='senderAddress, e.g. VM-SBIUPI')
+    parser.add_argument('--platform', help='platform, e.g. Zomato')
+    parser.add_argument('--account', help='account number, e.g. XX6618')
+    parser.add_argument('--type', dest='transaction_type', help='transaction type (Paid/Debited or Credited)')
+    parser.add_argument('--columns', help='comma-separated columns to print (default: all)')
+    parser.add_argument('--limit', type=int, help='most rows to print')
+    parser.add_argument('-o', '--output', help='write the rows to this CSV instead of stdout')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    rows = query_store(args.store, args.since, args.until, args.sender, args.platform, args.account,
+                       args.transaction_type, args.columns.split(',') if args.columns else None, args.limit)
+    elapsed = time.perf_counter() - started
+    rows.to_csv(args.output or sys.stdout, index=False)
+    print(f'{len(rows)} rows in {elapsed * 1000:.1f} ms', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
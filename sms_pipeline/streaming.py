@@ -0,0 +1,232 @@
+"""Whole-file and chunked (bounded memory) runs of the reports.
+
+Both modes read the input through ``read_sms`` and push rows through the
+same ``process_reports`` pipeline, so a streaming run writes exactly the
+same bytes as a whole-file run; only peak memory differs.  ``run_reports``
+reads the input once and writes any number of report variants from it.
+"""
+
+import os
+from contextlib import nullcontext
+
+import pandas as pd
+
+from .accounts import (
+    AccountIndexBuilder, account_index_path_for, account_key, csv_row_spans, read_account_index, write_account_index,
+)
+from .columnar import ParquetReportWriter, parquet_path_for
+from .compact import compact_report, expand_frame, report_memory
+from .metrics import measured, measured_reads
+from .pipeline import process_reports
+from .rollup import RollupBuilder, read_rollup, rollup_path_for, write_rollup
+from .sources import is_excel, iter_source, load_source
+from .stages import REPORTS, TIMESTAMP_COLUMN, report_columns
+from .store import ReportStore, store_path_for
+
+# File path to the CSV file
+INPUT_PATH = "SMS-Data.csv"
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def read_sms(file_path=INPUT_PATH, chunksize=None):
+    """Load the SMS export, or return an iterator of chunks of ``chunksize`` rows.
+
+    Every column is read as text.  With type inference a chunk that happens to
+    hold only numeric sender IDs would be parsed (and written back) differently
+    from the same rows in a whole-file read.  Excel workbooks are read
+    through the binary cache of ``sources``.
+    """
+    if is_excel(file_path):
+        return nullcontext(iter_source(file_path, chunksize)) if chunksize else load_source(file_path)
+    return pd.read_csv(file_path, dtype=str, chunksize=chunksize)
+
+
+def output_path_for(report):
+    return REPORTS[report]['output']
+
+
+def _read_whole(file_path):
+    yield read_sms(file_path)
+
+
+def report_writers(outputs, formats=('csv',), rollup=False, account_index=False, metrics=None, store=False,
+                   compact=False):
+    """One ``ReportWriter`` per entry of ``outputs``, keyed by report.
+
+    ``account_index`` applies to the reports with account numbers.  With
+    several reports, ``metrics`` names the writes ``<report>.to_csv`` and
+    so on.
+    """
+    prefix = '{}.' if len(outputs) > 1 else ''
+    return {report: ReportWriter(path, formats=formats, rollup=rollup, metrics=metrics, prefix=prefix.format(report),
+                                 account_index=account_index and REPORTS[report]['accounts'], store=store,
+                                 compact=compact)
+            for report, path in outputs.items()}
+
+
+def run_reports(file_path=INPUT_PATH, outputs=None, chunksize=None, formats=('csv',), rollup=False, templates=False,
+                metrics=None, account_index=False, spam_model=None, store=False, compact=False, amount_details=False):
+    """Read ``file_path`` once and write every report in ``outputs``.
+
+    ``outputs`` maps report names to output paths (default: every report to
+    its usual file).  The file is processed whole, or ``chunksize`` rows at
+    a time.  ``spam_model`` (a ``SpamModel`` or its path) decides
+    ``final_credit`` from spam scores.  ``store`` also loads every report
+    into its SQLite store.  ``compact`` holds every report frame in the
+    compact schema while it is written.  ``amount_details`` reads the
+    amounts and quoted balances with ``amounts.amount_details``.  Returns
+    ``{report: summary}`` with the summaries of ``write_chunks``.
+    """
+    outputs = outputs or {report: output_path_for(report) for report in REPORTS}
+    writers = report_writers(outputs, formats, rollup, account_index, metrics, store, compact)
+    with read_sms(file_path, chunksize=chunksize) if chunksize else nullcontext(_read_whole(file_path)) as frames:
+        for sms_data in measured_reads(frames, metrics):
+            results = process_reports(sms_data, outputs, templates, metrics, spam_model, amount_details)
+            # Neither the input nor a report is held while writing, so a
+            # compacted report replaces the processed one in memory
+            del sms_data
+            for report in outputs:
+                writers[report].write(results.pop(report))
+    return {report: writer.close() for report, writer in writers.items()}
+
+
+def run(file_path=INPUT_PATH, output_path=None, report='reports', formats=('csv',), rollup=False, templates=False,
+        metrics=None, account_index=False, spam_model=None, store=False, compact=False, amount_details=False):
+    """Process the whole file in memory and write the report in one go.
+
+    Returns the same summary as ``write_chunks``.
+    """
+    output_path = output_path or output_path_for(report)
+    return run_reports(file_path, {report: output_path}, formats=formats, rollup=rollup, templates=templates,
+                       metrics=metrics, account_index=account_index, spam_model=spam_model, store=store,
+                       compact=compact, amount_details=amount_details)[report]
+
+
+def run_streaming(file_path=INPUT_PATH, output_path=None, report='reports', chunksize=DEFAULT_CHUNKSIZE,
+                  formats=('csv',), rollup=False, templates=False, metrics=None, account_index=False, spam_model=None,
+                  store=False, compact=False, amount_details=False):
+    """Process the file ``chunksize`` rows at a time, appending to the output.
+
+    Peak memory is bounded by the chunk size instead of the file size.
+    """
+    output_path = output_path or output_path_for(report)
+    return run_reports(file_path, {report: output_path}, chunksize, formats=formats, rollup=rollup,
+                       templates=templates, metrics=metrics, account_index=account_index, spam_model=spam_model,
+                       store=store, compact=compact, amount_details=amount_details)[report]
+
+
+class ReportWriter:
+    """Writes the processed frames of one report, in order; see ``write_chunks``."""
+
+    def __init__(self, output_path, append=False, formats=('csv',), rollup=False, metrics=None, prefix='',
+                 account_index=False, store=False, compact=False):
+        self.output_path = output_path
+        self.append = append
+        self.formats = formats
+        self.metrics = metrics
+        self.prefix = prefix
+        self.header = not append
+        self.parquet = None
+        if 'parquet' in formats:
+            self.parquet = ParquetReportWriter(parquet_path_for(output_path), append=append)
+        self.rollups = RollupBuilder() if rollup else None
+        self.accounts = None
+        if account_index:
+            if 'csv' not in formats:
+                raise ValueError('the account index points into the CSV report; write it as well')
+            self.accounts = AccountIndexBuilder()
+            if append:
+                self.accounts.merge(read_account_index(account_index_path_for(output_path)))
+        self.store = ReportStore(store_path_for(output_path), append=append) if store else None
+        self.compact = compact
+        self.summary = {'rows': 0, 'invalid_update_at': 0}
+        if compact:
+            self.summary.update(memory_bytes=0, compact_memory_bytes=0)
+
+    def write(self, sms_data):
+        metrics, prefix = self.metrics, self.prefix
+        if self.compact:
+            with measured(metrics, prefix + 'compact', len(sms_data)):
+                self.summary['memory_bytes'] += report_memory(sms_data)
+                sms_data = compact_report(sms_data)
+                self.summary['compact_memory_bytes'] += report_memory(sms_data)
+            # Only the columns whose compact form writes differently are expanded
+            sms_data = expand_frame(sms_data)
+        if 'csv' in self.formats and (self.header or len(sms_data)):
+            # The first write truncates the output, every later one appends to it
+            with measured(metrics, prefix + 'to_csv', len(sms_data)):
+                if self.accounts is None:
+                    report_columns(sms_data).to_csv(self.output_path, index=False, mode='w' if self.header else 'a',
+                                                    header=self.header)
+                else:
+                    self._write_indexed(report_columns(sms_data))
+            self.header = False
+        if self.parquet is not None:
+            with measured(metrics, prefix + 'parquet', len(sms_data)):
+                self.parquet.write(report_columns(sms_data))
+        if self.rollups is not None:
+            with measured(metrics, prefix + 'rollup', len(sms_data)):
+                self.rollups.add(report_columns(sms_data))
+        if self.store is not None:
+            with measured(metrics, prefix + 'store', len(sms_data)):
+                self.store.write(sms_data)
+        self.summary['rows'] += len(sms_data)
+        self.summary['invalid_update_at'] += int(sms_data[TIMESTAMP_COLUMN].isna().sum())
+
+    def _write_indexed(self, report):
+        # The same bytes to_csv would write, with the offset of every row
+        # added to the account index
+        if 'account_number' not in report.columns:
+            raise ValueError(f'{self.output_path} has no account_number column to index')
+        data = report.to_csv(index=False, header=self.header).encode('utf-8')
+        with open(self.output_path, 'wb' if self.header else 'ab') as f:
+            position = f.tell()
+            f.write(data)
+        offsets, lengths = csv_row_spans(data, header=self.header)
+        if self.header:
+            self.accounts.header_length = len(data) - int(lengths.sum())
+        self.accounts.add(account_key(report['account_number']), offsets + position, lengths)
+
+    def close(self):
+        """Finish the rollup table, account index and store; returns the summary."""
+        if self.accounts is not None:
+            with measured(self.metrics, self.prefix + 'account_index'):
+                write_account_index(self.accounts.result(), account_index_path_for(self.output_path))
+        if self.rollups is not None:
+            with measured(self.metrics, self.prefix + 'rollup'):
+                if self.append:
+                    self.rollups.merge(read_rollup(rollup_path_for(self.output_path)))
+                write_rollup(self.rollups.result, rollup_path_for(self.output_path))
+        if self.store is not None:
+            with measured(self.metrics, self.prefix + 'store'):
+                self.store.close()
+        return self.summary
+
+
+def write_chunks(frames, output_path, append=False, formats=('csv',), rollup=False, metrics=None, account_index=False,
+                 store=False, compact=False):
+    """Write processed frames to ``output_path`` in order.
+
+    The header comes from the first frame even when none of its rows survived
+    the filters, so the file always starts the same way as a whole-file run.
+    With ``append=True`` the frames are added to an existing report instead.
+    ``formats`` may also (or only) name ``'parquet'``, which writes the
+    partitioned dataset at ``parquet_path_for(output_path)``.  ``rollup=True``
+    also maintains the aggregate table at ``rollup_path_for(output_path)``;
+    when appending, the new rows are merged into the existing one.
+    ``account_index=True`` writes the account index of the CSV at
+    ``account_index_path_for(output_path)``, extended when appending.
+    ``store=True`` loads the rows into the SQLite store at
+    ``store_path_for(output_path)``, upserting them when appending.
+    ``compact=True`` holds every frame in the compact schema while it is
+    written and adds its ``memory_bytes`` before and ``compact_memory_bytes``
+    after to the summary.  ``metrics`` records the writes as ``to_csv``, ``parquet`` and ``rollup``.
+    Returns a summary with the number of ``rows`` written and of rows whose
+    ``updateAt`` could not be parsed (``invalid_update_at``).
+    """
+    writer = ReportWriter(output_path, append, formats, rollup, metrics, account_index=account_index, store=store,
+                          compact=compact)
+    for sms_data in frames:
+        writer.write(sms_data)
+    return writer.close()
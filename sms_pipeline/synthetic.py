@@ -0,0 +1,233 @@
+"""Seeded synthetic SMS exports for tuning and benchmarking.
+
+``iter_synthetic`` yields frames with the columns of the real export (``id``,
+``phoneNumber``, ``senderAddress``, ``text``, ``updateAt``).  They are built
+from bank, UPI, wallet, BNPL, spam and other (OTP, delivery) templates
+modelled on ``Final SMS Dataset_2.xlsx``.  The same ``rows`` and ``seed``
+always give the same data, so a file can be regenerated anywhere instead
+of being shipped::
+
+    python -m sms_pipeline.synthetic 1M -o synthetic_1M.csv
+"""
+
+import argparse
+from functools import lru_cache
+from string import Formatter
+
+import numpy as np
+import pandas as pd
+
+# Rows generated per block; fixed so the data does not depend on how it is written
+BLOCK_ROWS = 100_000
+
+# Messages start here and are on average this many seconds apart
+START = pd.Timestamp('2022-01-01', tz='UTC')
+MEAN_GAP_SECONDS = 30
+
+SIZES = {'10k': 10_000, '1M': 1_000_000, '10M': 10_000_000}
+
+# (name in the text, sender header); only some headers contain a BANK_LIST name
+BANKS = [
+    ('HDFC Bank', 'HDFCBK'), ('ICICI Bank', 'ICICIB'), ('SBI', 'SBIUPI'), ('Axis Bank', 'AXISBK'),
+    ('PNB', 'PNBSMS'), ('Kotak Bank', 'KOTAKB'), ('Bank of Baroda', 'BOBTXN'), ('Canara Bank', 'CANBNK'),
+]
+MERCHANTS = ['Zomato', 'Swiggy', 'Amazon', 'Flipkart', 'Myntra', 'BigBasket', 'Uber', 'Ola', 'Dunzo', 'BookMyShow']
+NAMES = ['Rahul Kumar', 'Priya Sharma', 'Amit Singh', 'Sneha Patel', 'Vikas Gupta', 'Anjali Verma', 'Mr Hayar Nisa']
+LENDERS = ['KreditBee', 'MoneyTap', 'CASHe', 'Navi', 'mPokket']
+OPERATOR_PREFIXES = ['VM', 'VK', 'BP', 'AD', 'JM', 'JD', 'BT', 'AX']
+
+# (kind, weight, text, sender headers); None takes the header of the bank in the text
+TEMPLATES = [
+    ('bank', 10, 'Rs.{amount} debited from A/c XX{account} on {date}. Avl Bal Rs.{balance} -{bank}', None),
+    ('bank', 8, 'Dear Customer, Your a/c XXXXXXXX{account} is credited for Rs {amount} on {date} through UPI.'
+                'Available Bal Rs {balance} (UPI Ref ID {ref})-{bank}', None),
+    ('bank', 5, 'Dear Customer, Rs.{amount} withdrawn at {bank} ATM from A/cX{account} on {date}. '
+                'Available Balance Rs.{balance}. If not withdrawn by you, call 1800 11 2211.', None),
+    ('bank', 4, 'A/c **{account} Debited for Rs.{amount} on {date} by Mob Bk Avl Bal Rs:{balance} -{bank}', None),
+    ('bank', 3, 'EMI of Rs.{amount} for your loan a/c XX{account} has been deducted on {date}. -{bank}', None),
+    ('upi', 8, 'Your a/c no. XXXXXXXX{account} is debited for Rs.{amount} on {date} and credited to '
+               'a/c no. XXXXXXXX{account2} (UPI Ref no {ref})', None),
+    ('upi', 7, 'Rs.{amount} paid thru A/C XX{account} on {date} to {name}, UPI Ref {ref}. '
+               'If not done, SMS BLOCKUPI to 9901771222.-{bank}', None),
+    ('upi', 6, 'Rs.{amount} Credited to A/c ...{account} thru UPI/{ref} by {name}. '
+               'Total Bal:Rs.{balance}CR. Avlbl Amt:Rs.{balance} - {bank}', None),
+    ('upi', 4, 'Rs.{amount} transferred from A/c ...{account} to:UPI/{ref}. Total Bal:Rs.{balance}CR - {bank}', None),
+    ('wallet', 4, 'Paid Rs.{amount} to {merchant} from Paytm Balance. Updated Balance: Paytm Wallet- Rs {balance}. '
+                  'Ref: {ref}', ['iPaytm']),
+    ('wallet', 3, 'Rs.{amount} received in your Paytm Wallet from {name}. Ref: {ref}', ['iPaytm']),
+    ('wallet', 3, 'Cashback of Rs.{amount} added to your PhonePe wallet for payment on {merchant} via UPI.',
+     ['PHONPE']),
+    ('bnpl', 4, 'Rs.{amount} on {merchant} charged via Simpl. Your total outstanding is Rs.{balance}.', ['SIMPLE']),
+    ('bnpl', 3, 'Rs {amount} paid on {merchant} via LazyPay. Bill of Rs {balance} due on {date}.', ['LZYPAY']),
+    ('bnpl', 2, '₹{amount} spent on {merchant} using ZestMoney EMI. Ref {ref}', ['ZESTMN']),
+    ('spam', 4, 'Congratulations! You have won a cash reward of Rs.{amount}. Claim now: http://bit.ly/{code}',
+     ['620016', '650137']),
+    ('spam', 4, 'Get instant credit upto Rs {large} from {lender}. Apply now! Limited time offer. '
+                'T&C apply.', ['KRDTBE', 'MNYTAP']),
+    ('spam', 3, 'Bonus +{percent}% up to ₹{large} for you. Take it! b.link/{code}', ['620016']),
+    ('other', 4, '{otp} is your OTP for login. Do not share it with anyone.', ['HDFCBK', 'ICICIB', 'SBIUPI']),
+    ('other', 3, 'Your {merchant} order has been delivered. Rate your experience at https://m.{code}.in',
+     ['SWIGGY', 'ZOMATO', 'AMAZON']),
+]
+
+
+_WEIGHTS = np.array([weight for _, weight, _, _ in TEMPLATES], dtype=float)
+_WEIGHTS /= _WEIGHTS.sum()
+
+_PAISE = np.asarray([f'{paise:02d}' for paise in range(100)], dtype=object)
+
+
+def _positional(template):
+    # The template with its named fields numbered, plus the field names in order
+    names = [name for _, name, _, _ in Formatter().parse(template) if name]
+    return template.format(**{name: '{%d}' % number for number, name in enumerate(names)}), names
+
+
+def _choice(rng, values, size):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), size)]
+
+
+def _digits(rng, width, size):
+    # Zero-padded random numbers of ``width`` digits (drop the leading 1)
+    padded = (rng.integers(0, 10 ** width, size) + 10 ** width).astype(str)
+    return np.asarray([number[1:] for number in padded], dtype=object)
+
+
+def _money(rng, mean, size):
+    # Log-normal amounts, half of them printed with paise
+    paise = np.round(rng.lognormal(np.log(mean), 1.2, size) * 100).astype(np.int64)
+    rupees, paise = np.divmod(paise, 100)
+    text = rupees.astype(str).astype(object)
+    with_paise = rng.random(size) < 0.5
+    text[with_paise] += '.' + _PAISE[paise[with_paise]]
+    return text
+
+
+@lru_cache(maxsize=None)
+def _clock():
+    # "HH:MM:SS" for every second of the day
+    return np.asarray([f'{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}'
+                       for second in range(86400)], dtype=object)
+
+
+def _format_seconds(seconds):
+    # updateAt strings and the short in-text date of epoch ``seconds``;
+    # strftime runs once per distinct day only
+    days, time_of_day = np.divmod(seconds, 86400)
+    unique_days, day_codes = np.unique(days, return_inverse=True)
+    stamps = pd.to_datetime(unique_days * 86400, unit='s', utc=True)
+    prefix = np.asarray(stamps.strftime('%a, %d %b %Y '), dtype=object)[day_codes]
+    short = np.asarray(stamps.strftime('%d-%m-%y'), dtype=object)[day_codes]
+    return prefix + _clock()[time_of_day] + ' GMT', short
+
+
+def _users(rng, count):
+    ids = [f'{a:08x}-{b:04x}-4{c:03x}-{d:04x}-{e:012x}' for a, b, c, d, e in zip(
+        rng.integers(0, 16 ** 8, count), rng.integers(0, 16 ** 4, count), rng.integers(0, 16 ** 3, count),
+        rng.integers(0, 16 ** 4, count), rng.integers(0, 16 ** 12, count, dtype=np.int64))]
+    phones = ['xx' + number for number in _digits(rng, 8, count)]
+    return np.asarray(ids, dtype=object), np.asarray(phones, dtype=object)
+
+
+def _block(rng, rows, start, users):
+    template_ids = rng.choice(len(TEMPLATES), size=rows, p=_WEIGHTS)
+    seconds = start + np.cumsum(rng.exponential(MEAN_GAP_SECONDS, rows)).astype(np.int64)
+    update_at, date = _format_seconds(seconds)
+
+    bank_ids = rng.integers(0, len(BANKS), rows)
+    fields = {
+        'amount': _money(rng, 400, rows),
+        'balance': _money(rng, 15000, rows),
+        'large': _money(rng, 50000, rows),
+        'account': _digits(rng, 4, rows),
+        'account2': _digits(rng, 4, rows),
+        'ref': _digits(rng, 12, rows),
+        'otp': _digits(rng, 6, rows),
+        'percent': rng.integers(10, 100, rows).astype(str).astype(object),
+        'code': _digits(rng, 5, rows),
+        'date': date,
+        'bank': np.asarray([name for name, _ in BANKS], dtype=object)[bank_ids],
+        'name': _choice(rng, NAMES, rows),
+        'merchant': _choice(rng, MERCHANTS, rows),
+        'lender': _choice(rng, LENDERS, rows),
+    }
+    bank_headers = np.asarray([header for _, header in BANKS], dtype=object)[bank_ids]
+    prefixes = _choice(rng, OPERATOR_PREFIXES, rows)
+
+    text = np.empty(rows, dtype=object)
+    sender = np.empty(rows, dtype=object)
+    for template_id, (_, _, template, headers) in enumerate(TEMPLATES):
+        rows_of = np.flatnonzero(template_ids == template_id)
+        if not len(rows_of):
+            continue
+        positional, names = _positional(template)
+        text[rows_of] = [positional.format(*row) for row in zip(*(fields[name][rows_of] for name in names))]
+        header = bank_headers[rows_of] if headers is None else _choice(rng, headers, len(rows_of))
+        sender[rows_of] = prefixes[rows_of] + '-' + header
+
+    ids, phones = users
+    user = rng.integers(0, len(ids), rows)
+    frame = pd.DataFrame({
+        'id': ids[user],
+        'phoneNumber': phones[user],
+        'senderAddress': sender,
+        'text': text,
+        'updateAt': update_at,
+    })
+    return frame, int(seconds[-1])
+
+
+def iter_synthetic(rows, seed=0):
+    """Yield the synthetic export for ``rows`` and ``seed`` in blocks of ``BLOCK_ROWS``."""
+    sequence = np.random.SeedSequence(seed)
+    users_seed, *block_seeds = sequence.spawn(1 + -(-rows // BLOCK_ROWS))
+    users = _users(np.random.default_rng(users_seed), max(1, rows // 500))
+    start = int(START.timestamp())
+    for number, block_seed in enumerate(block_seeds):
+        offset = number * BLOCK_ROWS
+        frame, start = _block(np.random.default_rng(block_seed), min(BLOCK_ROWS, rows - offset), start, users)
+        frame.index = pd.RangeIndex(offset, offset + len(frame))
+        yield frame
+
+
+def generate_sms(rows, seed=0):
+    """The whole synthetic export as one DataFrame."""
+    frames = list(iter_synthetic(rows, seed))
+    if not frames:
+        return pd.DataFrame(columns=['id', 'phoneNumber', 'senderAddress', 'text', 'updateAt'])
+    return pd.concat(frames)
+
+
+def write_synthetic(file_path, rows, seed=0):
+    """Write the synthetic export as CSV, one block at a time."""
+    header = True
+    for frame in iter_synthetic(rows, seed):
+        frame.to_csv(file_path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+    if header:
+        generate_sms(0).to_csv(file_path, index=False)
+    return file_path
+
+
+def parse_size(value):
+    """Row count from ``10k``/``1M``/``10M`` style sizes or a plain number."""
+    if value in SIZES:
+        return SIZES[value]
+    multiplier = {'k': 1_000, 'M': 1_000_000}.get(value[-1:], 1)
+    return int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sms_pipeline.synthetic',
+                                     description='Write a seeded synthetic SMS export.')
+    parser.add_argument('rows', help='number of rows, e.g. 10k, 1M or 10M')
+    parser.add_argument('-o', '--output', help='CSV file to write (default: synthetic_<rows>.csv)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: %(default)s)')
+    args = parser.parse_args(argv)
+    output_path = args.output or f'synthetic_{args.rows}.csv'
+    write_synthetic(output_path, parse_size(args.rows), args.seed)
+    print(f"Synthetic SMS export saved to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
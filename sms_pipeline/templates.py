@@ -0,0 +1,174 @@
+"""Template cache: classify each SMS template once.
+
+Transactional SMS are mostly the same bank or app template with different
+amounts, masked account numbers, dates and reference numbers.
+``template_key`` masks those parts: every run of digits becomes ``0`` and
+every run of ``X`` in front of digits (a masked account number) becomes one
+``X``.  The masked text stands for the whole template.
+
+The mask turns digits into a digit and letters into a letter and leaves
+everything else alone, so no literal of the platform, payment-method or
+amount patterns can appear or disappear.  Keywords match whole words, and
+the mask only changes words with a digit in them; a keyword word with a
+digit or an ``xx`` (``24x7``) could still appear or disappear, so a
+message holding one, before or after masking, is cached under its own
+text.  The rules therefore decide exactly the same on the key as on the
+original.
+``TemplateCache`` memoizes per template the keyword hits and which of the
+extraction patterns match (platform patterns as they are asked for).  Per
+message, only the patterns known to match are run to pull out the variable
+values.  (Masking month names as well was
+measured to add almost nothing to the hit rate at a high regex cost.)
+"""
+
+import hashlib
+import os
+import pickle
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .classify import KEYWORDS, PAYMENT_METHOD_PATTERN, PLATFORM_PATTERN, _as_text
+
+_DIGITS = re.compile(r'\d+')
+_MASKED_ACCOUNT = re.compile(r'[Xx]{2,}(?=0)')
+
+# Keyword words the mask could change or make up
+_UNMASKABLE = re.compile(r'\d|xx', re.IGNORECASE)
+
+_AMOUNT_RE = re.compile(r'(₹|Rs\.?)\s?(\d+[.,]?\d*)')
+_PAYMENT_METHOD_RE = re.compile(PAYMENT_METHOD_PATTERN, re.IGNORECASE)
+
+DEFAULT_MAXSIZE = 200_000
+
+
+def template_key(text):
+    """Mask the variable parts of ``text``; equal keys mean the same template."""
+    return _MASKED_ACCOUNT.sub('X', _DIGITS.sub('0', text))
+
+
+def unmaskable_words():
+    """The words of ``KEYWORDS`` that have a digit or an ``xx`` in them."""
+    return sorted({word for state in KEYWORDS.goto for word in state if _UNMASKABLE.search(word)})
+
+
+def rules_version():
+    """Hash of every rule the cached results depend on."""
+    from . import classify
+
+    rules = (
+        sorted(classify.KEYWORD_PATTERNS.items()), classify.PAYMENT_METHOD_PATTERN,
+        _AMOUNT_RE.pattern, _DIGITS.pattern, _MASKED_ACCOUNT.pattern,
+    )
+    return hashlib.sha1(repr(rules).encode('utf-8')).hexdigest()
+
+
+class TemplateCache:
+    """LRU cache of per-template rule results, with hit/miss counters."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._compiled = {}
+        words = unmaskable_words()
+        self._unmaskable = re.compile(r'(?<!\w)(?:' + '|'.join(map(re.escape, words)) + r')(?!\w)',
+                                      re.IGNORECASE) if words else None
+
+    def _platform_re(self, platform_pattern):
+        if platform_pattern not in self._compiled:
+            self._compiled[platform_pattern] = re.compile(platform_pattern, re.IGNORECASE)
+        return self._compiled[platform_pattern]
+
+    def lookup(self, masked):
+        """Keyword hits and whether payment method and amount match, for one template.
+
+        The last item maps platform patterns to whether they match; it is
+        filled in by ``has_platform`` as patterns are asked for.
+        """
+        entry = self.entries.get(masked)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(masked)
+            return entry
+
+        self.misses += 1
+        entry = (
+            KEYWORDS.scan(masked),
+            _PAYMENT_METHOD_RE.search(masked) is not None,
+            _AMOUNT_RE.search(masked) is not None,
+            {},
+        )
+        self.entries[masked] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return entry
+
+    def has_platform(self, masked, entry, platform_pattern):
+        platforms = entry[3]
+        if platform_pattern not in platforms:
+            platforms[platform_pattern] = self._platform_re(platform_pattern).search(masked) is not None
+        return platforms[platform_pattern]
+
+    def analyze(self, texts, platform_patterns=(PLATFORM_PATTERN,)):
+        """Run the rules on ``texts`` through the cache.
+
+        Returns the ``KEYWORDS`` bitmask of every message as ``hits``, its
+        ``payment_method`` and ``amount`` exactly as ``classify_batch`` and
+        ``extract_amount`` compute them, and one column per platform pattern
+        (named by the pattern) with the extracted platform.
+        """
+        texts = _as_text(texts)
+        n = len(texts)
+        hits = np.zeros(n, dtype=np.int64)
+        payment_method = np.full(n, np.nan, dtype=object)
+        amount = np.full(n, np.nan)
+        platforms = [(self._platform_re(pattern), pattern, np.full(n, np.nan, dtype=object))
+                     for pattern in platform_patterns]
+
+        unmaskable = self._unmaskable
+        for i, text in enumerate(texts):
+            masked = template_key(text)
+            if unmaskable is not None and (unmaskable.search(text) or unmaskable.search(masked)):
+                masked = text
+            entry = self.lookup(masked)
+            found, has_payment_method, has_amount, _ = entry
+            hits[i] = found
+            for platform_re, pattern, platform in platforms:
+                if self.has_platform(masked, entry, pattern):
+                    platform[i] = platform_re.search(text).group(1).strip()
+            if has_payment_method:
+                payment_method[i] = _PAYMENT_METHOD_RE.search(text).group(1).strip()
+            if has_amount:
+                value = float(_AMOUNT_RE.search(text).group(2).replace(',', ''))
+                if value > 1:  # Same "not a phone number or random digits" check as extract_amount
+                    amount[i] = value
+
+        result = pd.DataFrame({'hits': hits, 'payment_method': payment_method, 'amount': amount}, index=texts.index)
+        for _, pattern, platform in platforms:
+            result[pattern] = platform
+        return result
+
+    def save(self, path):
+        """Persist the cache so later runs start warm."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'rules': rules_version(), 'entries': list(self.entries.items())}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def update_from(self, path):
+        """Add the entries saved at ``path``, unless missing or saved under other rules."""
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+            if saved.get('rules') == rules_version():
+                self.entries.update(saved['entries'][-self.maxsize:])
+        return self
+
+
+# Shared by every run in this process; pool workers load it from the saved file
+CACHE = TemplateCache()
@@ -0,0 +1,121 @@
+"""Parsing of the ``updateAt`` column.
+
+``updateAt`` always has the RFC-2822-like shape ``Tue, 15 Mar 2022 10:20:30
+GMT``.  ``TimestampParser`` splits that shape by hand instead of going
+through ``strptime``'s ``%Z`` handling, parses each distinct string only
+once and keeps the results for later chunks.  Anything it does not
+recognise (a two-digit year, say) falls back to ``pd.to_datetime`` with
+the original format.  Values neither can read, and times outside what
+``datetime64[ns]`` holds, become NaT and are counted instead of failing
+the run.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = '%a, %d %b %Y %H:%M:%S %Z'
+
+_WEEKDAYS = {'Mon,', 'Tue,', 'Wed,', 'Thu,', 'Fri,', 'Sat,', 'Sun,'}
+_MONTHS = {name: number for number, name in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], start=1)}
+_UTC_ZONES = {'GMT', 'UTC'}
+
+_EPOCH = datetime(1970, 1, 1)
+_NAT = np.iinfo(np.int64).min
+_FALLBACK = object()
+# What datetime64[ns] holds; later or earlier times are NaT
+_FIRST = pd.Timestamp.min.to_pydatetime(warn=False)
+_LAST = pd.Timestamp.max.to_pydatetime(warn=False)
+
+
+def _parse_fast(value):
+    """Return nanoseconds since the epoch (UTC), NaT, or ``_FALLBACK``."""
+    parts = value.split()
+    if len(parts) != 6 or parts[0] not in _WEEKDAYS or parts[5] not in _UTC_ZONES:
+        return _FALLBACK
+    month = _MONTHS.get(parts[2])
+    clock = parts[4].split(':')
+    # %Y needs four digits; anything else is left to the fallback
+    if month is None or len(clock) != 3 or len(parts[3]) != 4:
+        return _FALLBACK
+    try:
+        stamp = datetime(int(parts[3]), month, int(parts[1]), int(clock[0]), int(clock[1]), int(clock[2]))
+    except ValueError:
+        return _NAT
+    if not _FIRST <= stamp <= _LAST:
+        return _NAT
+    delta = stamp - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000_000
+
+
+def _nanos(stamp):
+    # A fallback result in nanoseconds; NaT when it is outside datetime64[ns]
+    if pd.isna(stamp):
+        return _NAT
+    try:
+        return stamp.as_unit('ns').value
+    except (OverflowError, pd.errors.OutOfBoundsDatetime):
+        return _NAT
+
+
+class TimestampParser:
+    """Parse ``updateAt`` strings into UTC timestamps, caching repeated values.
+
+    ``invalid`` counts the rows that could not be parsed, ``hits`` and
+    ``misses`` count distinct strings found in or added to the cache.  The
+    cache is cleared once it holds ``maxsize`` strings.
+    """
+
+    def __init__(self, maxsize=1_000_000):
+        self.maxsize = maxsize
+        self.cache = {}
+        self.invalid = 0
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, values):
+        values = pd.Series(values, copy=False)
+        codes, uniques = pd.factorize(values.astype(object))
+
+        parsed = np.empty(len(uniques), dtype=np.int64)
+        fallback = []
+        for i, value in enumerate(uniques):
+            result = self.cache.get(value)
+            if result is None:
+                self.misses += 1
+                result = _parse_fast(value) if isinstance(value, str) else _NAT
+                if result is _FALLBACK:
+                    fallback.append(i)
+                    continue
+                self._remember(value, result)
+            else:
+                self.hits += 1
+            parsed[i] = result
+
+        if fallback:
+            slow = pd.to_datetime(pd.Series(uniques[fallback]), format=DATE_FORMAT, errors='coerce', utc=True)
+            for i, stamp in zip(fallback, slow):
+                parsed[i] = _nanos(stamp)
+                self._remember(uniques[i], parsed[i])
+
+        # Rows whose updateAt was missing have code -1
+        nanos = np.where(codes >= 0, parsed.take(codes, mode='clip') if len(parsed) else _NAT, _NAT)
+        stamps = pd.Series(nanos.view('datetime64[ns]'), index=values.index, name=values.name).dt.tz_localize('UTC')
+        self.invalid += int(stamps.isna().sum())
+        return stamps
+
+    def _remember(self, value, nanos):
+        if len(self.cache) >= self.maxsize:
+            self.cache.clear()
+        self.cache[value] = nanos
+
+
+# Shared by every call in this process so repeated strings are parsed once
+PARSER = TimestampParser()
+
+
+def parse_update_at(values, parser=None):
+    """Parse a Series of ``updateAt`` strings into ``datetime64[ns, UTC]``."""
+    return (parser or PARSER).parse(values)
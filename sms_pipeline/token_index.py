@@ -0,0 +1,270 @@
+"""Inverted index of message words and senders, for rule-list changes.
+
+Adding a word to ``classify.DEBIT_WORDS`` (or any keyword list) or a bank
+to ``senders.BANK_LIST`` can only change the messages that contain that
+word or whose sender contains that bank name; everything else classifies
+exactly as before.  ``TokenIndex`` maps every word of the texts to the
+input rows it occurs in, and every sender to its rows, so those messages
+are found without scanning the corpus:
+
+* words are the ``\\w+`` runs of the lower-cased text, as the keyword
+  automaton splits it; words with digits (amounts, references) are left
+  out, since no keyword needs them;
+* a keyword is looked up as the rows holding all of its words, a superset
+  of the rows where the phrase occurs (a keyword with only digit words
+  falls back to every row);
+* a bank name is looked up as the rows of every lower-cased sender that
+  contains it.
+
+``rule_sets`` are the current lists and ``rule_versions`` a hash of each;
+``TokenIndex.changed_rows`` diffs two versions of the lists and returns
+the rows to reclassify.  ``incremental.run_incremental`` keeps the index
+and the lists of its last run next to the report and merges the
+reclassified rows into it.
+"""
+
+import hashlib
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from .keywords import _FOLD
+
+# Name of BANK_LIST among the rule lists; the others are KEYWORDS labels
+BANK_RULES = 'bank_list'
+
+# What separates \w+ runs, in RE2 syntax
+_WORD_SPLIT = r'[^\pL\pN_]+'
+_DIGIT = re.compile(r'\d')
+
+
+def rule_sets():
+    """The current keyword and bank lists, by name."""
+    from . import classify, senders
+
+    return {
+        'debit': list(classify.DEBIT_WORDS),
+        'credit': list(classify.CREDIT_WORDS),
+        'spam': list(classify.SPAM_CREDIT_WORDS),
+        'financial_credit': list(classify.FINANCIAL_CREDIT_WORDS),
+        'financial_spam': list(classify.FINANCIAL_SPAM_WORDS),
+        BANK_RULES: list(senders.BANK_LIST),
+    }
+
+
+def rule_versions(rules):
+    """A hash of every list in ``rules``."""
+    return {name: hashlib.sha1(repr(terms).encode('utf-8')).hexdigest() for name, terms in rules.items()}
+
+
+def report_rules(spec):
+    """Names of the rule lists the report described by ``spec`` (a ``REPORTS`` entry) depends on."""
+    names = ['debit', spec['credit']]
+    if spec['drop_spam']:
+        names.append(spec['drop_spam'])
+    if spec['spam']:
+        names.append('spam')
+    if spec['bank']:
+        names.append(BANK_RULES)
+    return names
+
+
+def _normalize(text):
+    return text.translate(_FOLD).lower()
+
+
+def term_words(term):
+    """The indexed words of a keyword; an empty list when it has none."""
+    words = pd.Series([_normalize(term)]).str.findall(r'\w+').iloc[0]
+    return [word for word in words if not _DIGIT.search(word)]
+
+
+def _words_arrow(texts, pa, pc):
+    texts = pa.array(texts, type=pa.large_string())
+    # Arrow-backed string columns convert to one array per chunk
+    if isinstance(texts, pa.ChunkedArray):
+        texts = texts.combine_chunks()
+    # Splitting on whitespace is fast; only the distinct pieces are then
+    # split into their \w+ runs
+    parts = pc.utf8_split_whitespace(texts)
+    rows = pc.list_parent_indices(parts).to_numpy()
+    pieces = pc.dictionary_encode(pc.list_flatten(parts))
+    piece_codes = pieces.indices.to_numpy()
+    split = pc.split_pattern_regex(pieces.dictionary, _WORD_SPLIT)
+    words = pc.dictionary_encode(pc.list_flatten(split))
+    vocabulary = words.dictionary
+    for char, folded in _FOLD.items():
+        vocabulary = pc.replace_substring(vocabulary, chr(char), folded)
+    vocabulary = pc.utf8_lower(vocabulary).to_numpy(zero_copy_only=False)
+
+    # Every piece in the texts stands for its words
+    offsets = split.offsets.to_numpy()
+    counts = np.diff(offsets)[piece_codes]
+    occurrence = np.repeat(np.arange(len(piece_codes)), counts)
+    within = np.arange(len(occurrence)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows[occurrence], words.indices.to_numpy()[offsets[piece_codes][occurrence] + within], vocabulary
+
+
+def _words_pandas(texts):
+    split = texts.map(_normalize).str.findall(r'\w+')
+    words = split.explode()
+    rows = np.repeat(np.arange(len(texts)), split.str.len().to_numpy(dtype=np.int64))
+    codes, vocabulary = pd.factorize(words[words.notna()].to_numpy(dtype=object))
+    return rows, codes, np.asarray(vocabulary, dtype=object)
+
+
+def _words(texts):
+    # Per word: its row position, and a code into the lower-cased words
+    texts = texts.fillna('').astype(str).reset_index(drop=True)
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return _words_pandas(texts)
+    return _words_arrow(texts, pa, pc)
+
+
+class Postings:
+    """Sorted distinct terms and, per term, the sorted rows it occurs in."""
+
+    def __init__(self, terms=None, offsets=None, rows=None):
+        self.terms = np.asarray(terms if terms is not None else [], dtype=str)
+        self.offsets = np.asarray(offsets if offsets is not None else [0], dtype=np.int64)
+        self.rows = np.asarray(rows if rows is not None else [], dtype=np.int64)
+
+    @classmethod
+    def from_pairs(cls, terms, codes, rows):
+        """Postings of the (``terms[codes]``, ``rows``) pairs; ``terms`` may repeat."""
+        terms = np.asarray(terms, dtype=str)
+        if not len(codes):
+            return cls()
+        distinct, inverse = np.unique(terms, return_inverse=True)
+        codes = inverse[codes]
+        span = int(rows.max()) + 1
+        pairs = np.sort(codes.astype(np.int64) * span + rows)
+        pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+        codes, rows = np.divmod(pairs, span)
+        offsets = np.searchsorted(codes, np.arange(len(distinct) + 1))
+        used = np.diff(offsets) > 0
+        return cls(distinct[used], np.concatenate([[0], np.cumsum(np.diff(offsets)[used])]), rows)
+
+    @classmethod
+    def concat(cls, postings, row_maps=None):
+        """One ``Postings`` of all of ``postings``, the rows of each first mapped through its ``row_maps`` entry.
+
+        A map sends old rows to new ones, or to -1 to drop them; None keeps
+        the rows as they are.
+        """
+        row_maps = row_maps or [None] * len(postings)
+        terms, codes, rows = [], [], []
+        start = 0
+        for part, row_map in zip(postings, row_maps):
+            part_codes = np.repeat(np.arange(len(part.terms)), np.diff(part.offsets)) + start
+            part_rows = part.rows if row_map is None else row_map[part.rows]
+            kept = part_rows >= 0
+            terms.append(part.terms)
+            codes.append(part_codes[kept])
+            rows.append(part_rows[kept])
+            start += len(part.terms)
+        if not postings:
+            return cls()
+        return cls.from_pairs(np.concatenate(terms), np.concatenate(codes), np.concatenate(rows))
+
+    def lookup(self, term):
+        """The rows of ``term``."""
+        position = np.searchsorted(self.terms, term)
+        if position < len(self.terms) and self.terms[position] == term:
+            return self.rows[self.offsets[position]:self.offsets[position + 1]]
+        return self.rows[:0]
+
+    def containing(self, text):
+        """The rows of every term with ``text`` in it."""
+        found = np.flatnonzero(np.char.find(self.terms, text) >= 0)
+        return np.unique(np.concatenate([self.rows[:0]] + [self.rows[self.offsets[i]:self.offsets[i + 1]]
+                                                           for i in found]))
+
+
+class TokenIndex:
+    """The word and sender postings of the input rows; see the module docstring."""
+
+    def __init__(self, words=None, senders=None):
+        self.words = words or Postings()
+        self.senders = senders or Postings()
+
+    @classmethod
+    def from_frame(cls, sms_data):
+        """Index the ``text`` and ``senderAddress`` of ``sms_data``, by its index (the input row numbers)."""
+        row_ids = sms_data.index.to_numpy(dtype=np.int64)
+        positions, codes, vocabulary = _words(sms_data['text'])
+        vocabulary = pd.Series(vocabulary, dtype=object)
+        indexed = (vocabulary.ne('') & ~vocabulary.str.contains(_DIGIT)).to_numpy(dtype=bool)[codes]
+        words = Postings.from_pairs(vocabulary, codes[indexed], row_ids[positions[indexed]])
+        senders = sms_data['senderAddress'].fillna('').astype(str).str.lower()
+        sender_codes, sender_names = pd.factorize(senders)
+        return cls(words, Postings.from_pairs(np.asarray(sender_names, dtype=object), sender_codes, row_ids))
+
+    @classmethod
+    def concat(cls, indexes, row_maps=None):
+        """One index of all of ``indexes``; ``row_maps`` as in ``Postings.concat``."""
+        return cls(Postings.concat([index.words for index in indexes], row_maps),
+                   Postings.concat([index.senders for index in indexes], row_maps))
+
+    def keyword_rows(self, term, n_rows):
+        """Rows where ``term`` may occur: those with all its words."""
+        words = term_words(term)
+        if not words:
+            return np.arange(n_rows)
+        rows = self.words.lookup(words[0])
+        for word in words[1:]:
+            rows = np.intersect1d(rows, self.words.lookup(word), assume_unique=True)
+        return rows
+
+    def changed_rows(self, old_rules, new_rules, names, n_rows):
+        """Whether each of the ``n_rows`` indexed rows may classify differently under ``new_rules``.
+
+        Only the lists in ``names`` are compared; a term added to or
+        removed from one of them marks the rows it may occur in.
+        """
+        changed = np.zeros(n_rows, dtype=bool)
+        old_versions, new_versions = rule_versions(old_rules), rule_versions(new_rules)
+        for name in names:
+            if old_versions.get(name) == new_versions.get(name):
+                continue
+            old_terms, new_terms = set(old_rules.get(name, [])), set(new_rules.get(name, []))
+            for term in old_terms ^ new_terms:
+                if name == BANK_RULES:
+                    # The sender check ignores case (see SenderResolver)
+                    changed[self.senders.containing(term.lower())] = True
+                else:
+                    changed[self.keyword_rows(term, n_rows)] = True
+        return changed
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, words=self.words.terms, word_offsets=self.words.offsets, word_rows=self.words.rows,
+                 senders=self.senders.terms, sender_offsets=self.senders.offsets, sender_rows=self.senders.rows)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(Postings(arrays['words'], arrays['word_offsets'], arrays['word_rows']),
+                       Postings(arrays['senders'], arrays['sender_offsets'], arrays['sender_rows']))
+
+
+class IndexBuilder:
+    """Collects the ``TokenIndex`` of the ``selected`` input rows, chunk by chunk."""
+
+    def __init__(self, selected):
+        self.selected = selected
+        self.parts = []
+
+    def add(self, sms_data):
+        sms_data = sms_data[self.selected[sms_data.index]]
+        if len(sms_data):
+            self.parts.append(TokenIndex.from_frame(sms_data))
+
+    def result(self):
+        return TokenIndex.concat(self.parts)
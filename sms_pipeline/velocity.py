@@ -0,0 +1,327 @@
+"""Sliding-window debit velocity per account and per platform.
+
+A burst of debits on one account, or on one merchant across accounts, is
+what a stolen card or a compromised wallet looks like.  For every report
+row, ``velocity_features`` gives the number of debits and their sum that
+the row's account (the ledger account, see ``ledger.ledger_accounts``) and
+its platform (``platform_2`` where the report has it) had in the trailing 10 minutes, hour and day (``WINDOWS``),
+the row itself included: a window ending at ``t`` holds the debits after
+``t - window`` and up to ``t``.  Times are ``updateAt`` (or the report's
+date and time columns), to the second; amounts are summed in paise, so
+every implementation gets the same totals exactly.
+
+``THRESHOLDS`` turn the features into alerts: ``velocity_alert`` is set
+when any feature reaches its threshold, and ``velocity_alert_on`` names
+those features.
+
+There are two ways to compute them:
+
+* ``velocity_features(report)``: a whole report at once.  Rows are sorted
+  once by key and time and every window total is a difference of two
+  prefix sums, the window start found by one vectorised search over the
+  sorted times;
+* ``VelocityTracker``: messages as they arrive.  Every key keeps a queue
+  of its debits in the longest window with one head per window; a message
+  only moves the heads past the debits that have expired, so each costs
+  amortised O(1).  The tracker saves its queues and carries on in the
+  next run (``--incremental``) or batch (``worker --velocity``).  A
+  message older than the latest one of its key is booked at that latest
+  time.  With ``--incremental`` the state also keeps the watermark of the
+  report rows booked (``ledger.ReportWatermark``), so a run books and
+  appends only the rows added to the report since.
+
+    python -m sms_pipeline.velocity updated_dataset_with_platform.csv
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from .ledger import ReportWatermark, ledger_accounts, ledger_times
+
+# Window name and length in seconds, shortest first
+WINDOWS = {'10min': 10 * 60, '1h': 60 * 60, '24h': 24 * 60 * 60}
+KINDS = ['account', 'platform']
+ALERT_COLUMN = 'velocity_alert'
+ALERT_ON_COLUMN = 'velocity_alert_on'
+# Feature value from which a row raises an alert
+THRESHOLDS = {
+    'account_debits_10min': 5,
+    'account_debits_1h': 10,
+    'account_debit_sum_24h': 100_000.0,
+    'platform_debits_10min': 50,
+}
+STATE_VERSION = 1
+
+
+def velocity_path_for(output_path):
+    # Reports.csv -> Reports_velocity.csv
+    base, ext = os.path.splitext(output_path)
+    return f'{base}_velocity{ext or ".csv"}'
+
+
+def velocity_state_path_for(velocity_path):
+    # Reports_velocity.csv -> Reports_velocity_state.npz
+    return f'{os.path.splitext(velocity_path)[0]}_state.npz'
+
+
+def feature_columns(kind, window):
+    return f'{kind}_debits_{window}', f'{kind}_debit_sum_{window}'
+
+
+FEATURE_COLUMNS = [column for kind in KINDS for window in WINDOWS for column in feature_columns(kind, window)]
+
+
+def velocity_events(report):
+    """Per row: its account and platform key (None where there is none), second and debit in paise."""
+    # platform_2 (accounts report) falls back to the sender where the text names no platform
+    platform = report['platform_2' if 'platform_2' in report else 'platform'].astype(object)
+    times = ledger_times(report).to_numpy(dtype='datetime64[s]', na_value=np.datetime64('NaT'))
+    debited = pd.to_numeric(report['debited_amount'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    return {
+        'account': ledger_accounts(report).astype(object).to_numpy(),
+        'platform': platform.where(platform.notna() & (platform != ''), None).to_numpy(),
+        'seconds': times.view(np.int64),
+        'known': ~np.isnat(times),
+        'paise': np.rint(np.clip(debited, 0, None) * 100).astype(np.int64),
+    }
+
+
+def _features_frame(values, index, thresholds):
+    # Counts and paise per (kind, window) as the feature and alert columns
+    features = pd.DataFrame(index=index)
+    for (kind, window), (counts, paise, known) in values.items():
+        count_column, sum_column = feature_columns(kind, window)
+        features[count_column] = pd.Series(counts, index=index, dtype='Int64').where(known)
+        features[sum_column] = pd.Series(paise / 100, index=index).where(known)
+    return add_alerts(features, thresholds)
+
+
+def add_alerts(features, thresholds=None):
+    """``features`` with the ``velocity_alert`` and ``velocity_alert_on`` columns."""
+    thresholds = THRESHOLDS if thresholds is None else thresholds
+    reached = pd.DataFrame({column: (features[column] >= minimum).fillna(False).to_numpy(dtype=bool)
+                            for column, minimum in thresholds.items()}, index=features.index)
+    alert = reached.any(axis=1).to_numpy()
+    names = np.array(list(reached.columns), dtype=object)
+    alert_on = np.full(len(features), '', dtype=object)
+    alert_on[alert] = [' '.join(names[row]) for row in reached.to_numpy()[alert]]
+    features[ALERT_COLUMN] = alert
+    features[ALERT_ON_COLUMN] = alert_on
+    return features
+
+
+def _window_totals(keys, seconds, paise):
+    # Count and paise of the debits of each row's key in every window,
+    # rows with a key and a time only
+    codes, _ = pd.factorize(keys)
+    order = np.lexsort((np.arange(len(codes)), seconds, codes))
+    times = seconds[order] - (seconds.min() if len(seconds) else 0)
+    # One sorted line: keys are further apart than the longest window
+    span = int(times.max() if len(times) else 0) + max(WINDOWS.values()) + 1
+    line = codes[order].astype(np.int64) * span + times
+    debit_counts = np.concatenate([[0], np.cumsum(paise[order] > 0)])
+    debit_paise = np.concatenate([[0], np.cumsum(paise[order])])
+    ends = np.arange(1, len(line) + 1)
+    totals = {}
+    for window, length in WINDOWS.items():
+        starts = np.searchsorted(line, line - length, side='right')
+        counts, sums = np.empty(len(line), dtype=np.int64), np.empty(len(line), dtype=np.int64)
+        counts[order] = debit_counts[ends] - debit_counts[starts]
+        sums[order] = debit_paise[ends] - debit_paise[starts]
+        totals[window] = counts, sums
+    return totals
+
+
+def velocity_features(report, thresholds=None):
+    """The window features and alerts of every report row, indexed like ``report``."""
+    events = velocity_events(report)
+    values = {}
+    for kind in KINDS:
+        known = events['known'] & pd.notna(events[kind])
+        totals = _window_totals(events[kind][known], events['seconds'][known], events['paise'][known])
+        for window, (counts, sums) in totals.items():
+            full_counts, full_sums = np.zeros(len(report), dtype=np.int64), np.zeros(len(report), dtype=np.int64)
+            full_counts[known], full_sums[known] = counts, sums
+            values[kind, window] = full_counts, full_sums, known
+    return _features_frame(values, report.index, thresholds)
+
+
+class _KeyWindows:
+    # The debits of one key in the longest window, and a head per window:
+    # the first debit still inside it
+
+    __slots__ = ('times', 'paise', 'heads', 'counts', 'sums', 'latest')
+
+    def __init__(self, times=(), paise=(), latest=None):
+        self.times, self.paise = list(times), list(paise)
+        self.heads = [0] * len(WINDOWS)
+        self.counts = [len(self.times)] * len(WINDOWS)
+        self.sums = [sum(self.paise)] * len(WINDOWS)
+        self.latest = latest
+
+    def add(self, second, paise, lengths):
+        """Book one message; ``counts`` and ``sums`` are then its windows."""
+        if self.latest is not None and second < self.latest:
+            second = self.latest
+        self.latest = second
+        times, amounts, heads, counts, sums = self.times, self.paise, self.heads, self.counts, self.sums
+        if paise > 0:
+            times.append(second)
+            amounts.append(paise)
+            for i in range(len(counts)):
+                counts[i] += 1
+                sums[i] += paise
+        end = len(times)
+        for i, length in enumerate(lengths):
+            head, cutoff = heads[i], second - length
+            while head < end and times[head] <= cutoff:
+                counts[i] -= 1
+                sums[i] -= amounts[head]
+                head += 1
+            heads[i] = head
+        # Drop what even the longest window has passed, once it is half the queue
+        oldest = heads[-1]
+        if oldest > 64 and 2 * oldest > end:
+            del times[:oldest], amounts[:oldest]
+            self.heads = [head - oldest for head in heads]
+
+    def retained(self):
+        oldest = self.heads[-1]
+        return self.times[oldest:], self.paise[oldest:]
+
+
+class VelocityTracker:
+    """Window features of messages as they arrive; see the module docstring."""
+
+    def __init__(self, thresholds=None):
+        self.thresholds = thresholds
+        self.keys = {kind: {} for kind in KINDS}
+        # How much of the report run_velocity has booked
+        self.watermark = ReportWatermark()
+
+    def update(self, report):
+        """Book the rows of ``report`` (in time order) and return their features, like ``velocity_features``."""
+        events = velocity_events(report)
+        order = np.lexsort((np.arange(len(report)), events['seconds']))
+        lengths = list(WINDOWS.values())
+        seconds, paise = events['seconds'].tolist(), events['paise'].tolist()
+        values = {}
+        for kind in KINDS:
+            windows = self.keys[kind]
+            keys = events[kind].tolist()
+            known = events['known'] & pd.notna(events[kind])
+            rows = order[known[order]].tolist()
+            found = []
+            for row in rows:
+                entry = windows.get(keys[row])
+                if entry is None:
+                    entry = windows[keys[row]] = _KeyWindows()
+                entry.add(seconds[row], paise[row], lengths)
+                found.append(entry.counts + entry.sums)
+            found = np.array(found, dtype=np.int64).reshape(len(rows), 2 * len(WINDOWS))
+            for i, window in enumerate(WINDOWS):
+                counts, sums = np.zeros(len(report), dtype=np.int64), np.zeros(len(report), dtype=np.int64)
+                counts[rows], sums[rows] = found[:, i], found[:, len(WINDOWS) + i]
+                values[kind, window] = counts, sums, known
+        return _features_frame(values, report.index, self.thresholds)
+
+    def save(self, path):
+        arrays = {'version': STATE_VERSION, 'windows': np.array(list(WINDOWS.values())), **self.watermark.to_arrays()}
+        for kind, windows in self.keys.items():
+            retained = [entry.retained() for entry in windows.values()]
+            arrays[f'{kind}_keys'] = np.array(list(windows), dtype=str)
+            arrays[f'{kind}_latest'] = np.array([entry.latest for entry in windows.values()], dtype=np.int64)
+            arrays[f'{kind}_offsets'] = np.concatenate([[0], np.cumsum([len(times) for times, _ in retained])])
+            arrays[f'{kind}_times'] = np.array([t for times, _ in retained for t in times], dtype=np.int64)
+            arrays[f'{kind}_paise'] = np.array([p for _, paise in retained for p in paise], dtype=np.int64)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, thresholds=None):
+        """The tracker saved at ``path``, or an empty one if there is none."""
+        tracker = cls(thresholds)
+        if not os.path.exists(path):
+            return tracker
+        with np.load(path) as arrays:
+            if int(arrays['version']) != STATE_VERSION or arrays['windows'].tolist() != list(WINDOWS.values()):
+                raise ValueError(f'{path} was saved with other windows; start again without it')
+            tracker.watermark = ReportWatermark.from_arrays(arrays)
+            for kind in KINDS:
+                offsets = arrays[f'{kind}_offsets']
+                times, paise = arrays[f'{kind}_times'].tolist(), arrays[f'{kind}_paise'].tolist()
+                tracker.keys[kind] = {
+                    key: _KeyWindows(times[start:end], paise[start:end], latest)
+                    for key, latest, start, end in zip(arrays[f'{kind}_keys'].tolist(),
+                                                       arrays[f'{kind}_latest'].tolist(), offsets[:-1], offsets[1:])
+                }
+        return tracker
+
+
+def run_velocity(report_path, velocity_path=None, incremental=False, thresholds=None):
+    """Write the report CSV at ``report_path`` with its velocity columns; returns a summary.
+
+    With ``incremental``, only the report rows after the watermark saved
+    by the previous incremental run (next to the output) are booked: the
+    windows start from the saved tracker state, the new rows are appended
+    to the output, and the state is saved again.  A report that no longer
+    starts with the booked rows is done again from the start.
+    """
+    velocity_path = velocity_path or velocity_path_for(report_path)
+    if not incremental:
+        report = pd.read_csv(report_path, dtype=str)
+        features = velocity_features(report, thresholds)
+        report.join(features).to_csv(velocity_path, index=False)
+        return {'rows': len(report), 'alerts': int(features[ALERT_COLUMN].sum())}
+
+    state_path = velocity_state_path_for(velocity_path)
+    tracker = VelocityTracker.load(state_path, thresholds) if os.path.exists(velocity_path) else None
+    new = tracker.watermark.read_new(report_path) if tracker is not None and tracker.watermark.offset else None
+    if new is None:
+        # Nothing booked yet, or the booked rows changed: start again
+        tracker = VelocityTracker(thresholds)
+        new = tracker.watermark.read_new(report_path)
+    append = tracker.watermark.offset > 0
+    report, tracker.watermark = new
+    features = tracker.update(report)
+    tracker.save(state_path)
+    report.join(features).to_csv(velocity_path, index=False, mode='a' if append else 'w', header=not append)
+    return {'rows': len(report), 'alerts': int(features[ALERT_COLUMN].sum())}
+
+
+def parse_thresholds(values):
+    """``THRESHOLDS`` with the ``COLUMN=VALUE`` overrides in ``values``."""
+    thresholds = dict(THRESHOLDS)
+    for value in values or []:
+        column, _, minimum = value.partition('=')
+        if column not in FEATURE_COLUMNS:
+            raise ValueError(f'unknown velocity feature {column!r}; expected one of {", ".join(FEATURE_COLUMNS)}')
+        thresholds[column] = float(minimum)
+    return thresholds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sms_pipeline.velocity',
+                                     description='Add debit velocity windows and burst alerts to a report CSV.')
+    parser.add_argument('report', help='report CSV with debited_amount (e.g. updated_dataset_with_platform.csv)')
+    parser.add_argument('-o', '--output', help='CSV to write (default: <report>_velocity.csv)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='continue the windows of the previous incremental run and append to the output')
+    parser.add_argument('--threshold', action='append', metavar='FEATURE=VALUE',
+                        help='alert when FEATURE reaches VALUE (repeatable; e.g. account_debits_10min=3)')
+    args = parser.parse_args(argv)
+    try:
+        thresholds = parse_thresholds(args.threshold)
+    except ValueError as error:
+        parser.error(str(error))
+    summary = run_velocity(args.report, args.output, args.incremental, thresholds)
+    print(f"Velocity of {summary['rows']} rows saved to {args.output or velocity_path_for(args.report)}; "
+          f"{summary['alerts']} rows raise an alert")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+"""Resident classification worker: SMS in, enriched records out, as they arrive.
+
+``python -m sms_pipeline.worker`` reads one JSON object per line (the
+columns of the SMS export: ``text``, ``senderAddress``, ``updateAt``, and
+anything else, which is passed through) from stdin, or from every client of
+a Unix socket with ``--socket``.  It writes one JSON line per message, in
+the order received: the message with the columns of the report (``-r``),
+plus ``in_report``, whether the report's filters keep it.  A line that is
+not a JSON object gets ``{"error": ...}`` instead.
+
+The rules are compiled and the pipeline built once, at start-up.  Messages
+are classified in micro-batches: a batch is run as soon as it has
+``--max-batch`` messages or its first message has waited ``--max-latency-ms``,
+so a trickle of messages is answered quickly and a burst is classified
+with whole-column operations.  At most ``--max-pending`` messages wait at a
+time; readers stop reading until there is room again.  Latency percentiles
+and throughput go to ``<stats>.metrics.json`` and ``<stats>.prom`` every
+``--stats-interval`` seconds, with the per-step metrics of the batches.
+With ``--velocity``, messages in the report also get the debit velocity
+windows and burst alerts of ``velocity.VelocityTracker``, counted over
+every message the worker has seen (and the ones before, with
+``--velocity-state``).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .metrics import RunMetrics, metrics_paths
+from .pipeline import build_pipeline
+from .stages import REPORTS, drop_incomplete, keep_credits, keep_legitimate_credits, report_columns, report_stages
+from .templates import CACHE as TEMPLATE_CACHE
+from .velocity import ALERT_COLUMN, ALERT_ON_COLUMN, VelocityTracker
+
+# Columns every message is given, missing if the record has none
+INPUT_COLUMNS = ['senderAddress', 'text', 'updateAt']
+# Stages that drop rows; the worker reports them as in_report instead
+FILTER_STAGES = (drop_incomplete, keep_credits, keep_legitimate_credits)
+
+DEFAULT_REPORT = 'accounts'
+DEFAULT_MAX_BATCH = 512
+DEFAULT_MAX_LATENCY_MS = 10.0
+DEFAULT_MAX_PENDING = 10_000
+DEFAULT_STATS_INTERVAL = 10.0
+STATS_ROOT = 'sms_worker'
+
+# Latencies kept for the percentiles
+LATENCY_WINDOW = 100_000
+# Longest input line accepted on the socket
+LINE_LIMIT = 1 << 20
+
+
+def enrich(sms_data, report=DEFAULT_REPORT, templates=False, metrics=None, spam_model=None, amount_details=False):
+    """Classify every row of ``sms_data`` as ``report`` does, without dropping any.
+
+    Returns the report columns plus ``in_report``, whether the report's
+    filters keep the row.
+    """
+    key = f'classified:{report}'
+    classified = build_pipeline((report,), templates, spam_model, amount_details).run(
+        [key], {'sms': sms_data}, metrics)[key]
+    kept = classified
+    for _, stage in report_stages(report):
+        if stage in FILTER_STAGES:
+            kept = stage(kept)
+        elif metrics is None:
+            classified = stage(classified)
+        else:
+            classified = metrics.run_stage(stage, classified)
+    enriched = report_columns(classified).copy()
+    enriched['in_report'] = enriched.index.isin(kept.index)
+    return enriched
+
+
+def add_velocity(enriched, tracker):
+    """``enriched`` with the velocity columns of its rows in the report, booked in ``tracker``."""
+    enriched = enriched.join(tracker.update(enriched[enriched['in_report']]))
+    enriched[ALERT_COLUMN] = enriched[ALERT_COLUMN].astype('boolean').fillna(False).astype(bool)
+    enriched[ALERT_ON_COLUMN] = enriched[ALERT_ON_COLUMN].fillna('')
+    return enriched
+
+
+def records_frame(records):
+    """The JSON ``records`` (dicts) as an SMS frame: text columns, input order."""
+    sms_data = pd.DataFrame.from_records(records)
+    for column in INPUT_COLUMNS:
+        if column not in sms_data:
+            sms_data[column] = None
+    for column in sms_data.columns:
+        sms_data[column] = sms_data[column].astype(object).map(str, na_action='ignore')
+    return sms_data
+
+
+def to_json_lines(enriched):
+    """One JSON line (bytes, newline included) per row of ``enriched``."""
+    enriched = enriched.copy(deep=False)
+    if 'time' in enriched:
+        enriched['time'] = enriched['time'].astype(object).map(str, na_action='ignore')
+    if not len(enriched):
+        return []
+    # Newlines inside values are escaped; other line breaks (U+2028, ...)
+    # are not, so split on newlines only
+    text = enriched.to_json(orient='records', lines=True, force_ascii=False, date_format='iso')
+    return [line.encode('utf-8') + b'\n' for line in text.rstrip('\n').split('\n')]
+
+
+def error_line(message):
+    return json.dumps({'error': message}).encode('utf-8') + b'\n'
+
+
+class LatencyStats:
+    """Message counts, batch sizes and recent per-message latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.messages = 0
+        self.batches = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def add_batch(self, latencies):
+        self.latencies.extend(latencies)
+        self.messages += len(latencies)
+        self.batches += 1
+
+    def summary(self, pending=0):
+        elapsed = time.perf_counter() - self.started
+        p50, p99 = np.percentile(self.latencies, [50, 99]) * 1000 if self.latencies else (0.0, 0.0)
+        return {
+            'messages': self.messages,
+            'batches': self.batches,
+            'errors': self.errors,
+            'pending': pending,
+            'mean_batch_size': round(self.messages / self.batches, 2) if self.batches else 0.0,
+            'latency_p50_ms': round(float(p50), 3),
+            'latency_p99_ms': round(float(p99), 3),
+            'messages_per_second': round(self.messages / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+class MicroBatcher:
+    """Collect submitted records into batches and classify them off the event loop.
+
+    ``submit`` waits while ``max_pending`` records are queued (backpressure)
+    and returns a future of the record's output line.
+    """
+
+    def __init__(self, report=DEFAULT_REPORT, templates=False, max_batch=DEFAULT_MAX_BATCH,
+                 max_latency=DEFAULT_MAX_LATENCY_MS / 1000, max_pending=DEFAULT_MAX_PENDING, metrics=None,
+                 spam_model=None, velocity=None, amount_details=False):
+        self.report = report
+        self.templates = templates
+        self.spam_model = spam_model
+        self.amount_details = amount_details
+        self.velocity = velocity
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.metrics = metrics
+        self.stats = LatencyStats()
+        # One thread: batches run one at a time, in order, while the loop keeps reading
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, record):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((time.perf_counter(), record, future))
+        return future
+
+    async def _next_batch(self):
+        first = await self.queue.get()
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.max_latency - (time.perf_counter() - first[0])
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except TimeoutError:
+                break
+        return batch
+
+    def _process(self, records):
+        sms_data = records_frame(records)
+        enriched = enrich(sms_data, self.report, self.templates, self.metrics, self.spam_model, self.amount_details)
+        if self.velocity is not None:
+            enriched = add_velocity(enriched, self.velocity)
+        return to_json_lines(enriched)
+
+    async def run(self):
+        """Classify batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            try:
+                lines = await loop.run_in_executor(self.executor, self._process, [record for _, record, _ in batch])
+            except Exception as error:  # noqa: BLE001 - one bad batch must not stop the worker
+                lines = [error_line(f'{type(error).__name__}: {error}')] * len(batch)
+                self.stats.errors += len(batch)
+            done = time.perf_counter()
+            for (_, _, future), line in zip(batch, lines):
+                if not future.done():
+                    future.set_result(line)
+            self.stats.add_batch([done - submitted for submitted, _, _ in batch])
+
+    def summary(self):
+        return self.stats.summary(self.queue.qsize())
+
+
+async def _serve_lines(lines, write, batcher, max_pending=DEFAULT_MAX_PENDING):
+    # Submit every input line and write the outputs in input order; at most
+    # max_pending outputs wait to be written, so a slow reader of the
+    # output also holds back the input
+    outputs = asyncio.Queue(maxsize=max_pending)
+
+    async def writer():
+        while True:
+            future = await outputs.get()
+            if future is None:
+                return
+            await write(await future)
+
+    writing = asyncio.create_task(writer())
+    try:
+        async for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                record = error
+            if isinstance(record, dict):
+                future = await batcher.submit(record)
+            else:
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(error_line(f'expected a JSON object, got {str(record) or type(record).__name__}'))
+                batcher.stats.errors += 1
+            await outputs.put(future)
+        await outputs.put(None)
+        await writing
+    finally:
+        writing.cancel()
+
+
+async def _stdin_lines(stream, size=1 << 16):
+    # Regular files cannot be watched by the event loop, so stdin is read
+    # in a thread, a block at a time
+    loop = asyncio.get_running_loop()
+    pending = b''
+    while True:
+        block = await loop.run_in_executor(None, stream.read1, size)
+        if not block:
+            break
+        *lines, pending = (pending + block).split(b'\n')
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def _stream_lines(reader):
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        yield line
+
+
+def write_stats(batcher, path):
+    """Write the batcher's metrics and latency summary next to ``path``."""
+    json_path, prometheus_path = metrics_paths(path)
+    batcher.metrics.summary.update(batcher.summary())
+    batcher.metrics.write_json(json_path)
+    batcher.metrics.write_prometheus(prometheus_path)
+
+
+async def _publish_stats(batcher, path, interval):
+    # On the batch thread, between batches, which update the step metrics
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        await loop.run_in_executor(batcher.executor, write_stats, batcher, path)
+
+
+async def serve(batcher, socket_path=None, stats_path=None, stats_interval=DEFAULT_STATS_INTERVAL,
+                input_stream=None, output_stream=None):
+    """Serve stdin (or every connection to ``socket_path``) until the input ends or the worker is stopped."""
+    running = asyncio.create_task(batcher.run())
+    publishing = None
+    if stats_path is not None and batcher.metrics is not None:
+        publishing = asyncio.create_task(_publish_stats(batcher, stats_path, stats_interval))
+    try:
+        if socket_path is None:
+            input_stream = input_stream or sys.stdin.buffer
+            output_stream = output_stream or sys.stdout.buffer
+
+            async def write(line):
+                output_stream.write(line)
+                if batcher.queue.empty():
+                    output_stream.flush()
+
+            await _serve_lines(_stdin_lines(input_stream), write, batcher, batcher.queue.maxsize)
+            output_stream.flush()
+        else:
+            async def handle(reader, writer):
+                async def write(line):
+                    writer.write(line)
+                    await writer.drain()
+
+                try:
+                    await _serve_lines(_stream_lines(reader), write, batcher, batcher.queue.maxsize)
+                except (ConnectionError, ValueError):  # Client gone, or a line over LINE_LIMIT
+                    pass
+                finally:
+                    writer.close()
+
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(handle, socket_path, limit=LINE_LIMIT)
+            async with server:
+                await server.serve_forever()
+    finally:
+        running.cancel()
+        if publishing is not None:
+            publishing.cancel()
+        batcher.executor.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sms_pipeline.worker',
+                                     description='Classify SMS (JSON lines) as they arrive.')
+    parser.add_argument('--socket', metavar='PATH', help='listen on this Unix socket instead of reading stdin')
+    parser.add_argument('-r', '--report', choices=sorted(REPORTS), default=DEFAULT_REPORT,
+                        help='report whose columns and filters to apply (default: %(default)s)')
+    parser.add_argument('--templates', action='store_true', help='classify through the template cache')
+    parser.add_argument('--template-cache', metavar='PATH',
+                        help='start from the template cache saved at PATH (implies --templates)')
+    parser.add_argument('--spam-model', metavar='PATH',
+                        help='decide final_credit from the spam model saved at PATH instead of the spam keywords')
+    parser.add_argument('--amount-details', action='store_true',
+                        help='read the amounts and quoted balances with sms_pipeline.amounts')
+    parser.add_argument('--velocity', action='store_true',
+                        help='add debit counts and sums per account and platform over the last 10 minutes, '
+                             'hour and day, and burst alerts (see sms_pipeline.velocity)')
+    parser.add_argument('--velocity-state', metavar='PATH',
+                        help='start the velocity windows from the state saved at PATH and save them back on exit '
+                             '(implies --velocity)')
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH,
+                        help='most messages classified together (default: %(default)s)')
+    parser.add_argument('--max-latency-ms', type=float, default=DEFAULT_MAX_LATENCY_MS,
+                        help='longest a message waits for its batch to fill (default: %(default)s)')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help='messages queued before reading stops (default: %(default)s)')
+    parser.add_argument('--stats', metavar='ROOT', default=STATS_ROOT,
+                        help='write ROOT.metrics.json and ROOT.prom with latency and throughput '
+                             '(default: %(default)s)')
+    parser.add_argument('--stats-interval', type=float, default=DEFAULT_STATS_INTERVAL,
+                        help='seconds between stats writes (default: %(default)s)')
+    args = parser.parse_args(argv)
+    if args.max_batch < 1 or args.max_pending < 1:
+        parser.error('--max-batch and --max-pending must be at least 1')
+
+    templates = args.templates or bool(args.template_cache)
+    if args.template_cache:
+        TEMPLATE_CACHE.update_from(args.template_cache)
+    metrics = RunMetrics(f'worker:{args.report}')
+    velocity = None
+    if args.velocity or args.velocity_state:
+        velocity = VelocityTracker.load(args.velocity_state) if args.velocity_state else VelocityTracker()
+    batcher = MicroBatcher(args.report, templates, args.max_batch, args.max_latency_ms / 1000, args.max_pending,
+                           metrics, args.spam_model, velocity, args.amount_details)
+    # Build the pipeline, load the spam model and compile every rule before the first message
+    enrich(records_frame([{'text': '', 'senderAddress': '', 'updateAt': ''}]), args.report, templates,
+           spam_model=args.spam_model, amount_details=args.amount_details)
+    try:
+        asyncio.run(serve(batcher, args.socket, args.stats + '.json', args.stats_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        write_stats(batcher, args.stats + '.json')
+        if args.velocity_state:
+            velocity.save(args.velocity_state)
+        summary = batcher.summary()
+        print(f"{summary['messages']} messages in {summary['batches']} batches, "
+              f"p50 {summary['latency_p50_ms']} ms, p99 {summary['latency_p99_ms']} ms, "
+              f"{summary['messages_per_second']} messages/s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from sms_pipeline.synthetic import write_synthetic
+
+# A small accounts report: id, senderAddress, text, debited, credited, time
+REPORT_ROWS = [
+    ('u1', 'VM-HDFCBK', 'Rs.500.00 debited from a/c XX1234 to VPA swiggy@icici. Avl Bal Rs 9500.00', 500.0, None,
+     '10:00:00'),
+    ('u1', 'VM-HDFCBK', 'Rs.200.00 debited from a/c XX1234 to VPA zomato@icici. Avl Bal Rs 9300.00', 200.0, None,
+     '10:02:00'),
+    ('u1', 'VM-HDFCBK', 'Rs.1000.00 credited to a/c XX1234 by NEFT. Avl Bal Rs 10300.00', None, 1000.0, '10:05:00'),
+    ('u2', 'AD-SBIUPI', 'Rs15.0 debited@SBI UPI frm A/cX6618 to Swiggy', 15.0, None, '11:00:00'),
+    ('u2', 'AD-SBIUPI', 'Rs25.0 debited@SBI UPI frm A/cX6618 to Swiggy', 25.0, None, '11:03:00'),
+]
+
+
+def _write_report(path, rows, append=False):
+    pd.DataFrame({
+        'id': [row[0] for row in rows],
+        'senderAddress': [row[1] for row in rows],
+        'text': [row[2] for row in rows],
+        'platform_2': 'Swiggy',
+        'debited_amount': [row[3] for row in rows],
+        'credited_amount': [row[4] for row in rows],
+        'day': 15, 'month': 3, 'year': 2022,
+        'time': [row[5] for row in rows],
+    }).to_csv(path, index=False, mode='a' if append else 'w', header=not append)
+
+
+@pytest.fixture
+def report_rows():
+    return list(REPORT_ROWS)
+
+
+@pytest.fixture
+def write_report():
+    """``write_report(path, rows, append=False)`` writes report rows as a report CSV."""
+    return _write_report
+
+
+@pytest.fixture(scope='session')
+def synthetic_csv(tmp_path_factory):
+    """A 3000-row synthetic SMS export (every template), written once per session."""
+    return str(write_synthetic(tmp_path_factory.mktemp('input') / 'SMS-Data.csv', 3000, seed=11))
@@ -0,0 +1,33 @@
+import pandas as pd
+
+from sms_pipeline.amounts import amount_details
+from sms_pipeline.pipeline import process_frame
+
+
+def test_trailing_cr_marks_a_balance_not_crores():
+    details = amount_details(pd.Series(['Rs 500.00 debited from A/c XX1234. Total Bal:Rs.3353.33CR']))
+    assert details.loc[0, 'transaction_amount'] == 500.0
+    assert details.loc[0, 'available_balance'] == 3353.33
+    assert details.loc[0, 'transaction_amount_count'] == 1
+
+
+def test_spaced_cr_is_crore_unless_it_follows_a_balance():
+    details = amount_details(pd.Series(['Rs 5 Cr loan offer for you', 'Avl Bal Rs 500.00 Cr', 'Bal Rs 1,200.50 Dr']))
+    assert details['transaction_amount'].tolist()[0] == 50_000_000.0
+    assert pd.isna(details.loc[0, 'available_balance'])
+    assert details['available_balance'].tolist()[1:] == [500.0, -1200.5]
+
+
+def test_amount_details_drive_the_report_amounts():
+    sms_data = pd.DataFrame({
+        'id': 'user-1',
+        'phoneNumber': 'xx74031530',
+        'senderAddress': 'VM-HDFCBK',
+        'text': ['Avl Bal Rs 5,000.00. Rs. 1,23,456.78 debited from a/c XX1234 on 15-03-22'],
+        'updateAt': 'Tue, 15 Mar 2022 10:00:00 GMT',
+    })
+    # The notebook rule takes the balance in front for the transaction
+    assert process_frame(sms_data.copy(), 'accounts')['debited_amount'].tolist() == [5000.0]
+    report = process_frame(sms_data.copy(), 'accounts', amount_details=True)
+    assert report['debited_amount'].tolist() == [123456.78]
+    assert report['available_balance'].tolist() == [5000.0]
@@ -0,0 +1,9 @@
+from sms_pipeline.classify import verify_parity
+from sms_pipeline.synthetic import iter_synthetic
+
+
+def test_batch_classifier_matches_per_row_on_synthetic_export():
+    # Every template of the synthetic export, with its random amounts and names
+    for sms_data in iter_synthetic(5000, seed=7):
+        mismatches = verify_parity(sms_data['text'])
+        assert mismatches.empty, mismatches.head()
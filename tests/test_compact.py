@@ -0,0 +1,25 @@
+from sms_pipeline.compact import compact_report, expand_frame, load_report, report_memory
+from sms_pipeline.pipeline import process_frame
+from sms_pipeline.stages import REPORTS, report_columns
+from sms_pipeline.streaming import run_reports
+from sms_pipeline.synthetic import generate_sms
+
+
+def test_compact_frame_writes_the_same_report_in_less_memory():
+    report = process_frame(generate_sms(3000, seed=13), 'accounts')
+    compact = compact_report(report)
+    assert report_memory(compact) < report_memory(report)
+    assert report_columns(expand_frame(compact)).to_csv(index=False) == report_columns(report).to_csv(index=False)
+
+
+def test_compact_runs_and_loads_round_trip_the_report_csv(tmp_path, synthetic_csv):
+    plain = {report: str(tmp_path / f'{report}.csv') for report in REPORTS}
+    compact = {report: str(tmp_path / f'{report}_compact.csv') for report in REPORTS}
+    run_reports(synthetic_csv, plain, chunksize=1000)
+    run_reports(synthetic_csv, compact, chunksize=1000, compact=True)
+    for report, path in plain.items():
+        written = open(path, 'rb').read()
+        assert open(compact[report], 'rb').read() == written, report
+        # Read back compacted in chunks, and written out again
+        loaded = expand_frame(load_report(path, chunksize=700))
+        assert loaded.to_csv(index=False, lineterminator='\n').encode() == written, report
@@ -0,0 +1,48 @@
+import pandas as pd
+
+from sms_pipeline.dedup import find_duplicates
+from sms_pipeline.pipeline import process_frame
+
+
+def _report(senders, texts, times):
+    # Through the stages, so the blocks see the real transaction types and amounts
+    sms_data = pd.DataFrame({
+        'id': 'user-1',
+        'phoneNumber': 'xx74031530',
+        'senderAddress': senders,
+        'text': texts,
+        'updateAt': [f'Tue, 15 Mar 2022 {time} GMT' for time in times],
+    })
+    return process_frame(sms_data, 'accounts')
+
+
+def test_shared_reference_groups_messages_across_senders():
+    report = _report(['VM-SWIGGY', 'VM-PAYTM', 'VM-HDFCBK', 'VM-HDFCBK'], [
+        'Payment of Rs 250 received for your Swiggy order #78123. Ref 406112345678. Enjoy your meal!',
+        'You paid Rs 250 to Swiggy using Paytm UPI. UPI Ref No: 406112345678',
+        'Rs.250.00 debited from a/c XX1234 on 15-03-22 to VPA swiggy@icici UPI Ref 406112345678',
+        'Rs.250.00 debited from a/c XX1234 on 15-03-22 to VPA zomato@icici UPI Ref 406119999999',
+    ], ['10:20:05', '10:20:30', '10:21:10', '10:24:00'])
+    # The merchant's side is a credit, the others debits
+    assert report['transaction_type'].tolist() == ['Credited', 'Paid/Debited', 'Paid/Debited', 'Paid/Debited']
+    groups = find_duplicates(report)
+    # The bank's message is the canonical one; a payment with its own reference stays apart
+    assert groups['transaction_group_id'].tolist() == [2, 2, 2, 3]
+    assert groups['canonical'].tolist() == [False, False, True, True]
+
+
+def test_user_side_is_canonical_without_a_bank_message():
+    report = _report(['VM-SWIGGY', 'VM-PAYTM'], [
+        'Payment of Rs 250 received for your Swiggy order #78123. Ref 406112345678. Enjoy your meal!',
+        'You paid Rs 250 to Swiggy using Paytm UPI. UPI Ref No: 406112345678',
+    ], ['10:20:05', '10:20:30'])
+    assert find_duplicates(report)['transaction_group_id'].tolist() == [1, 1]
+
+
+def test_helpline_number_is_not_a_reference():
+    template = 'Rs.250.00 paid thru A/C XX6534, UPI Ref {}. If not done, SMS BLOCKUPI to 9901771222.-Canara Bank'
+    report = _report(['JD-CANBNK'] * 3,
+                     [template.format(207728087062), template.format(206981527213), template.format(211654121651)],
+                     ['10:20:05', '10:25:00', '18:00:00'])
+    assert report['amount'].tolist() == [250.0] * 3
+    assert find_duplicates(report)['canonical'].all()
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from sms_pipeline.incremental import run_incremental
+
+
+def _incremental(input_path, output_path, **options):
+    return run_incremental(str(input_path), str(output_path), 'accounts', chunksize=700, **options)
+
+
+def test_appended_rows_match_a_full_rebuild(tmp_path, synthetic_csv):
+    sms_data = pd.read_csv(synthetic_csv, dtype=str)
+    input_path, output_path, rebuilt = tmp_path / 'input.csv', tmp_path / 'report.csv', tmp_path / 'rebuilt.csv'
+    sms_data.iloc[:2000].to_csv(input_path, index=False)
+    assert _incremental(input_path, output_path)['mode'] == 'rebuild'
+    sms_data.to_csv(input_path, index=False)
+    summary = _incremental(input_path, output_path)
+    assert (summary['mode'], summary['new_rows']) == ('append', 1000)
+    _incremental(input_path, rebuilt, full_rebuild=True)
+    assert output_path.read_bytes() == rebuilt.read_bytes()
+
+    # Nothing new: nothing processed, the report is unchanged
+    assert _incremental(input_path, output_path)['new_rows'] == 0
+    assert output_path.read_bytes() == rebuilt.read_bytes()
+
+
+def test_late_and_edited_rows_are_merged_in_input_order(tmp_path, synthetic_csv):
+    sms_data = pd.read_csv(synthetic_csv, dtype=str)
+    input_path, output_path, rebuilt = tmp_path / 'input.csv', tmp_path / 'report.csv', tmp_path / 'rebuilt.csv'
+    sms_data.drop(index=range(500, 800)).to_csv(input_path, index=False)
+    _incremental(input_path, output_path)
+    # The missing rows arrive late, and one booked message is edited
+    sms_data.loc[100, 'text'] = 'Rs.999.00 debited from a/c XX1234 to VPA swiggy@icici UPI Ref 406112345678'
+    sms_data.to_csv(input_path, index=False)
+    summary = _incremental(input_path, output_path)
+    assert (summary['mode'], summary['new_rows']) == ('merge', 301)
+    _incremental(input_path, rebuilt, full_rebuild=True)
+    assert output_path.read_bytes() == rebuilt.read_bytes()
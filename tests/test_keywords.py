@@ -0,0 +1,33 @@
+import re
+
+from sms_pipeline.classify import KEYWORD_PATTERNS, KEYWORDS
+from sms_pipeline.keywords import KeywordAutomaton
+from sms_pipeline.synthetic import generate_sms
+
+# Phrases split by two spaces or punctuation, words inside longer words,
+# overlapping phrases and the characters IGNORECASE folds to i and s
+EDGE_CASES = [
+    'Your loan approved!', 'loan  approved', 'loan-approved', 'LOAN APPROVED', 'preapproved loan',
+    'payment received via UPI', 'paymentreceived', 'Payment Received.', 'cash reward points redeemed',
+    'GİFT voucher', 'ſpent Rs 20', 'win-win', 'interest earned: Rs 4', 'free gift inside', 'unsecured  loan',
+    '', '   ', 'EMI_paid', 'credited\ndebited',
+]
+
+
+def _regex_mask(text):
+    found = 0
+    for label, pattern in KEYWORD_PATTERNS.items():
+        if re.search(pattern, text, re.IGNORECASE):
+            found |= KEYWORDS.bits[label]
+    return found
+
+
+def test_automaton_matches_the_keyword_regexes():
+    texts = EDGE_CASES + generate_sms(2000, seed=3)['text'].tolist()
+    assert [KEYWORDS.scan(text) for text in texts] == [_regex_mask(text) for text in texts]
+
+
+def test_overlapping_keywords_of_several_vocabularies_are_all_found():
+    automaton = KeywordAutomaton({'long': ['cash reward points'], 'short': ['reward points'], 'word': ['points']})
+    assert automaton.scan('Your cash reward points expire') == automaton.mask('long', 'short', 'word')
+    assert automaton.scan('cash reward  points') == automaton.mask('word')
@@ -0,0 +1,56 @@
+import pandas as pd
+
+from sms_pipeline.ledger import run_ledger
+
+
+def test_incremental_ledger_books_every_report_row_once(tmp_path, report_rows, write_report):
+    report_path, ledger_path = tmp_path / 'report.csv', tmp_path / 'ledger.csv'
+    write_report(report_path, report_rows[:3])
+    assert run_ledger(str(report_path), str(ledger_path), incremental=True)['rows'] == 3
+    first = ledger_path.read_bytes()
+    # Nothing new in the report: nothing booked, the ledger is unchanged
+    assert run_ledger(str(report_path), str(ledger_path), incremental=True)['rows'] == 0
+    assert ledger_path.read_bytes() == first
+
+    write_report(report_path, report_rows[3:], append=True)
+    assert run_ledger(str(report_path), str(ledger_path), incremental=True)['rows'] == 2
+    ledger = pd.read_csv(ledger_path)
+    assert len(ledger) == 5
+    last = ledger.drop_duplicates('ledger_account', keep='last').set_index('ledger_account')
+    assert last['cumulative_debit'].to_dict() == {'u1/VM-HDFCBK': 700.0, 'u2/AD-SBIUPI': 40.0}
+    assert last.loc['u1/VM-HDFCBK', 'cumulative_credit'] == 1000.0
+
+
+def test_incremental_ledger_rebuilds_a_rewritten_report(tmp_path, report_rows, write_report):
+    report_path, ledger_path = tmp_path / 'report.csv', tmp_path / 'ledger.csv'
+    write_report(report_path, report_rows)
+    run_ledger(str(report_path), str(ledger_path), incremental=True)
+    write_report(report_path, report_rows[1:])
+    assert run_ledger(str(report_path), str(ledger_path), incremental=True)['rows'] == 4
+    assert len(pd.read_csv(ledger_path)) == 4
+
+
+def test_incremental_ledger_rebuilds_when_a_booked_row_changes_in_place(tmp_path, report_rows, write_report):
+    report_path, ledger_path = tmp_path / 'report.csv', tmp_path / 'ledger.csv'
+    write_report(report_path, report_rows[:3])
+    run_ledger(str(report_path), str(ledger_path), incremental=True)
+    # Same length, earlier row: only a hash of the whole booked prefix sees it
+    size = report_path.stat().st_size
+    report_path.write_bytes(report_path.read_bytes().replace(b'Rs.500.00', b'Rs.900.00').replace(b',500.0,', b',900.0,'))
+    assert report_path.stat().st_size == size
+    assert run_ledger(str(report_path), str(ledger_path), incremental=True)['rows'] == 3
+    ledger = pd.read_csv(ledger_path)
+    assert ledger['cumulative_debit'].tolist() == [900.0, 1100.0, 1100.0]
+
+
+def test_ledger_reads_the_balance_the_report_quotes(tmp_path, report_rows, write_report):
+    report_path, ledger_path = tmp_path / 'report.csv', tmp_path / 'ledger.csv'
+    write_report(report_path, report_rows[:2])
+    # As written with amount_details: the ledger takes the column, not the text
+    report = pd.read_csv(report_path)
+    report['available_balance'] = [9500.0, 9000.0]
+    report.to_csv(report_path, index=False)
+    run_ledger(str(report_path), str(ledger_path))
+    ledger = pd.read_csv(ledger_path)
+    assert ledger['quoted_balance'].tolist() == [9500.0, 9000.0]
+    assert ledger['balance_gap'].tolist()[1] == -300.0
@@ -0,0 +1,19 @@
+from sms_pipeline.parallel import run_parallel, run_parallel_reports
+from sms_pipeline.streaming import run, run_streaming
+
+
+def test_sharded_report_matches_single_process_run(tmp_path, synthetic_csv):
+    single, sharded = tmp_path / 'single.csv', tmp_path / 'sharded.csv'
+    run(synthetic_csv, str(single), 'accounts')
+    run_parallel(synthetic_csv, str(sharded), 'accounts', workers=2, chunksize=500)
+    assert sharded.read_bytes() == single.read_bytes()
+
+
+def test_sharded_reports_keep_input_order_with_templates(tmp_path, synthetic_csv):
+    reports = ['reports', 'final_credit']
+    outputs = {report: str(tmp_path / f'{report}.csv') for report in reports}
+    run_parallel_reports(synthetic_csv, outputs, workers=2, chunksize=400, templates=True)
+    for report in reports:
+        streamed = tmp_path / f'{report}_streamed.csv'
+        run_streaming(synthetic_csv, str(streamed), report, chunksize=400)
+        assert open(outputs[report], 'rb').read() == streamed.read_bytes(), report
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from sms_pipeline.incremental import run_incremental
+from sms_pipeline.rollup import (
+    MEASURES, ROLLUP_KEYS, TEXT_KEYS, read_rollup, rollup_from_csv, rollup_path_for, write_rollup,
+)
+from sms_pipeline.streaming import run_streaming
+
+
+def _rebuilt(report_path, tmp_path):
+    # The rollup of the whole report CSV, written the same way
+    path = tmp_path / 'rebuilt_rollup.csv'
+    write_rollup(rollup_from_csv(str(report_path), chunksize=1000), path)
+    return path.read_bytes()
+
+
+def _by_keys(frame, keys):
+    frame = frame.copy()
+    frame[TEXT_KEYS] = frame[TEXT_KEYS].astype(object).fillna('')
+    return frame.sort_values(keys).reset_index(drop=True)
+
+
+def test_chunked_rollup_matches_a_groupby_of_the_report(tmp_path, synthetic_csv):
+    report_path = tmp_path / 'report.csv'
+    run_streaming(synthetic_csv, str(report_path), 'reports', chunksize=700, rollup=True)
+    rollup_path = rollup_path_for(str(report_path))
+    assert open(rollup_path, 'rb').read() == _rebuilt(report_path, tmp_path)
+    streamed = read_rollup(rollup_path)
+
+    # The same figures straight from the report rows
+    report = pd.read_csv(report_path)
+    keys = [key for key in ROLLUP_KEYS if key in report]
+    report[TEXT_KEYS] = report[TEXT_KEYS].astype(object).fillna('')
+    expected = report.groupby(keys).agg(
+        rows=(MEASURES[0], 'size'),
+        **{f'{measure}_{stat}': (measure, stat) for measure in MEASURES for stat in ['sum', 'min', 'max']},
+    ).reset_index()
+    streamed, expected = _by_keys(streamed, keys), _by_keys(expected, keys)
+    assert streamed[keys].astype(str).equals(expected[keys].astype(str))
+    for column in expected.columns.drop(keys):
+        np.testing.assert_allclose(streamed[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   err_msg=column)
+
+
+def test_incremental_rollup_matches_the_rebuilt_one(tmp_path, synthetic_csv):
+    sms_data = pd.read_csv(synthetic_csv, dtype=str)
+    input_path, report_path = tmp_path / 'input.csv', tmp_path / 'report.csv'
+    sms_data.iloc[:1800].to_csv(input_path, index=False)
+    run_incremental(str(input_path), str(report_path), 'reports', chunksize=700, rollup=True)
+    sms_data.to_csv(input_path, index=False)
+    run_incremental(str(input_path), str(report_path), 'reports', chunksize=700, rollup=True)
+    assert open(rollup_path_for(str(report_path)), 'rb').read() == _rebuilt(report_path, tmp_path)
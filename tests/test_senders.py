@@ -0,0 +1,26 @@
+import pandas as pd
+
+from sms_pipeline.senders import BANK_LIST, SenderResolver
+from sms_pipeline.synthetic import generate_sms
+
+SENDERS = ['VM-HDFCBK', 'AD-HDFCBK', 'hdfcbank', 'JD-SBIUPI', 'SBI', 'SB-IUPI', 'AX-YesBank', 'AX-YESBNK',
+           'Bank of India', 'BOI-ALERT', 'VK-IndusInd Bank', 'HDFC ICICI', 'ICICI-HDFC', 'AD-PNBSMS', '', '  VM-ICICIB ']
+
+
+def _is_bank(sender):
+    # The original linear scan over BANK_LIST
+    return any(bank.lower() in sender.lower() for bank in BANK_LIST)
+
+
+def test_resolver_matches_the_bank_list_scan():
+    senders = pd.Series(SENDERS + generate_sms(2000, seed=5)['senderAddress'].tolist() + [None])
+    flags = SenderResolver().is_bank(senders)
+    # A missing sender is no bank, as an empty one
+    assert flags.tolist() == [_is_bank(sender) for sender in senders.fillna('')]
+
+
+def test_first_listed_bank_wins_and_prefixes_share_an_entry():
+    resolver = SenderResolver()
+    assert resolver.institution(pd.Series(['HDFC ICICI', 'ICICI-HDFC'])).tolist() == ['HDFC', 'HDFC']
+    resolver.institution(pd.Series(['VM-HDFCBK', 'AD-HDFCBK', 'hdfcbk']))
+    assert 'hdfcbk' in resolver.cache and 'vm-hdfcbk' not in resolver.cache
@@ -0,0 +1,39 @@
+import os
+
+import pandas as pd
+
+from sms_pipeline.sources import cache_paths, iter_source, load_source
+from sms_pipeline.synthetic import generate_sms
+
+
+def test_cached_workbook_loads_like_read_excel(tmp_path):
+    path = str(tmp_path / 'Final SMS Dataset_2.xlsx')
+    generate_sms(300, seed=17).to_excel(path, index=False)
+    cache_dir = str(tmp_path / 'cache')
+    expected = pd.read_excel(path, dtype=str)
+    # Converted on the first load, memory-mapped on the second
+    for _ in range(2):
+        pd.testing.assert_frame_equal(load_source(path, cache_dir=cache_dir), expected, check_dtype=False)
+    chunks = list(iter_source(path, 120, columns=['text'], cache_dir=cache_dir))
+    assert [len(chunk) for chunk in chunks] == [120, 120, 60]
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected[['text']], check_dtype=False)
+
+
+def test_cache_is_kept_when_touched_and_rebuilt_when_edited(tmp_path):
+    path = str(tmp_path / 'SMS-Data.csv')
+    cache_dir = str(tmp_path / 'cache')
+    sms_data = generate_sms(200, seed=19)
+    sms_data.to_csv(path, index=False)
+    load_source(path, cache_dir=cache_dir)
+    arrow_path, _ = cache_paths(path, cache_dir)
+    converted = os.stat(arrow_path).st_mtime_ns
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    load_source(path, cache_dir=cache_dir)
+    assert os.stat(arrow_path).st_mtime_ns == converted
+
+    sms_data.loc[0, 'text'] = 'edited'
+    sms_data.to_csv(path, index=False)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    assert load_source(path, cache_dir=cache_dir).loc[0, 'text'] == 'edited'
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from sms_pipeline.pipeline import process_frame
+from sms_pipeline.spam import SpamModel, _words_arrow, _words_pandas, evaluate, hashed_features, spam_labels, train
+from sms_pipeline.synthetic import generate_sms
+
+SMS = pd.DataFrame({
+    'id': 'user-1',
+    'phoneNumber': 'xx74031530',
+    'senderAddress': 'VM-HDFCBK',
+    'text': ['Rs.250.00 credited to a/c XX1234 by UPI'],
+    'updateAt': 'Tue, 15 Mar 2022 10:00:00 GMT',
+})
+
+
+def test_model_retrained_to_the_same_path_is_loaded_again(tmp_path):
+    path = str(tmp_path / 'spam_model.npz')
+    SpamModel(np.zeros(64), bias=-5.0).save(path)
+    assert process_frame(SMS.copy(), 'final_credit', spam_model=path)['final_credit'].tolist() == [True]
+    # Same size on disk, only the weights differ
+    SpamModel(np.zeros(64), bias=5.0).save(path)
+    assert process_frame(SMS.copy(), 'final_credit', spam_model=path)['final_credit'].tolist() == [False]
+
+
+def test_arrow_and_pandas_word_splits_agree():
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    texts = pd.Series(['Rs 500 WON!  Claim now', '', 'Ürün 12ab3 ürün', 'a\tb\nc'] +
+                      generate_sms(500, seed=21)['text'].tolist())
+    rows, codes, vocabulary = _words_arrow(texts, True, pa, pc)
+    pandas_rows, pandas_codes, pandas_vocabulary = _words_pandas(texts, True)
+    assert np.array_equal(rows, pandas_rows)
+    assert vocabulary[codes].tolist() == pandas_vocabulary[pandas_codes].tolist()
+
+
+def test_batched_features_match_one_message_at_a_time():
+    texts = generate_sms(300, seed=23)['text']
+    batch = hashed_features(texts, 1 << 12)
+    for i in range(0, len(texts), 37):
+        single = hashed_features(texts.iloc[i:i + 1], 1 << 12)
+        assert (batch[i] != single).nnz == 0
+
+
+def test_trained_model_separates_the_labelled_credits():
+    report = process_frame(generate_sms(4000, seed=25), 'final_credit')
+    texts, labels = spam_labels(report)
+    assert labels.any() and not labels.all()
+    model = train(texts, labels, n_features=1 << 14)
+    quality = evaluate(model, texts, labels)
+    assert quality['precision'] > 0.9 and quality['recall'] > 0.9
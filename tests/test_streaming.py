@@ -0,0 +1,22 @@
+import pytest
+
+from sms_pipeline.stages import REPORTS
+from sms_pipeline.streaming import run, run_reports, run_streaming
+
+
+@pytest.mark.parametrize('report', ['reports', 'accounts'])
+def test_streamed_report_matches_whole_file_run(tmp_path, synthetic_csv, report):
+    whole, streamed = tmp_path / 'whole.csv', tmp_path / 'streamed.csv'
+    summary = run(synthetic_csv, str(whole), report)
+    # Chunks that do not divide the input, and a last short one
+    assert run_streaming(synthetic_csv, str(streamed), report, chunksize=700)['rows'] == summary['rows']
+    assert streamed.read_bytes() == whole.read_bytes()
+
+
+def test_one_read_writes_every_report_as_a_single_run_does(tmp_path, synthetic_csv):
+    outputs = {report: str(tmp_path / f'{report}.csv') for report in REPORTS}
+    run_reports(synthetic_csv, outputs, chunksize=1000)
+    for report, path in outputs.items():
+        single = tmp_path / f'{report}_single.csv'
+        run(synthetic_csv, str(single), report)
+        assert single.read_bytes() == open(path, 'rb').read(), report
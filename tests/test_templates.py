@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from sms_pipeline.stages import REPORTS
+from sms_pipeline.streaming import run_reports
+from sms_pipeline.synthetic import generate_sms
+from sms_pipeline.templates import TemplateCache
+
+
+@pytest.mark.parametrize('maxsize', [200_000, 5])
+def test_template_cache_writes_the_same_reports(tmp_path, synthetic_csv, maxsize):
+    plain = {report: str(tmp_path / f'{report}.csv') for report in REPORTS}
+    cached = {report: str(tmp_path / f'{report}_templates.csv') for report in REPORTS}
+    run_reports(synthetic_csv, plain, chunksize=1000)
+    # A tiny cache keeps evicting templates; the reports must not change
+    run_reports(synthetic_csv, cached, chunksize=1000, templates=TemplateCache(maxsize))
+    for report in REPORTS:
+        assert open(cached[report], 'rb').read() == open(plain[report], 'rb').read(), report
+
+
+def test_saved_cache_starts_the_next_run_warm(tmp_path):
+    texts = generate_sms(1000, seed=9)['text']
+    cache = TemplateCache()
+    first = cache.analyze(texts)
+    assert cache.hits > cache.misses
+    path = str(tmp_path / 'templates.pkl')
+    cache.save(path)
+
+    warm = TemplateCache().update_from(path)
+    pd.testing.assert_frame_equal(warm.analyze(texts), first)
+    assert warm.misses == 0
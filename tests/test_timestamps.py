@@ -0,0 +1,21 @@
+import pandas as pd
+
+from sms_pipeline.timestamps import TimestampParser
+
+
+def test_two_digit_year_is_invalid_not_an_overflow():
+    parser = TimestampParser()
+    stamps = parser.parse(pd.Series(['Tue, 15 Mar 22 10:20:30 GMT', 'Tue, 15 Mar 2022 10:20:30 GMT', None]))
+    assert pd.isna(stamps[0])
+    assert stamps[1] == pd.Timestamp('2022-03-15 10:20:30', tz='UTC')
+    assert pd.isna(stamps[2])
+    assert parser.invalid == 2
+
+
+def test_cached_strings_parse_the_same():
+    parser = TimestampParser()
+    values = pd.Series(['Tue, 15 Mar 2022 10:20:30 GMT', 'Tue, 15 Mar 22 10:20:30 GMT'])
+    first, second = parser.parse(values), parser.parse(values)
+    assert first.equals(second)
+    assert parser.hits == 2
+    assert parser.invalid == 2
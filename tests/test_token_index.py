@@ -0,0 +1,55 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from sms_pipeline import classify
+from sms_pipeline.incremental import run_incremental
+from sms_pipeline.synthetic import generate_sms
+from sms_pipeline.token_index import BANK_RULES, TokenIndex, rule_sets
+
+
+def _index(sms_data):
+    return TokenIndex.from_frame(sms_data)
+
+
+def test_chunked_index_matches_the_whole_one(tmp_path):
+    sms_data = generate_sms(1500, seed=27)
+    whole = _index(sms_data)
+    chunked = TokenIndex.concat([_index(sms_data.iloc[start:start + 400]) for start in range(0, 1500, 400)])
+    path = str(tmp_path / 'index.npz')
+    chunked.save(path)
+    loaded = TokenIndex.load(path)
+    for postings in ('words', 'senders'):
+        for field in ('terms', 'offsets', 'rows'):
+            assert np.array_equal(getattr(getattr(loaded, postings), field), getattr(getattr(whole, postings), field))
+
+
+def test_changed_rows_are_the_rows_a_new_term_can_match():
+    sms_data = generate_sms(1500, seed=29)
+    old_rules = rule_sets()
+    new_rules = dict(old_rules, debit=old_rules['debit'] + ['swiggy', 'cash back'],
+                     **{BANK_RULES: old_rules[BANK_RULES] + ['Canara']})
+    changed = _index(sms_data).changed_rows(old_rules, new_rules, ['debit', BANK_RULES], len(sms_data))
+    texts, sender_names = sms_data['text'], sms_data['senderAddress'].str.lower()
+    # Exactly the rows with the word, or with both words of the phrase, or a Canara sender
+    expected = (texts.str.contains(r'\bswiggy\b', flags=re.IGNORECASE)
+                | (texts.str.contains(r'\bcash\b', flags=re.IGNORECASE)
+                   & texts.str.contains(r'\bback\b', flags=re.IGNORECASE))
+                | sender_names.str.contains('canara', regex=False))
+    assert expected.any()
+    assert changed.tolist() == expected.tolist()
+    # Lists outside the report's rules are not compared
+    assert not _index(sms_data).changed_rows(old_rules, new_rules, ['credit'], len(sms_data)).any()
+
+
+def test_incremental_run_reclassifies_the_rows_of_a_new_keyword(tmp_path, synthetic_csv, monkeypatch):
+    report_path, rebuilt = tmp_path / 'report.csv', tmp_path / 'rebuilt.csv'
+    run_incremental(synthetic_csv, str(report_path), 'accounts', chunksize=700)
+    monkeypatch.setattr(classify, 'DEBIT_WORDS', classify.DEBIT_WORDS + ['swiggy'])
+    summary = run_incremental(synthetic_csv, str(report_path), 'accounts', chunksize=700)
+    texts = pd.read_csv(synthetic_csv, dtype=str)['text']
+    assert summary['new_rows'] == 0
+    assert summary['reclassified_rows'] == texts.str.contains(r'\bswiggy\b', flags=re.IGNORECASE).sum() > 0
+    run_incremental(synthetic_csv, str(rebuilt), 'accounts', chunksize=700, full_rebuild=True)
+    assert report_path.read_bytes() == rebuilt.read_bytes()
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from sms_pipeline.velocity import ALERT_COLUMN, VelocityTracker, run_velocity, velocity_features
+
+THRESHOLDS = {'platform_debits_10min': 2}
+
+
+def test_tracker_matches_whole_report_features(tmp_path, report_rows, write_report):
+    # In time order, the queues give the same windows as the prefix sums
+    write_report(tmp_path / 'report.csv', report_rows)
+    report = pd.read_csv(tmp_path / 'report.csv', dtype=str)
+    assert VelocityTracker(THRESHOLDS).update(report).equals(velocity_features(report, THRESHOLDS))
+
+
+def test_incremental_velocity_books_every_report_row_once(tmp_path, report_rows, write_report):
+    report_path, velocity_path = tmp_path / 'report.csv', tmp_path / 'velocity.csv'
+    write_report(report_path, report_rows[:3])
+    assert run_velocity(str(report_path), str(velocity_path), True, THRESHOLDS) == {'rows': 3, 'alerts': 2}
+    first = velocity_path.read_bytes()
+    assert run_velocity(str(report_path), str(velocity_path), True, THRESHOLDS) == {'rows': 0, 'alerts': 0}
+    assert velocity_path.read_bytes() == first
+
+    write_report(report_path, report_rows[3:], append=True)
+    assert run_velocity(str(report_path), str(velocity_path), True, THRESHOLDS) == {'rows': 2, 'alerts': 1}
+    velocity = pd.read_csv(velocity_path)
+    assert velocity[ALERT_COLUMN].tolist() == [False, True, True, False, True]
+    assert velocity['platform_debits_10min'].tolist() == [1, 2, 2, 1, 2]
+
+
+def test_incremental_velocity_starts_again_on_a_rewritten_report(tmp_path, report_rows, write_report):
+    report_path, velocity_path = tmp_path / 'report.csv', tmp_path / 'velocity.csv'
+    write_report(report_path, report_rows[:3])
+    run_velocity(str(report_path), str(velocity_path), True, THRESHOLDS)
+    # The second debit moves out of the first one's window, at the same length
+    rows = list(report_rows[:3])
+    rows[1] = rows[1][:5] + ('10:12:00',)
+    write_report(report_path, rows)
+    assert run_velocity(str(report_path), str(velocity_path), True, THRESHOLDS) == {'rows': 3, 'alerts': 0}
+    velocity = pd.read_csv(velocity_path)
+    assert len(velocity) == 3
+    assert np.array_equal(velocity['platform_debits_10min'], [1, 1, 1])